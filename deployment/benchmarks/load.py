@@ -0,0 +1,125 @@
+# benchmarks/load.py
+
+import os
+import sys
+import time
+import socket
+import asyncio
+import subprocess
+import httpx
+import numpy as np
+
+
+def summarize(latencies: list, elapsed: float, errors: int) -> dict:
+    """Computes latency percentiles (milliseconds) and throughput for one run."""
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "elapsed_seconds": round(elapsed, 3),
+        "requests_per_second": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "p50_ms": round(float(np.percentile(latencies_ms, 50)), 3) if latencies else None,
+        "p95_ms": round(float(np.percentile(latencies_ms, 95)), 3) if latencies else None,
+        "p99_ms": round(float(np.percentile(latencies_ms, 99)), 3) if latencies else None,
+        "max_ms": round(float(latencies_ms.max()), 3) if latencies else None,
+    }
+
+
+async def run_load(client: httpx.AsyncClient, requests: list, concurrency: int) -> dict:
+    """
+    Sends `requests` (a list of (method, path, kwargs) tuples) through `client`
+    with a fixed number of concurrent workers and summarizes the results.
+    """
+    queue = asyncio.Queue()
+    for request in requests:
+        queue.put_nowait(request)
+
+    latencies = []
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        while True:
+            try:
+                method, path, kwargs = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, **kwargs)
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, time.perf_counter() - started, errors)
+
+
+def in_process_client(app) -> httpx.AsyncClient:
+    """Client that calls the ASGI app directly, without sockets."""
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark", timeout=60)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class LocalServer:
+    """Runs the API under uvicorn in a subprocess for benchmarks over local HTTP."""
+
+    def __init__(self, app_dir: str, env: dict, workers: int = 1):
+        self.app_dir = app_dir
+        self.env = env
+        self.workers = workers
+        self.port = free_port()
+        self.process = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def __enter__(self):
+        self.process = subprocess.Popen(
+            [
+                sys.executable, "-m", "uvicorn", "main:app",
+                "--host", "127.0.0.1",
+                "--port", str(self.port),
+                "--workers", str(self.workers),
+                "--log-level", "warning",
+            ],
+            cwd=self.app_dir,
+            env={**os.environ, **self.env},
+            stdout=subprocess.DEVNULL,
+        )
+        # Wait for the server to accept requests
+        deadline = time.monotonic() + 60
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError("Benchmark server exited during startup.")
+            try:
+                httpx.get(f"{self.base_url}/api/metrics", timeout=1)
+                return self
+            except httpx.HTTPError:
+                time.sleep(0.2)
+        self.__exit__()
+        raise RuntimeError("Benchmark server did not start within 60 seconds.")
+
+    def __exit__(self, *exc):
+        if self.process is not None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+            self.process = None
+
+    def client(self) -> httpx.AsyncClient:
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+        return httpx.AsyncClient(base_url=self.base_url, timeout=60, limits=limits)
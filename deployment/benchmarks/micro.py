@@ -0,0 +1,78 @@
+# benchmarks/micro.py
+
+import time
+import numpy as np
+from routes.data import calculate_rolling_rmse_and_check
+from services.retraining import prepare_retraining_data, perform_actual_retraining
+from services.models import get_model_path, load_model_data
+from services.catalog import catalog
+from services.snapshots import load_price_history
+from storage import get_storage
+
+
+def time_calls(name: str, func, runs: int) -> dict:
+    """Calls `func` `runs` times and reports per-call timings in milliseconds."""
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    timings_ms = np.array(timings) * 1000
+    return {
+        "name": name,
+        "runs": runs,
+        "mean_ms": round(float(timings_ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(timings_ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(timings_ms, 95)), 3),
+        "min_ms": round(float(timings_ms.min()), 3),
+        "calls_per_second": round(runs / float(sum(timings)), 2),
+    }
+
+
+def run_micro_benchmarks(region: str, crop: str, last_date: str, runs: int, retrain_runs: int) -> list:
+    """Benchmarks the building blocks of ingestion and retraining for one pair."""
+    crop_type = catalog.crop_type(crop)
+    model_path = get_model_path(region, crop_type)
+    encoder = load_model_data(model_path)["label_encoder"]
+    history = load_price_history(region, crop)
+
+    results = [
+        time_calls(
+            "model_load",
+            lambda: load_model_data(model_path),
+            runs,
+        ),
+        time_calls(
+            "actual_price_history_query",
+            lambda: get_storage().get_actual_price_history(region, crop),
+            runs,
+        ),
+        time_calls(
+            # Snapshot read (zero-copy when pyarrow is installed, database query otherwise)
+            "price_history_snapshot_read",
+            lambda: load_price_history(region, crop),
+            runs,
+        ),
+        time_calls(
+            "prepare_retraining_data",
+            lambda: prepare_retraining_data(history, region, crop, crop_type, encoder),
+            runs,
+        ),
+        time_calls(
+            # Drifting pairs are only queued (the retraining job is not running), so only the check itself is timed
+            "calculate_rolling_rmse_and_check",
+            lambda: calculate_rolling_rmse_and_check(last_date, region, crop),
+            runs,
+        ),
+    ]
+
+    if retrain_runs > 0:
+        result = time_calls(
+            "perform_actual_retraining",
+            lambda: perform_actual_retraining(region, crop),
+            retrain_runs,
+        )
+        result["jobs_per_hour"] = round(result["calls_per_second"] * 3600, 2)
+        results.append(result)
+
+    return results
@@ -0,0 +1,274 @@
+# benchmarks/run.py
+
+"""
+Benchmark suite for the API hot paths.
+
+Generates a synthetic database and models in a temporary workspace, drives
+POST /api/predict and POST /api/data/prices (and the same requests batched
+through the msgpack routes) at fixed concurrency levels (in-process through
+ASGI and over local HTTP through uvicorn), times the retraining building
+blocks, and saves everything as JSON.
+
+Run from the deployment folder:
+
+    python -m benchmarks.run --regions 20 --weeks 156 --concurrency 1 8 32 --output results.json
+    python -m benchmarks.run --compare before.json after.json
+
+Set DATABASE_URL to benchmark against PostgreSQL instead of a temporary SQLite file.
+In-process runs do not start the app's background jobs.
+"""
+
+import os
+import sys
+import json
+import random
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import date, datetime, timedelta, timezone
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# JSON routes, and the same requests sent in batches to the msgpack routes
+SCENARIOS = ["predict", "prices", "predict_msgpack", "prices_msgpack"]
+MSGPACK_PATHS = {"/api/predict": "/api/msgpack/predict", "/api/data/prices": "/api/msgpack/prices"}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="AgroProphet API benchmarks")
+    parser.add_argument("--regions", type=int, default=10, help="Number of synthetic regions")
+    parser.add_argument("--weeks", type=int, default=104, help="Weeks of price history per crop")
+    parser.add_argument("--model-estimators", type=int, default=50, help="Trees per output in the synthetic models")
+    parser.add_argument("--requests", type=int, default=500, help="Requests per scenario and concurrency level")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32], help="Concurrency levels")
+    parser.add_argument("--modes", nargs="+", default=["inprocess", "http"], choices=["inprocess", "http"])
+    parser.add_argument("--scenarios", nargs="+", default=SCENARIOS, choices=SCENARIOS)
+    parser.add_argument("--msgpack-batch-sizes", type=int, nargs="+", default=[1, 50], help="Requests per msgpack batch")
+    parser.add_argument("--http-workers", type=int, default=1, help="uvicorn workers for the HTTP mode")
+    parser.add_argument("--micro-runs", type=int, default=50, help="Runs per micro-benchmark")
+    parser.add_argument("--retrain-runs", type=int, default=1, help="Full retraining runs (0 to skip)")
+    parser.add_argument("--workdir", help="Workspace for the database and models (default: a temporary folder)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark_results.json", help="Where to save the results")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="Compare two result files and exit")
+    return parser.parse_args()
+
+
+def configure_workspace(workdir: str) -> dict:
+    """
+    Points the app at the benchmark workspace. Must run before anything imports settings.
+    Returns the environment variables that were set, for the HTTP server subprocess.
+    """
+    env = {
+        "MODELS_PATH": os.path.join(workdir, "models"),
+        "SNAPSHOT_PATH": os.path.join(workdir, "snapshots"),
+        "ARCHIVE_PATH": os.path.join(workdir, "archive"),
+    }
+    if not os.getenv("DATABASE_URL"):
+        env["DB_PATH"] = os.path.join(workdir, "agroprophet.db")
+    os.environ.update(env)
+
+    # The app serves static files relative to its own folder
+    os.chdir(APP_DIR)
+    if APP_DIR not in sys.path:
+        sys.path.insert(0, APP_DIR)
+    return env
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=APP_DIR, text=True).strip()
+    except Exception:
+        return None
+
+
+def build_requests(scenario: str, pairs: list, count: int, last_date: str, week_offset: int, rng: random.Random) -> list:
+    """
+    Builds the (method, path, kwargs) requests for one scenario run.
+    Ingested prices stay within 1% of the stored prediction (or of the latest
+    actual price) so the ingestion path does not trigger retraining mid-run.
+    """
+    if scenario == "predict":
+        return [
+            ("POST", "/api/predict", {"json": {"region": region, "crop": crop}})
+            for region, crop in (rng.choice(pairs) for _ in range(count))
+        ]
+
+    from storage import get_storage
+
+    storage = get_storage()
+    latest = {pair: window[-1][1] for pair, window in storage.get_lag_windows(1).items()}
+    with storage.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(storage.sql("SELECT date, region, crop, price FROM price WHERE actual = 0 AND date > ?"), (last_date,))
+        predicted = {(day, region, crop): price for day, region, crop, price in cursor.fetchall()}
+
+    # Prices: new weeks after the history, so the first ones replace materialized predictions
+    base = date.fromisoformat(last_date)
+    requests = []
+    for i in range(count):
+        region, crop = pairs[i % len(pairs)]
+        day = (base + timedelta(weeks=week_offset + 1 + i // len(pairs))).isoformat()
+        reference = predicted.get((day, region, crop), latest[(region, crop)])
+        payload = {
+            "date": day,
+            "region": region,
+            "crop": crop,
+            "priceData": {"price": round(reference * rng.uniform(0.99, 1.01), 2)},
+        }
+        requests.append(("POST", "/api/data/prices", {"json": payload}))
+    return requests
+
+
+def to_msgpack_requests(requests: list, batch_size: int) -> list:
+    """Regroups JSON requests into msgpack batch requests of `batch_size` items each."""
+    import msgpack
+
+    batches = []
+    for i in range(0, len(requests), batch_size):
+        chunk = requests[i:i + batch_size]
+        items = []
+        for _, _, kwargs in chunk:
+            item = dict(kwargs["json"])
+            if "priceData" in item:
+                item["price"] = item.pop("priceData")["price"]
+            items.append(item)
+        batches.append(
+            (
+                "POST",
+                MSGPACK_PATHS[chunk[0][1]],
+                {"content": msgpack.packb(items), "headers": {"Content-Type": "application/msgpack"}},
+            )
+        )
+    return batches
+
+
+async def run_scenarios(client_factory, mode: str, args, pairs: list, last_date: str, state: dict) -> list:
+    from benchmarks.load import run_load
+    from services.forecasts import materialize_forecasts
+
+    rng = random.Random(args.seed)
+    results = []
+    for scenario in args.scenarios:
+        base_scenario, _, transport = scenario.partition("_")
+        batch_sizes = args.msgpack_batch_sizes if transport == "msgpack" else [1]
+        for batch_size in batch_sizes:
+            for concurrency in args.concurrency:
+                if base_scenario == "predict":
+                    # Measure the steady state, where forecasts have been materialized
+                    materialize_forecasts()
+                requests = build_requests(base_scenario, pairs, args.requests, last_date, state["week_offset"], rng)
+                if base_scenario == "prices":
+                    state["week_offset"] += -(-args.requests // len(pairs))
+                if transport == "msgpack":
+                    requests = to_msgpack_requests(requests, batch_size)
+
+                async with client_factory() as client:
+                    summary = await run_load(client, requests, concurrency)
+                summary.update({"mode": mode, "scenario": scenario, "concurrency": concurrency, "batch_size": batch_size})
+                summary["items_per_second"] = round(args.requests / summary["elapsed_seconds"], 2) if summary["elapsed_seconds"] else None
+                results.append(summary)
+                print(
+                    f"{mode:>9} {scenario:>15} b={batch_size:<3} c={concurrency:<3} "
+                    f"rps={summary['requests_per_second']} items/s={summary['items_per_second']} p50={summary['p50_ms']}ms "
+                    f"p95={summary['p95_ms']}ms p99={summary['p99_ms']}ms errors={summary['errors']}"
+                )
+    return results
+
+
+def compare(before_path: str, after_path: str):
+    """Prints the relative change of every metric between two result files."""
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+
+    def change(old, new):
+        if not old or new is None:
+            return "n/a"
+        return f"{(new - old) / old * 100:+.1f}%"
+
+    key = lambda r: (r["mode"], r["scenario"], r["concurrency"], r.get("batch_size", 1))
+    old_load = {key(r): r for r in before.get("load", [])}
+    for result in after.get("load", []):
+        old = old_load.get(key(result))
+        if old is None:
+            continue
+        print(
+            f"{result['mode']:>9} {result['scenario']:>15} b={result.get('batch_size', 1):<3} c={result['concurrency']:<3} "
+            + " ".join(
+                f"{metric}={old.get(metric)}->{result.get(metric)} ({change(old.get(metric), result.get(metric))})"
+                for metric in ("requests_per_second", "items_per_second", "p50_ms", "p95_ms", "p99_ms")
+            )
+        )
+
+    old_micro = {r["name"]: r for r in before.get("micro", [])}
+    for result in after.get("micro", []):
+        old = old_micro.get(result["name"])
+        if old is not None:
+            print(f"{result['name']:>34} mean_ms={old['mean_ms']}->{result['mean_ms']} ({change(old['mean_ms'], result['mean_ms'])})")
+
+
+def main():
+    args = parse_args()
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="agroprophet-bench-")
+    output = os.path.abspath(args.output)
+    env = configure_workspace(workdir)
+
+    # Imported only now, so settings pick up the workspace configuration
+    from benchmarks.synthetic import region_names, crop_catalog, generate_models, generate_database
+    from benchmarks.load import in_process_client, LocalServer
+    from benchmarks.micro import run_micro_benchmarks
+
+    print(f"Generating synthetic data in {workdir}...")
+    regions = region_names(args.regions)
+    generate_models(regions, n_estimators=args.model_estimators, seed=args.seed)
+    dataset = generate_database(regions, args.weeks, seed=args.seed)
+    pairs = [(region, crop) for region in regions for crops in crop_catalog().values() for crop in crops]
+    print(f"Generated {dataset['price_rows']} price rows for {len(pairs)} region/crop pairs.")
+
+    load_results = []
+    state = {"week_offset": 0}
+    if "inprocess" in args.modes:
+        import main as app_module
+        load_results += asyncio.run(
+            run_scenarios(lambda: in_process_client(app_module.app), "inprocess", args, pairs, dataset["last_date"], state)
+        )
+    if "http" in args.modes:
+        with LocalServer(APP_DIR, env, workers=args.http_workers) as server:
+            load_results += asyncio.run(
+                run_scenarios(server.client, "http", args, pairs, dataset["last_date"], state)
+            )
+
+    print("Running micro-benchmarks...")
+    region, crop = pairs[0]
+    micro_results = run_micro_benchmarks(region, crop, dataset["last_date"], args.micro_runs, args.retrain_runs)
+    for result in micro_results:
+        print(f"{result['name']:>34} mean={result['mean_ms']}ms p95={result['p95_ms']}ms")
+
+    results = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "backend": "postgresql" if os.getenv("DATABASE_URL") else "sqlite",
+            "args": {k: v for k, v in vars(args).items() if k != "compare"},
+            "dataset": dataset,
+        },
+        "load": load_results,
+        "micro": micro_results,
+    }
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
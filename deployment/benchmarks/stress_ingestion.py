@@ -0,0 +1,206 @@
+# benchmarks/stress_ingestion.py
+
+"""
+Concurrency stress test for price ingestion.
+
+Seeds predicted prices for future weeks, then submits the actual prices for
+them from many concurrent writers: every submission is sent several times at
+once, either as retries sharing an Idempotency-Key or as independent writers
+without a key. Afterwards it checks that
+
+  - every predicted-to-actual transition logged exactly one prediction error,
+  - every submitted price ended up stored as an actual price,
+  - every idempotency key was stored once and its retries were replayed.
+
+Run from the deployment folder (exits with status 1 if a check fails):
+
+    python -m benchmarks.stress_ingestion --regions 2 --weeks 8 --attempts 4 --concurrency 32
+
+"storage" mode calls the storage layer from a thread pool; "http" mode posts to
+uvicorn with several worker processes. Set DATABASE_URL to stress PostgreSQL
+instead of a temporary SQLite file.
+"""
+
+import sys
+import uuid
+import random
+import asyncio
+import argparse
+import tempfile
+from datetime import date, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="AgroProphet ingestion stress test")
+    parser.add_argument("--regions", type=int, default=2, help="Number of synthetic regions")
+    parser.add_argument("--history-weeks", type=int, default=20, help="Weeks of actual price history per crop")
+    parser.add_argument("--weeks", type=int, default=8, help="Predicted weeks to submit actual prices for")
+    parser.add_argument("--attempts", type=int, default=4, help="Concurrent copies of every submission")
+    parser.add_argument("--concurrency", type=int, default=32, help="Concurrent writers")
+    parser.add_argument("--modes", nargs="+", default=["storage", "http"], choices=["storage", "http"])
+    parser.add_argument("--http-workers", type=int, default=4, help="uvicorn workers for the HTTP mode")
+    parser.add_argument("--workdir", help="Workspace for the database and models (default: a temporary folder)")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+def seed_predictions(pairs: list, first_day: date, weeks: int, rng: random.Random) -> dict:
+    """Stores predicted prices for `weeks` weeks from `first_day` and returns them by (date, region, crop)."""
+    from storage import get_storage
+
+    predicted = {
+        ((first_day + timedelta(weeks=w)).isoformat(), region, crop): round(rng.uniform(30, 150), 2)
+        for region, crop in pairs
+        for w in range(weeks)
+    }
+    get_storage().bulk_load_prices([(day, region, crop, price, 0) for (day, region, crop), price in predicted.items()])
+    return predicted
+
+
+def build_submissions(predicted: dict, attempts: int, rng: random.Random) -> list:
+    """
+    Builds `attempts` copies of one actual price submission per predicted row. Half of
+    the rows are retried with a shared idempotency key, the other half have no key.
+    """
+    submissions = []
+    for i, ((day, region, crop), price) in enumerate(sorted(predicted.items())):
+        key = str(uuid.UUID(int=rng.getrandbits(128))) if i % 2 == 0 else None
+        payload = {
+            "date": day,
+            "region": region,
+            "crop": crop,
+            # Close to the prediction, so the RMSE check never schedules retraining
+            "priceData": {"price": round(price * rng.uniform(0.99, 1.01), 2)},
+        }
+        submissions += [(payload, key)] * attempts
+    rng.shuffle(submissions)
+    return submissions
+
+
+def run_storage_mode(submissions: list, concurrency: int) -> list:
+    """Submits through the storage layer from a thread pool. Returns the outcome statuses."""
+    from storage import get_storage
+
+    def submit(submission):
+        payload, key = submission
+        request_hash = key and f"{payload['priceData']['price']}"
+        outcome = get_storage().store_actual_price(
+            payload["date"], payload["region"], payload["crop"], payload["priceData"]["price"], key, request_hash
+        )
+        return outcome["status"]
+
+    with ThreadPoolExecutor(concurrency) as executor:
+        return list(executor.map(submit, submissions))
+
+
+async def run_http_mode(server, submissions: list, concurrency: int) -> list:
+    """Posts the submissions to the API. Returns 'replayed', 'stored' or the HTTP status of errors."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with server.client() as client:
+        async def submit(submission):
+            payload, key = submission
+            headers = {"Idempotency-Key": key} if key else {}
+            async with semaphore:
+                response = await client.post("/api/data/prices", json=payload, headers=headers)
+            if response.status_code != 200:
+                return f"http_{response.status_code}"
+            return "replayed" if response.headers.get("Idempotent-Replayed") else "stored"
+
+        return await asyncio.gather(*(submit(submission) for submission in submissions))
+
+
+def check(predicted: dict, submissions: list, statuses: list, attempts: int) -> list:
+    """Verifies the database state after a run. Returns a list of failures (empty if all checks pass)."""
+    from storage import get_storage
+
+    storage = get_storage()
+    days = sorted({day for day, _, _ in predicted})
+    with storage.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            storage.sql(
+                """
+                SELECT date, region, crop, COUNT(*) FROM prediction_errors
+                WHERE date >= ? AND date <= ?
+                GROUP BY date, region, crop
+                """
+            ),
+            (days[0], days[-1]),
+        )
+        error_counts = {(day, region, crop): count for day, region, crop, count in cursor.fetchall()}
+        cursor.execute(
+            storage.sql("SELECT date, region, crop, price, actual FROM price WHERE date >= ? AND date <= ?"),
+            (days[0], days[-1]),
+        )
+        stored = {(day, region, crop): (price, actual) for day, region, crop, price, actual in cursor.fetchall()}
+        keys = sorted({key for _, key in submissions if key})
+        cursor.execute("SELECT COUNT(*) FROM idempotency_keys")
+        stored_keys = cursor.fetchone()[0]
+
+    failures = []
+    for row in predicted:
+        if error_counts.get(row, 0) != 1:
+            failures.append(f"{row}: {error_counts.get(row, 0)} prediction errors logged (expected 1)")
+    expected_prices = {(p["date"], p["region"], p["crop"]): p["priceData"]["price"] for p, _ in submissions}
+    for row, price in expected_prices.items():
+        if stored.get(row) != (price, 1):
+            failures.append(f"{row}: stored {stored.get(row)}, expected actual price {price}")
+    if stored_keys < len(keys):
+        failures.append(f"{stored_keys} idempotency keys stored, expected at least {len(keys)}")
+
+    errors = [status for status in statuses if str(status).startswith("http_")]
+    if errors:
+        failures.append(f"{len(errors)} requests failed: {sorted(set(errors))}")
+    replayed = sum(status in ("duplicate", "replayed") for status in statuses)
+    expected_replays = len(keys) * (attempts - 1)
+    if replayed != expected_replays:
+        failures.append(f"{replayed} submissions were replayed, expected {expected_replays}")
+    return failures
+
+
+def main():
+    args = parse_args()
+    from benchmarks.run import configure_workspace, APP_DIR
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="agroprophet-stress-")
+    env = configure_workspace(workdir)
+
+    # Imported only now, so settings pick up the workspace configuration
+    from benchmarks.synthetic import START_DATE, region_names, crop_catalog, generate_models, generate_database
+    from benchmarks.load import LocalServer
+
+    rng = random.Random(args.seed)
+    regions = region_names(args.regions)
+    print(f"Generating synthetic data in {workdir}...")
+    generate_models(regions, n_estimators=5, seed=args.seed)
+    generate_database(regions, args.history_weeks, seed=args.seed)
+    pairs = [(region, crop) for region in regions for crops in crop_catalog().values() for crop in crops]
+
+    failed = False
+    first_day = START_DATE + timedelta(weeks=args.history_weeks)
+    for mode in args.modes:
+        predicted = seed_predictions(pairs, first_day, args.weeks, rng)
+        submissions = build_submissions(predicted, args.attempts, rng)
+        print(f"{mode:>7}: {len(submissions)} submissions for {len(predicted)} predicted rows...")
+
+        if mode == "storage":
+            statuses = run_storage_mode(submissions, args.concurrency)
+        else:
+            with LocalServer(APP_DIR, env, workers=args.http_workers) as server:
+                statuses = asyncio.run(run_http_mode(server, submissions, args.concurrency))
+
+        failures = check(predicted, submissions, statuses, args.attempts)
+        for failure in failures[:20]:
+            print(f"  ❌ {failure}")
+        print(f"{mode:>7}: {'FAILED' if failures else 'passed'} ({len(failures)} failures)")
+        failed = failed or bool(failures)
+        # The next mode submits for the weeks after these
+        first_day += timedelta(weeks=args.weeks)
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
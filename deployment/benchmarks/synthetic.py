@@ -0,0 +1,121 @@
+# benchmarks/synthetic.py
+
+import os
+import random
+import joblib
+import numpy as np
+from datetime import date, timedelta
+from sklearn.preprocessing import LabelEncoder
+from sklearn.multioutput import MultiOutputRegressor
+from xgboost import XGBRegressor
+from settings import FRUITS, VEGETABLES, LAG_WEEKS
+from services.models import get_model_path
+from storage import get_storage
+
+# First week of the synthetic history
+START_DATE = date(2020, 1, 6)
+
+
+def region_names(count: int) -> list:
+    """Returns `count` synthetic region names."""
+    return [f"Region {i:03d}" for i in range(count)]
+
+
+def crop_catalog() -> dict:
+    """Maps each crop type to its sorted list of crops, as the models expect."""
+    return {"Fruit": sorted(FRUITS), "Vegetable": sorted(VEGETABLES)}
+
+
+def generate_models(regions: list, n_estimators: int = 50, seed: int = 0) -> list:
+    """
+    Trains small Region__CropType models with the production model architecture
+    on random data and saves them under MODELS_PATH.
+
+    Returns:
+        List of the model paths written.
+    """
+    rng = np.random.default_rng(seed)
+    paths = []
+    for crop_type, crops in crop_catalog().items():
+        encoder = LabelEncoder().fit(crops)
+        # Train one model per crop type and reuse it for every region
+        samples = len(crops) * 20
+        crop_encs = rng.integers(0, len(crops), samples)
+        lags = rng.uniform(20, 200, (samples, LAG_WEEKS))
+        X = np.column_stack([crop_encs, lags])
+        y = lags.mean(axis=1, keepdims=True) + rng.normal(0, 5, (samples, LAG_WEEKS))
+        model = MultiOutputRegressor(XGBRegressor(objective="reg:squarederror", n_estimators=n_estimators))
+        model.fit(X, y)
+
+        for region in regions:
+            path = get_model_path(region, crop_type)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            joblib.dump({"model": model, "label_encoder": encoder}, path)
+            paths.append(path)
+    return paths
+
+
+def generate_database(regions: list, weeks: int, error_weeks: int = 13, seed: int = 0) -> dict:
+    """
+    Fills the configured database with `weeks` of weekly actual prices for every
+    crop in every region, weekly weather per region, and squared errors for the
+    last `error_weeks` weeks so rolling RMSE checks have data to work on.
+
+    Returns:
+        Dict with the number of rows generated per table and the last history date.
+    """
+    random.seed(seed)
+    storage = get_storage()
+    storage.init_schema()
+
+    crops = [crop for crops in crop_catalog().values() for crop in crops]
+    dates = [(START_DATE + timedelta(weeks=w)).isoformat() for w in range(weeks)]
+
+    price_rows = []
+    error_rows = []
+    for region in regions:
+        for crop in crops:
+            # Random walk around a per-crop base price
+            level = random.uniform(30, 150)
+            for i, day in enumerate(dates):
+                level = max(1.0, level + random.gauss(0, 2))
+                price_rows.append((day, region, crop, round(level, 2), 1))
+                if i >= weeks - error_weeks:
+                    error_rows.append((day, region, crop, random.uniform(0, 20)))
+
+    weather_rows = [
+        (day, region, random.uniform(0, 300), random.uniform(40, 100), random.uniform(5, 35))
+        for region in regions
+        for day in dates
+    ]
+
+    # Rows already present from an earlier run in the same workspace are kept as they are
+    storage.bulk_load_prices(price_rows)
+    with storage.connection() as conn:
+        cursor = conn.cursor()
+        cursor.executemany(
+            storage.sql(
+                """
+                INSERT INTO prediction_errors (date, region, crop, squared_error)
+                SELECT ?, ?, ?, ?
+                WHERE NOT EXISTS (SELECT 1 FROM prediction_errors WHERE date = ? AND region = ? AND crop = ?)
+                """
+            ),
+            [row + row[:3] for row in error_rows],
+        )
+        cursor.executemany(
+            storage.sql(
+                """
+                INSERT INTO weather (date, region, rainfall, humidity, temp) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (date, region) DO NOTHING
+                """
+            ),
+            weather_rows,
+        )
+
+    return {
+        "price_rows": len(price_rows),
+        "prediction_error_rows": len(error_rows),
+        "weather_rows": len(weather_rows),
+        "last_date": dates[-1],
+    }
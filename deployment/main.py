@@ -1,26 +1,67 @@
 # main.py
 
-import sqlite3
-from fastapi import FastAPI
-from settings import DB_PATH
+from fastapi import FastAPI, Request, Response
+from contextlib import asynccontextmanager
+from storage import get_storage
 from fastapi.responses import HTMLResponse
-from fastapi.staticfiles import StaticFiles
 from routes.data import router as data_router
+from routes.binary import router as binary_router
+from routes.catalog import router as catalog_router
 from fastapi.middleware.cors import CORSMiddleware
+from routes.metrics import router as metrics_router
+from routes.profiles import router as profiles_router
+from routes.snapshots import router as snapshots_router
 from routes.prediction import router as prediction_router
+from settings import WRITE_BEHIND_ENABLED, PROFILING_ENABLED, PROFILE_RETRAINING, COMPRESSION_ENABLED
+from services.catalog import catalog, catalog_job
+from services.forecasts import forecast_job, forecast_refresh_job, forecast_writer
+from services.maintenance import maintenance_job
+from services.retraining import retrain_job
+from services.snapshots import snapshot_job
+from services.sharding import shard_router
+from services.profiling import profile_requests
+from services.compression import CompressionMiddleware
+from services.assets import CachingStaticFiles, etag_matches, index_page
 
 # ***************************************
 #             APPLICATION
 # ***************************************
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Starts background jobs on startup and stops them on shutdown."""
+    catalog.refresh()
+    catalog_job.start()
+    forecast_job.start()
+    forecast_refresh_job.start()
+    maintenance_job.start()
+    snapshot_job.start()
+    retrain_job.start()
+    if WRITE_BEHIND_ENABLED:
+        forecast_writer.start()
+    yield
+    catalog_job.stop()
+    forecast_job.stop()
+    forecast_refresh_job.stop()
+    maintenance_job.stop()
+    snapshot_job.stop()
+    # Waits for a retraining in progress, so its model is saved completely
+    retrain_job.stop()
+    # Drain buffered forecasts before the database goes away
+    forecast_writer.stop()
+    shard_router.close()
+    get_storage().close()
+
+
 # Instantiate main application
 app = FastAPI(
     title="AgroProphet",
     description="AgroProphet - Cold Storage Solution.",
+    lifespan=lifespan,
 )
 
-app.mount("/static", StaticFiles(directory="static"), name="static")
+app.mount("/static", CachingStaticFiles(directory="static"), name="static")
 
 # Bind routers to main application
 app.include_router(
@@ -31,6 +72,32 @@ app.include_router(
     router=prediction_router,
     prefix="/api",
 )
+app.include_router(
+    router=binary_router,
+    prefix="/api",
+)
+app.include_router(
+    router=catalog_router,
+    prefix="/api",
+)
+app.include_router(
+    router=metrics_router,
+    prefix="/api",
+)
+app.include_router(
+    router=snapshots_router,
+    prefix="/api",
+)
+
+# Opt-in request profiling (not installed at all when disabled), and the routes
+# listing saved profiles (also for profiled retraining jobs)
+if PROFILING_ENABLED:
+    app.middleware("http")(profile_requests)
+if PROFILING_ENABLED or PROFILE_RETRAINING:
+    app.include_router(
+        router=profiles_router,
+        prefix="/api",
+    )
 
 
 # ***************************************
@@ -39,60 +106,8 @@ app.include_router(
 
 def init_db():
     """Initializes the database by creating necessary tables."""
-    with sqlite3.connect(DB_PATH) as conn:
-        cursor = conn.cursor()
-
-        # Create price table (added 'actual' column and a unique index)
-        cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS price (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                date TEXT NOT NULL,
-                region TEXT NOT NULL,
-                crop TEXT NOT NULL,
-                price REAL NOT NULL,
-                actual INTEGER DEFAULT 0, -- 1 for actual, 0 for predicted
-                UNIQUE(date, region, crop) -- Ensure only one entry per date, region, crop
-            )
-            """
-        )
-
-        # Create weather table (added a unique index)
-        cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS weather (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                date TEXT NOT NULL,
-                region TEXT NOT NULL,
-                rainfall REAL,
-                humidity REAL,
-                temp REAL,
-                UNIQUE(date, region) -- Ensure only one weather entry per date, region
-            )
-            """
-        )
-
-        # --- New table for tracking prediction errors ---
-        cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS prediction_errors (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                date TEXT NOT NULL,           -- The date the actual price was recorded (and prediction was made for)
-                region TEXT NOT NULL,
-                crop TEXT NOT NULL,
-                squared_error REAL NOT NULL,  -- (predicted_price - actual_price)^2
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP -- When this error record was created
-            )
-            """
-        )
-
-        # --- Add indexes for faster querying on the new table ---
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_error_date_region_crop ON prediction_errors (date, region, crop);")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_error_region_crop ON prediction_errors (region, crop);")
-        # ---------------------------------------------------------
-
-        conn.commit()
-    print(f"Database initialized at {DB_PATH}")
+    get_storage().init_schema()
+    print(f"Database initialized ({type(get_storage()).__name__})")
 
 
 # Initialize the database on startup
@@ -122,6 +137,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress large text responses (added last, so it wraps every other middleware)
+if COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware)
+
 
 # ***************************************
 #              ROUTES
@@ -129,14 +148,21 @@ app.add_middleware(
 
 
 @app.get("/", response_class=HTMLResponse)
-async def read_root():
-    """Serves the main HTML page."""
+async def read_root(request: Request):
+    """
+    Serves the main HTML page from memory (reloaded when the file changes). Browsers
+    revalidate it on every visit and get a 304 while it is unchanged.
+    """
     try:
-        with open("static/index.html", "r") as f:
-            return f.read()
+        content, etag = index_page.get()
     except FileNotFoundError:
         return HTMLResponse("<h1>Index.html not found</h1><p>Make sure static/index.html exists.</p>", status_code=404)
 
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("If-None-Match"), etag):
+        return Response(status_code=304, headers=headers)
+    return HTMLResponse(content, headers=headers)
+
 
 # NOTE
 # Other routes can be found in the `routes` folder
\ No newline at end of file
@@ -0,0 +1,9 @@
+from typing import Literal
+from pydantic import BaseModel, Field
+from settings import CROP_TYPES
+
+
+class CropPayload(BaseModel):
+    name: str = Field(..., example="Rambutan")
+    # Only types that models exist for, so a typo cannot add an unpredictable crop
+    cropType: Literal[CROP_TYPES] = Field(..., example="Fruit")
@@ -0,0 +1,215 @@
+# routes/binary.py
+
+import asyncio
+import msgpack
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import ClientDisconnect
+from routes.data import ingest_price
+from routes.prediction import run_prediction
+from services.idempotency import hash_request
+from settings import MSGPACK_MAX_ITEMS, MSGPACK_STREAM_CONCURRENCY
+
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+
+# Setup binary (msgpack) router
+router = APIRouter(
+    prefix="/msgpack",
+    tags=["Binary"],
+)
+
+# --------------------------------
+#         HELPER FUNCTIONS
+# --------------------------------
+
+
+def _field(item: dict, name: str, types: tuple, required: bool = True):
+    """Reads a field of a decoded request item, checking its type."""
+    value = item.get(name)
+    if value is None and not required:
+        return None
+    if not isinstance(value, types) or isinstance(value, bool):
+        raise HTTPException(status_code=422, detail=f"Field '{name}' is missing or has the wrong type.")
+    return value
+
+
+def predict_item(item) -> dict:
+    """Runs one {region, crop} prediction request through the prediction core."""
+    if not isinstance(item, dict):
+        raise HTTPException(status_code=422, detail="Each request must be a map.")
+    return run_prediction(_field(item, "region", (str,)), _field(item, "crop", (str,)))
+
+
+def ingest_item(item) -> dict:
+    """
+    Runs one {date, region, crop, price[, idempotencyKey]} price submission through the
+    ingestion core. Returns its outcome ("inserted", "replaced_prediction", "updated" or "replayed").
+    """
+    if not isinstance(item, dict):
+        raise HTTPException(status_code=422, detail="Each request must be a map.")
+    date = _field(item, "date", (str,))
+    region = _field(item, "region", (str,))
+    crop = _field(item, "crop", (str,))
+    price = float(_field(item, "price", (int, float)))
+    idempotency_key = _field(item, "idempotencyKey", (str,), required=False)
+
+    request_hash = hash_request(date, region, crop, price) if idempotency_key is not None else None
+    return {"status": ingest_price(date, region, crop, price, idempotency_key, request_hash)}
+
+
+def _run_item(handler, item) -> dict:
+    """Runs one request item, turning its failure into an error entry instead of failing the batch."""
+    try:
+        return handler(item)
+    except HTTPException as e:
+        return {"error": {"status": e.status_code, "detail": e.detail}}
+    except Exception as e:
+        print(f"❌ msgpack request failed: {e}")
+        return {"error": {"status": 500, "detail": str(e)}}
+
+
+def _unpack_batch(body: bytes) -> list:
+    """Decodes a batch request body (a msgpack array of request maps)."""
+    try:
+        items = msgpack.unpackb(body)
+    except (ValueError, msgpack.UnpackException):
+        raise HTTPException(status_code=400, detail="Request body is not valid msgpack.")
+    if not isinstance(items, list):
+        raise HTTPException(status_code=422, detail="Request body must be a msgpack array of requests.")
+    if len(items) > MSGPACK_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Batches are limited to {MSGPACK_MAX_ITEMS} requests.")
+    return items
+
+
+async def _run_batch(request: Request, handler) -> Response:
+    """Runs every request of a batch in order (in one worker thread) and packs the results."""
+    items = _unpack_batch(await request.body())
+    results = await run_in_threadpool(lambda: [_run_item(handler, item) for item in items])
+    return Response(msgpack.packb(results), media_type=MSGPACK_MEDIA_TYPE)
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    Streaming response that can be sent while the request body is still being read.
+    Starlette's StreamingResponse watches for client disconnects by reading the
+    request messages itself, which would swallow the body chunks still being
+    uploaded; here a disconnect is only noticed when sending fails.
+    """
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await self.stream_response(send)
+        except OSError:
+            raise ClientDisconnect()
+
+
+async def _run_stream(request: Request, handler, concurrency: int) -> StreamingResponse:
+    """
+    Decodes a stream of concatenated msgpack request maps as it is uploaded, starting
+    every request as soon as it is decoded (at most `concurrency` at a time), and
+    streams back one msgpack result per request, in request order, while the rest of
+    the stream is still being uploaded.
+
+    If the stream turns out to be malformed, truncated or too long, the requests
+    decoded before that point still run and get their results, and the response
+    ends with one more map: {"error": {"status", "detail"}, "received": <number of
+    requests decoded>}. Every request before it was run; none after it was.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    # Tasks of the decoded requests in request order, then the stream error map (if
+    # any), then None once the upload is over
+    pending = asyncio.Queue()
+
+    async def run(item):
+        async with semaphore:
+            return await run_in_threadpool(_run_item, handler, item)
+
+    async def read():
+        unpacker = msgpack.Unpacker()
+        received_bytes = 0
+        # End offset of the last complete request (tell() also counts the parts of an
+        # unfinished map the unpacker has consumed, so it cannot be compared at EOF)
+        consumed_bytes = 0
+        received = 0
+        error = None
+        try:
+            async for chunk in request.stream():
+                unpacker.feed(chunk)
+                received_bytes += len(chunk)
+                for item in unpacker:
+                    if received >= MSGPACK_MAX_ITEMS:
+                        error = 413, f"Streams are limited to {MSGPACK_MAX_ITEMS} requests."
+                        return
+                    received += 1
+                    consumed_bytes = unpacker.tell()
+                    pending.put_nowait(asyncio.create_task(run(item)))
+            if consumed_bytes != received_bytes:
+                error = 400, "Stream ends in the middle of a request."
+        except (ValueError, msgpack.UnpackException):
+            error = 400, "Request body is not a valid msgpack stream."
+        except ClientDisconnect:
+            pass
+        finally:
+            if error is not None:
+                pending.put_nowait({"error": {"status": error[0], "detail": error[1]}, "received": received})
+            pending.put_nowait(None)
+
+    async def results():
+        reader = asyncio.create_task(read())
+        packer = msgpack.Packer()
+        try:
+            while (entry := await pending.get()) is not None:
+                yield packer.pack(entry if isinstance(entry, dict) else await entry)
+        finally:
+            # Client went away: stop reading and do not start the remaining requests
+            # (requests already running in a worker thread still finish)
+            reader.cancel()
+            while not pending.empty():
+                entry = pending.get_nowait()
+                if isinstance(entry, asyncio.Task):
+                    entry.cancel()
+
+    return DuplexStreamingResponse(results(), media_type=MSGPACK_MEDIA_TYPE)
+
+
+# --------------------------------
+#             ROUTES
+# --------------------------------
+
+
+@router.post("/predict")
+async def predict_batch(request: Request):
+    """
+    Predicts prices for a msgpack array of {region, crop} maps, returning a msgpack
+    array with one result per request (the JSON route's response, or an error map).
+    """
+    return await _run_batch(request, predict_item)
+
+
+@router.post("/predict/stream")
+async def predict_stream(request: Request):
+    """
+    Predicts prices for a stream of concatenated msgpack {region, crop} maps, streaming
+    back one msgpack result per request in request order (see `_run_stream`).
+    """
+    return await _run_stream(request, predict_item, MSGPACK_STREAM_CONCURRENCY)
+
+
+@router.post("/prices")
+async def store_prices_batch(request: Request):
+    """
+    Stores a msgpack array of {date, region, crop, price[, idempotencyKey]} maps in order,
+    returning a msgpack array with one {status} or error map per submission.
+    """
+    return await _run_batch(request, ingest_item)
+
+
+@router.post("/prices/stream")
+async def store_prices_stream(request: Request):
+    """
+    Stores a stream of concatenated msgpack price submissions, streaming back one
+    result per submission. Submissions are stored one at a time, in stream order, and
+    a broken stream keeps the submissions before the break (see `_run_stream`).
+    """
+    return await _run_stream(request, ingest_item, 1)
@@ -0,0 +1,41 @@
+# routes/catalog.py
+
+from fastapi import APIRouter, HTTPException
+from payloads.catalog import CropPayload
+from services.catalog import catalog
+
+# Setup catalog router
+router = APIRouter(
+    prefix="/catalog",
+    tags=["Catalog"],
+)
+
+# --------------------------------
+#             ROUTES
+# --------------------------------
+
+
+@router.get("")
+def get_catalog():
+    """Returns the known crops by type, the regions and which models each region has."""
+    return catalog.to_dict()
+
+
+@router.post("/crops")
+def add_crop(payload: CropPayload):
+    """Adds a crop to the taxonomy (or changes its type) without redeploying."""
+    name = payload.name.strip()
+    crop_type = payload.cropType
+    if not name:
+        raise HTTPException(status_code=400, detail="Crop name must not be empty.")
+
+    catalog.add_crop(name, crop_type)
+    print(f"✅ Crop '{name}' added to the catalog as {crop_type}")
+    return {"message": f"Crop '{name}' saved as {crop_type}."}
+
+
+@router.post("/refresh")
+def refresh_catalog():
+    """Reloads the catalog, e.g. after models were copied into the models directory."""
+    catalog.refresh()
+    return catalog.to_dict()
@@ -1,20 +1,14 @@
 # routes/data.py
 
-import sqlite3
-import math
-import os
-import joblib
-import numpy as np
-import pandas as pd 
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Header, Response
 from payloads.price import PricePayload
 from payloads.weather import WeatherPayload
-from settings import DB_PATH, RMSE_THRESHOLD, MIN_ERROR_POINTS, MODELS_PATH, FRUITS, VEGETABLES 
-from datetime import datetime, timedelta
-
-from sklearn.preprocessing import LabelEncoder
-from xgboost import XGBRegressor
-from sklearn.multioutput import MultiOutputRegressor
+from storage import get_storage
+from services.drift import drift_monitor
+from services.forecasts import mark_forecast_stale
+from services.retraining import retrain_scheduler, retrain_job
+from services.idempotency import hash_request, idempotency_cache
+from services.profiling import profiled
 
 
 # Setup data router
@@ -27,258 +21,125 @@ router = APIRouter(
 #         HELPER FUNCTIONS
 # --------------------------------
 
-def determine_crop_type(crop_name: str):
-    """Infers the crop type (Fruit or Vegetable) from the crop name."""
-    if crop_name in FRUITS:
-        return "Fruit"
-    elif crop_name in VEGETABLES:
-        return "Vegetable"
-    else:
-        # This case should ideally be caught earlier, but good for robustness
-        print(f"Warning: Unknown crop '{crop_name}' encountered during retraining.")
-        return None # Or raise an error if unknown crops shouldn't exist
-
-
-def prepare_retraining_data(db_data: list, region: str, crop: str, crop_type: str, loaded_encoder: LabelEncoder):
+def calculate_rolling_rmse_and_check(date: str, region: str, crop: str):
     """
-    Prepares data fetched from the database for model retraining,
-    replicating the logic of the original prepare_dataset function.
-
-    Args:
-        db_data: List of tuples (date, price) fetched from the database.
-                 Assumes data is already filtered for the specific region and crop.
-        region: The region name.
-        crop: The specific crop name (e.g., 'Apple').
-        crop_type: The type of crop (e.g., 'Fruit').
-        loaded_encoder: The pre-fitted LabelEncoder for this crop type.
-
-    Returns:
-        Tuple (X, y) of numpy arrays ready for model training, or (None, None) if insufficient data.
-        X: Features (commodity_enc + lags)
-        y: Targets (leads)
+    Calculates the 3-month rolling RMSE for a specific region/crop against its
+    own drift threshold and queues the model for retraining if it is exceeded
+    (retraining runs in the background, worst drift first, within the budget).
     """
-    if not db_data:
-        print("No data provided for retraining preparation.")
-        return None, None
-
-    # Convert list of tuples to DataFrame, mimicking original column names
-    # Add dummy columns for 'Region' and 'Type' as they are used for filtering in original prepare_dataset
-    # and 'Commodity' to match the encoder's expected input.
-    df = pd.DataFrame(db_data, columns=['Date', 'Price per Unit (Silver Drachma/kg)'])
-    df['Region'] = region
-    df['Type'] = crop_type
-    df['Commodity'] = crop # Add the specific crop name
-
-    # Replicate the data preparation steps from the original prepare_dataset
-    df = (
-        df.assign(Date=lambda d: pd.to_datetime(d['Date']))
-          .sort_values(['Commodity','Date']) # Sort by commodity and date as in original
-    )
-
-    # Use the loaded encoder to transform the 'Commodity' column
-    # The encoder should already be fitted on all commodities for this crop type
-    try:
-        df['commodity_enc'] = loaded_encoder.transform(df['Commodity'])
-    except ValueError as e:
-        print(f"Error transforming commodity '{crop}' with loaded encoder: {e}. This crop might not have been in the original training data.")
-        return None, None # Cannot proceed if encoding fails
-    except Exception as e:
-         print(f"Unexpected error during commodity encoding: {e}")
-         return None, None
-
-
-    # Build lags (1-4) and leads (1-4)
-    # Use the exact column name from the original script for price
-    price_col = 'Price per Unit (Silver Drachma/kg)'
-    for lag in [1,2,3,4]:
-        # Groupby 'Commodity' before shifting, as in original
-        df[f'lag_{lag}'] = df.groupby('Commodity')[price_col].shift(lag)
-    for lead in [1,2,3,4]:
-         # Groupby 'Commodity' before shifting, as in original
-        df[f'lead_{lead}'] = df.groupby('Commodity')[price_col].shift(-lead)
-
-
-    # Define columns used for dropping NaNs
-    lag_cols  = [f'lag_{l}'  for l in [1,2,3,4]]
-    lead_cols = [f'lead_{l}' for l in [1,2,3,4]]
-    # Drop rows with NaNs in feature/target columns, including the encoded commodity
-    df_clean = df.dropna(subset=lag_cols + lead_cols + ['commodity_enc'])
-
-    # Check if enough data remains after dropping NaNs
-    if df_clean.shape[0] < MIN_ERROR_POINTS: # Use MIN_ERROR_POINTS or a separate retraining threshold
-         print(f"Insufficient data ({df_clean.shape[0]} rows) after preparing features/targets for {region}/{crop}. Need at least {MIN_ERROR_POINTS} training samples.")
-         return None, None
+    check = drift_monitor.check(date, region, crop)
+    if check is None:
+        return None # Not enough data to calculate meaningful RMSE
 
+    rmse = check["rmse"]
+    print(f"📊 Rolling RMSE for {region}/{crop} (last {check['error_points']} points ending {date}): {rmse:.2f}")
 
-    # Separate features (X) and targets (y)
-    # Features: encoded commodity + lags
-    X = df_clean[['commodity_enc'] + lag_cols]
-    # Targets: leads
-    y = df_clean[lead_cols]
+    if check["drift_score"] > 1:
+        print(f"🚨 RMSE ({rmse:.2f}) for {region}/{crop} exceeds threshold ({check['threshold']:.2f}, {check['basis']}). Scheduling retraining!")
+        # --- Queue the retraining, the background job picks the worst drift first ---
+        if retrain_scheduler.schedule(region, crop, check["drift_score"]):
+            retrain_job.trigger()
+        # -----------------------------------------------------------
+    else:
+         print(f"✅ Rolling RMSE ({rmse:.2f}) for {region}/{crop} is within threshold ({check['threshold']:.2f}).")
 
-    print(f"Prepared training data for {region}/{crop}: X shape {X.shape}, y shape {y.shape}")
 
-    return X.to_numpy(), y.to_numpy() # Return as numpy arrays
+    return rmse
 
 
-def perform_actual_retraining(region: str, crop: str):
+def check_replay(stored_hash: str, request_hash: str) -> str:
     """
-    Background task function to perform the actual model retraining
-    for a specific region and crop.
+    Accepts a retried request whose idempotency key was already processed,
+    rejecting keys reused for a different request.
     """
-    print(f"🏋️‍♂️ Starting retraining for model: {region} / {crop}")
-
-    # Determine crop type to load the correct model file
-    crop_type = determine_crop_type(crop)
-    if crop_type is None:
-        print(f"❌ Retraining failed for {region}/{crop}: Could not determine crop type.")
-        return
-
-    model_filename = f"{region}__{crop_type}.joblib".replace(" ", "_")
-    model_path = os.path.join(MODELS_PATH, model_filename)
-
-    if not os.path.exists(model_path):
-        print(f"❌ Retraining failed for {region}/{crop}: Model file not found at {model_path}.")
-        return
-
-    try:
-        # --- 1. Load Existing Model and Encoder ---
-        # We need the existing encoder to correctly encode the commodity during data prep
-        print(f"Loading existing model data from {model_path}...")
-        model_data = joblib.load(model_path)
-        existing_model = model_data["model"] # We load the model just to confirm structure, but will train a new one
-        loaded_encoder: LabelEncoder = model_data["label_encoder"]
-        print("✅ Existing model data and encoder loaded.")
-
-    except Exception as e:
-        print(f"❌ Error loading existing model data or encoder for {region}/{crop}: {e}")
-        return
-
-    try:
-        # --- 2. Fetch All Actual Data for Retraining ---
-        # Fetch all actual price data for this specific region and crop from the database.
-        # This includes historical data imported from CSV and new data collected via the API.
-        print(f"Fetching all actual price data for {region}/{crop} from database...")
-        with sqlite3.connect(DB_PATH) as conn:
-             cursor = conn.cursor()
-             cursor.execute(
-                 """
-                 SELECT date, price FROM price
-                 WHERE region = ? AND crop = ? AND actual = 1
-                 ORDER BY date ASC
-                 """,
-                 (region, crop),
-             )
-             actual_price_data = cursor.fetchall()
-
-        if not actual_price_data:
-             print(f"⚠️ No actual data found for {region}/{crop} in the database. Cannot retrain.")
-             return
-
-        print(f"Fetched {len(actual_price_data)} actual data points.")
-
-        # --- 3. Prepare Data for Training ---
-        # Use the helper function to prepare features (X) and targets (y)
-        # using the fetched data and the loaded encoder.
-        X_train, y_train = prepare_retraining_data(actual_price_data, region, crop, crop_type, loaded_encoder)
-
-        if X_train is None or y_train is None:
-            # prepare_retraining_data will print specific reasons for failure
-            print(f"❌ Data preparation failed or insufficient data for retraining {region}/{crop}. Skipping retraining.")
-            return
-
-        # --- 4. Train the Model ---
-        # Instantiate the same model architecture and parameters as in original training
-        print(f"Training {region}/{crop} model with {X_train.shape[0]} samples...")
-        try:
-            # Re-instantiate the model with the same parameters
-            model = MultiOutputRegressor(
-                XGBRegressor(objective='reg:squarederror', n_estimators=1000)
-            )
-            model.fit(X_train, y_train) # Fit the model on the prepared data
-
-            print(f"✅ Model training complete for {region}/{crop}.")
-
-        except Exception as e:
-            print(f"❌ Error during model training for {region}/{crop}: {e}")
-            return
-
+    if stored_hash != request_hash:
+        raise HTTPException(status_code=409, detail="Idempotency-Key was already used with a different request.")
+    return "replayed"
 
-        # --- 5. Save the New Model ---
-        # Save the newly trained model and the *loaded* label encoder, overwriting the old file.
-        try:
-            # Ensure the models directory exists (should be done by init_db or deployment setup, but good check)
-            os.makedirs(MODELS_PATH, exist_ok=True)
 
-            # Save the updated model and the *same* label encoder together
-            joblib.dump({'model': model, 'label_encoder': loaded_encoder}, model_path)
-
-            print(f"✅ Successfully saved updated model: {model_path}")
-
-        except Exception as e:
-            print(f"❌ Error saving the retrained model for {region}/{crop}: {e}")
-
-
-    except Exception as e:
-        # Catch any other unexpected errors during the background task
-        print(f"❌ An unexpected error occurred during retraining for {region}/{crop}: {e}")
-
-
-def calculate_rolling_rmse_and_check(conn, date: str, region: str, crop: str, background_tasks: BackgroundTasks):
+def ingest_price(date: str, region: str, crop: str, price: float, idempotency_key: str | None = None, request_hash: str | None = None) -> str:
     """
-    Calculates the 3-month rolling RMSE for a specific region/crop
-    and adds a retraining task if the threshold is exceeded.
-    """
-    cursor = conn.cursor()
-    current_date = datetime.strptime(date, "%Y-%m-%d")
-    three_months_ago = current_date - timedelta(weeks=13) # Approx 3 months
-
-    cursor.execute(
-        """
-        SELECT squared_error FROM prediction_errors
-        WHERE region = ? AND crop = ? AND date >= ? AND date <= ?
-        ORDER BY date DESC
-        """,
-        (region, crop, three_months_ago.strftime("%Y-%m-%d"), date),
-    )
-    errors = cursor.fetchall()
+    Ingestion core shared by the JSON and msgpack routes. Stores or updates an actual
+    price; if it replaces a prediction, the squared error is logged and the rolling
+    RMSE checked, queueing the model for retraining if needed. The pair's forecast
+    is recomputed in the background.
 
-    num_error_points = len(errors)
-
-    if num_error_points < MIN_ERROR_POINTS:
-        print(f"ℹ️ Not enough error points ({num_error_points}) for {region}/{crop} in rolling window ending {date}. Need {MIN_ERROR_POINTS} to check RMSE.")
-        return None # Not enough data to calculate meaningful RMSE
+    Returns:
+        The outcome: "inserted", "replaced_prediction", "updated", or "replayed" for a
+        retry of a request already stored under the same idempotency key.
 
-    sum_squared_errors = sum(e[0] for e in errors)
-    mean_squared_error = sum_squared_errors / num_error_points
-    rmse = math.sqrt(mean_squared_error)
+    Raises:
+        HTTPException: 409 if the idempotency key was used for a different request.
+    """
+    if idempotency_key is not None:
+        cached_hash = idempotency_cache.get(idempotency_key)
+        if cached_hash is not None:
+            return check_replay(cached_hash, request_hash)
+
+    outcome = get_storage().store_actual_price(date, region, crop, price, idempotency_key, request_hash)
+
+    if outcome["status"] == "duplicate":
+        # Retry of a request stored by another attempt (or another API process)
+        print(f"ℹ️ Duplicate price submission for {date}, {region}, {crop} (Idempotency-Key {idempotency_key}). Skipped.")
+        # Not cached: the key was stored earlier and expires sooner than a fresh entry would
+        idempotency_cache.record_stored_duplicate()
+        return check_replay(outcome["request_hash"], request_hash)
+
+    if idempotency_key is not None:
+        idempotency_cache.put(idempotency_key, request_hash)
+
+    # The pair's stored forecast was computed from older prices
+    mark_forecast_stale(region, crop)
+
+    if outcome["status"] == "inserted":
+        # Case 1: No existing record - Inserted as new actual data
+        print(f"✅ New actual data inserted: {date}, {region}, {crop}, Price: {price}")
+        # No prediction was replaced, so no error calculation or RMSE check needed here.
+
+    elif outcome["status"] == "replaced_prediction":
+        # Case 2a: Existing predicted record - error logged and record updated to actual
+        print(
+            f"🔁 Replaced predicted value ({outcome['previous_price']:.2f}) with actual ({price:.2f}) for {date}, {region}, {crop}. Squared Error: {outcome['squared_error']:.2f}"
+        )
 
-    print(f"📊 Rolling RMSE for {region}/{crop} (last {num_error_points} points ending {date}): {rmse:.2f}")
+        # --- Call the RMSE check function ---
+        # This function will queue the model for retraining if needed
+        calculate_rolling_rmse_and_check(date, region, crop)
+        # ---------------------------------------------------------------------------
 
-    if rmse > RMSE_THRESHOLD:
-        print(f"🚨 RMSE ({rmse:.2f}) for {region}/{crop} exceeds threshold ({RMSE_THRESHOLD}). Scheduling retraining!")
-        # --- Add the retraining task to be run in the background ---
-        # Pass region and crop name to the background task
-        background_tasks.add_task(perform_actual_retraining, region, crop)
-        # -----------------------------------------------------------
     else:
-         print(f"✅ Rolling RMSE ({rmse:.2f}) for {region}/{crop} is within threshold.")
-
+        # Case 2b: Existing actual record - price overwritten
+        if price != outcome["previous_price"]:
+            print(
+                f"⚠️ Actual price for {date}, {region}, {crop} changed from {outcome['previous_price']} to {price}. Updated."
+            )
+        else:
+            print(f"ℹ️ Actual price for {date}, {region}, {crop} is the same as existing ({price}). Overwritten anyway.")
 
-    return rmse
+    return outcome["status"]
 
 
 # --------------------------------
 #             ROUTES
 # --------------------------------
 
-# Add BackgroundTasks as a parameter to the route handler
 @router.post("/prices", tags=["Price"])
-async def store_price_data(payload: PricePayload, background_tasks: BackgroundTasks):
+@profiled("prices")
+def store_price_data(
+    payload: PricePayload,
+    response: Response,
+    idempotency_key: str | None = Header(None, alias="Idempotency-Key"),
+):
     """
     Stores or updates price data. If an actual price replaces a prediction,
     calculates and logs the squared error and checks rolling RMSE,
     scheduling retraining in the background if needed.
+
+    Clients that retry should send the same Idempotency-Key header with every
+    attempt: retries of a request that was already stored are answered without
+    storing the price again.
+
+    Runs in the threadpool, since storing can wait on the database write lock.
     """
     try:
         date = payload.date
@@ -288,100 +149,12 @@ async def store_price_data(payload: PricePayload, background_tasks: BackgroundTa
     except Exception:
         raise HTTPException(status_code=400, detail="Missing required fields or invalid payload structure.")
 
-    with sqlite3.connect(DB_PATH) as conn:
-        cursor = conn.cursor()
+    request_hash = None
+    if idempotency_key is not None:
+        request_hash = hash_request(date, region, crop, price)
 
-        # Check if a record already exists for the same date, region, and crop
-        cursor.execute(
-            """
-            SELECT id, price, actual FROM price
-            WHERE date = ? AND region = ? AND crop = ?
-            """,
-            (date, region, crop),
-        )
-        existing_row = cursor.fetchone()
-
-        if existing_row is None:
-            # Case 1: No existing record - Insert as new actual data
-            cursor.execute(
-                """
-                INSERT INTO price (date, region, crop, price, actual)
-                VALUES (?, ?, ?, ?, 1)
-                """,
-                (date, region, crop, price),
-            )
-            print(f"✅ New actual data inserted: {date}, {region}, {crop}, Price: {price}")
-            # No prediction was replaced, so no error calculation or RMSE check needed here.
-
-        else:
-            # Case 2: Record already exists
-            record_id, existing_price, is_actual = existing_row
-            incoming_actual_price = price # The price from the payload is always actual
-
-            if is_actual == 0:
-                # Case 2a: Existing predicted record (actual = 0) - Calculate error, update to actual
-                predicted_price = existing_price
-                squared_error = (incoming_actual_price - predicted_price)**2
-
-                print(
-                    f"🔁 Replacing predicted value ({predicted_price:.2f}) with actual ({incoming_actual_price:.2f}) for {date}, {region}, {crop}. Squared Error: {squared_error:.2f}"
-                )
-
-                # Insert the squared error into the prediction_errors table
-                try:
-                    cursor.execute(
-                        """
-                        INSERT INTO prediction_errors (date, region, crop, squared_error)
-                        VALUES (?, ?, ?, ?)
-                        """,
-                        (date, region, crop, squared_error),
-                    )
-                    print(f"✅ Squared error logged for {date}, {region}, {crop}")
-                except Exception as e:
-                     # Log the error but don't fail the price update
-                    print(f"❌ Error logging squared error for {date}, {region}, {crop}: {e}")
-
-
-                # Update the price record to the new actual price and set actual = 1
-                cursor.execute(
-                    """
-                    UPDATE price
-                    SET price = ?, actual = 1
-                    WHERE id = ?
-                    """,
-                    (incoming_actual_price, record_id),
-                )
-                print(f"✅ Price record updated to actual.")
-
-                # --- Call the RMSE check function and pass BackgroundTasks ---
-                # This function will add perform_actual_retraining to background_tasks if needed
-                calculate_rolling_rmse_and_check(conn, date, region, crop, background_tasks)
-                # ---------------------------------------------------------------------------
-
-            else:
-                # Case 2b: Existing actual record (actual = 1) - Just update if price changed
-                if incoming_actual_price != existing_price:
-                    print(
-                        f"⚠️ Actual price for {date}, {region}, {crop} changed from {existing_price} to {incoming_actual_price}. Updating."
-                    )
-                    # No prediction was involved, so no error calculation for model performance here.
-                else:
-                    print(
-                        f"ℹ️ Actual price for {date}, {region}, {crop} is the same as existing ({existing_price}). Overwriting anyway."
-                    )
-
-                # Update the price record (actual remains 1)
-                cursor.execute(
-                    """
-                    UPDATE price
-                    SET price = ?
-                    WHERE id = ?
-                    """,
-                    (incoming_actual_price, record_id),
-                )
-                print(f"✅ Price record updated.")
-
-        conn.commit()
+    if ingest_price(date, region, crop, price, idempotency_key, request_hash) == "replayed":
+        response.headers["Idempotent-Replayed"] = "true"
 
     return {"message": "Price data saved successfully."}
 
@@ -389,45 +162,17 @@ async def store_price_data(payload: PricePayload, background_tasks: BackgroundTa
 @router.post("/weather", tags=["Weather"])
 def store_weather_data(data: WeatherPayload):
     """Stores or updates weather data."""
-    with sqlite3.connect(DB_PATH) as conn:
-        cursor = conn.cursor()
-        # Check if a weather record for this date and region already exists
-        cursor.execute(
-            """
-            SELECT id FROM weather WHERE date = ? AND region = ?
-            """,
-            (data.date, data.region),
-        )
-        existing_row = cursor.fetchone()
-
-        if existing_row:
-            # If exists, update
-            print(f"ℹ️ Weather data for {data.date}, {data.region} already exists. Updating.")
-            cursor.execute(
-                """
-                UPDATE weather
-                SET rainfall = ?, humidity = ?, temp = ?
-                WHERE id = ?
-                """,
-                (data.weatherData.rainfall, data.weatherData.humidity, data.weatherData.temp, existing_row[0]),
-            )
-        else:
-            # If not exists, insert
-            cursor.execute(
-                """
-                INSERT INTO weather (date, region, rainfall, humidity, temp)
-                VALUES (?, ?, ?, ?, ?)
-                """,
-                (
-                    data.date,
-                    data.region,
-                    data.weatherData.rainfall,
-                    data.weatherData.humidity,
-                    data.weatherData.temp,
-                ),
-            )
-            print(f"✅ New weather data inserted for {data.date}, {data.region}")
+    updated = get_storage().store_weather(
+        data.date,
+        data.region,
+        data.weatherData.rainfall,
+        data.weatherData.humidity,
+        data.weatherData.temp,
+    )
 
-        conn.commit()
+    if updated:
+        print(f"ℹ️ Weather data for {data.date}, {data.region} already existed. Updated.")
+    else:
+        print(f"✅ New weather data inserted for {data.date}, {data.region}")
 
     return {"message": "Weather data saved successfully."}
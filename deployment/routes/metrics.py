@@ -0,0 +1,41 @@
+# routes/metrics.py
+
+from fastapi import APIRouter
+from services.forecasts import forecast_writer
+from services.coalescing import prediction_flight
+from services.maintenance import maintenance_stats
+from services.idempotency import idempotency_cache
+from services.drift import drift_monitor
+from services.retraining import retrain_scheduler
+from services.models import model_cache
+from services.sharding import shard_router
+
+# Setup metrics router
+router = APIRouter(
+    prefix="/metrics",
+    tags=["Metrics"],
+)
+
+# --------------------------------
+#             ROUTES
+# --------------------------------
+
+
+@router.get("")
+def get_metrics():
+    """Returns runtime metrics of the API's background subsystems."""
+    return {
+        "write_behind": forecast_writer.stats(),
+        "prediction_coalescing": prediction_flight.stats(),
+        "maintenance": maintenance_stats(),
+        "idempotency": idempotency_cache.stats(),
+        "retraining": retrain_scheduler.stats(),
+        "model_cache": model_cache.stats(),
+        "sharding": shard_router.stats(),
+    }
+
+
+@router.get("/drift")
+def get_drift():
+    """Returns the latest drift check (RMSE, threshold and its basis) of every pair, worst drift first."""
+    return {"pairs": drift_monitor.to_list()}
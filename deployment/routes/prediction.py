@@ -1,15 +1,24 @@
 # routes/prediction.py
 
-import os
-import joblib
-import sqlite3
 import numpy as np
 from fastapi import APIRouter
-from fastapi import HTTPException
-from datetime import datetime, timedelta
+from fastapi import HTTPException, Header
 from sklearn.calibration import LabelEncoder # Assuming LabelEncoder is used
 from payloads.prediction import PredictionPayload # Assuming this Pydantic model exists
-from settings import DB_PATH, MODELS_PATH, FRUITS, VEGETABLES # Import necessary settings
+from storage import get_storage
+from settings import LAG_WEEKS, PREDICTION_INTERVAL_ERRORS # Import necessary settings
+from services.models import get_model_filename, model_cache
+from services.catalog import catalog
+from services.forecasts import (
+    build_forecast,
+    store_forecasts,
+    get_stored_forecast,
+    interval_offsets,
+    predict_with_intervals,
+)
+from services.coalescing import prediction_flight
+from services.sharding import shard_router, SHARD_FORWARDED_HEADER
+from services.profiling import profiled
 
 # Setup prediction router
 router = APIRouter(
@@ -18,73 +27,100 @@ router = APIRouter(
 )
 
 # --------------------------------
-#             ROUTES
+#         HELPER FUNCTIONS
 # --------------------------------
 
 
-@router.post("")
-def predict_prices(data: PredictionPayload):
+def forward_prediction(region: str, crop_name: str, model_filename: str):
     """
-    Generates price predictions for a given crop and region based on historical data.
+    Forwards a prediction to the shard owning its model.
+
+    Returns:
+        The owning shard's prediction, or None if that shard is unavailable.
+
+    Raises:
+        HTTPException: With the owning shard's status if it rejected the request.
     """
-    # 1. Infer crop type (needed to load the correct model)
-    crop_name = data.crop.strip()
-    crop_type = None
-    if crop_name in FRUITS:
-        crop_type = "Fruit"
-    elif crop_name in VEGETABLES:
-        crop_type = "Vegetable"
-    else:
+    response = shard_router.forward(model_filename, "/api/predict", {"region": region, "crop": crop_name})
+    if response is None:
+        return None
+    if response.status_code != 200:
+        try:
+            detail = response.json().get("detail")
+        except ValueError:
+            detail = response.text
+        raise HTTPException(status_code=response.status_code, detail=detail)
+    return response.json()
+
+
+def generate_predictions(region: str, crop_name: str, route: bool = True) -> dict:
+    """
+    Generates price predictions for a given crop and region based on historical data,
+    serving the materialized forecast when it is fresh.
+
+    Live inference runs on the shard owning the model (when sharding is enabled),
+    unless `route` is unset because the request was already forwarded.
+    """
+    # 1. Look up the crop type in the catalog (needed to load the correct model)
+    crop_type = catalog.crop_type(crop_name)
+    if crop_type is None:
         raise HTTPException(
             status_code=400,
-            detail=f"Unknown crop '{crop_name}'; not categorized as Fruit or Vegetable. Please add it to settings.py.",
+            detail=f"Unknown crop '{crop_name}'; it has no crop type in the catalog. Add it through POST /api/catalog/crops.",
         )
 
-    # 2. Retrieve last 4 *actual* prices for the specific region and crop
-    # Ensure you are only getting actual data (actual = 1)
-    with sqlite3.connect(DB_PATH) as conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            """
-            SELECT date, price FROM price
-            WHERE region = ? AND crop = ? AND actual = 1 -- Crucial: only fetch actual data
-            ORDER BY date DESC
-            LIMIT 4
-            """,
-            (data.region, crop_name),
-        )
-        rows = cursor.fetchall()
+    # 2. Locate the specific model for the region and crop type
+    # Model names are expected in the format Region__CropType.joblib
+    model_filename = get_model_filename(region, crop_type)
 
-    # 3. Check if enough historical data is available
-    if len(rows) < 4:
+    version = catalog.model_version(region, crop_type)
+    if version is None:
         raise HTTPException(
-            status_code=400,
-            detail=f"Not enough historical data to make a prediction for {crop_name} in {data.region} (need at least 4 weeks of *actual* price data). Found {len(rows)}.",
+            status_code=404,
+            detail=f"Model file '{model_filename}' not found for region '{region}' and crop type '{crop_type}'.",
         )
 
-    # 4. Sort data by date and prepare lag values
-    # The data is fetched DESC, so sort ASC for chronological order
-    sorted_rows = sorted(rows, key=lambda x: x[0])
-    last_4_week_prices = [row[1] for row in sorted_rows]
-    latest_date_str = sorted_rows[-1][0]
-    latest_date = datetime.strptime(latest_date_str, "%Y-%m-%d")
+    # 3. Serve the materialized forecast if it is still fresh
+    stored_forecast = get_stored_forecast(region, crop_name, version)
+    if stored_forecast is not None:
+        print(f"⚡ Serving materialized forecast for {crop_name} in {region}")
+        return {
+            "crop": crop_name,
+            "region": region,
+            "predictions": stored_forecast,
+        }
+
+    # 4. Stale or missing forecast - live inference needs the model, so let the shard
+    # that keeps it warm serve the request. If that shard is unavailable, predict here
+    # without caching the model (it belongs to another shard)
+    owned = shard_router.is_local(model_filename)
+    if route and not owned:
+        forwarded = forward_prediction(region, crop_name, model_filename)
+        if forwarded is not None:
+            return forwarded
+
+    # Retrieve last 4 *actual* prices for live inference,
+    # along with the recent prediction errors that size the prediction intervals (one query)
+    # Ensure you are only getting actual data (actual = 1)
+    rows, squared_errors = get_storage().get_prediction_inputs(region, crop_name, LAG_WEEKS, PREDICTION_INTERVAL_ERRORS)
 
-    print(f"📈 Using last 4 actual prices for {crop_name} in {data.region} ending {latest_date_str}: {last_4_week_prices}")
+    # 5. Check if enough historical data is available
+    if len(rows) < LAG_WEEKS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Not enough historical data to make a prediction for {crop_name} in {region} (need at least {LAG_WEEKS} weeks of *actual* price data). Found {len(rows)}.",
+        )
 
+    # 6. Prepare lag values (rows are returned in chronological order)
+    last_4_week_prices = [row[1] for row in rows]
+    latest_date_str = rows[-1][0]
 
-    # 5. Load the specific model for the region and crop type
-    # Model names are expected in the format Region__CropType.joblib
-    model_filename = f"{data.region}__{crop_type}.joblib".replace(" ", "_")
-    model_path = os.path.join(MODELS_PATH, model_filename)
+    print(f"📈 Using last {LAG_WEEKS} actual prices for {crop_name} in {region} ending {latest_date_str}: {last_4_week_prices}")
 
-    if not os.path.exists(model_path):
-        raise HTTPException(
-            status_code=404,
-            detail=f"Model file '{model_filename}' not found for region '{data.region}' and crop type '{crop_type}'.",
-        )
 
+    # 7. Load the model (or reuse it, if it is warm)
     try:
-        model_data = joblib.load(model_path)
+        model_data = model_cache.get(region, crop_type, version, keep=owned)
         model = model_data["model"]
         # Assuming your saved model data includes the LabelEncoder used during training
         encoder: LabelEncoder = model_data["label_encoder"]
@@ -96,7 +132,7 @@ def predict_prices(data: PredictionPayload):
         )
 
 
-    # 6. Encode the crop name using the model's encoder
+    # 8. Encode the crop name using the model's encoder
     try:
         crop_enc = encoder.transform([crop_name])[0]
         print(f"Crop '{crop_name}' encoded to {crop_enc}")
@@ -106,62 +142,68 @@ def predict_prices(data: PredictionPayload):
          raise HTTPException(status_code=500, detail=f"Error during crop encoding: {e}")
 
 
-    # 7. Prepare input for the model and make predictions
+    # 9. Prepare input for the model and make predictions
     # The input features are the encoded crop followed by the 4 lag prices
     X_input = np.array([[crop_enc] + last_4_week_prices])
+    offsets = np.array([interval_offsets(squared_errors)])
     try:
-        # Model is expected to predict a list/array of future prices
-        y_pred = model.predict(X_input)[0].tolist() # Assuming predict returns [prediction1, prediction2, ...]
-        print(f"🔮 Model predicted raw prices: {y_pred}")
+        # Model is expected to predict a list/array of future prices,
+        # the quantile bands are derived in the same step
+        y_pred, bands = predict_with_intervals(model, X_input, offsets)
+        print(f"🔮 Model predicted raw prices: {y_pred[0].tolist()}")
     except Exception as e:
          raise HTTPException(status_code=500, detail=f"Error during model prediction: {e}")
 
 
-    # 8. Build prediction output with future dates and prepare database entries
-    prediction_output = []
-    future_db_entries = [] # List to hold tuples for bulk insertion
-    for i, price in enumerate(y_pred):
-        # Calculate the date for each future week
-        future_date = (latest_date + timedelta(weeks=i + 1)).strftime("%Y-%m-%d")
-        # Ensure price is not negative (optional, based on domain knowledge)
-        cleaned_price = max(0.0, round(price, 2))
-
-        prediction_output.append(
-            {
-                "prediction_index": i,
-                "date": future_date,
-                "price": cleaned_price,
-            }
-        )
-        # Prepare data for insertion into the 'price' table
-        # Use actual=0 to mark these as predictions
-        future_db_entries.append(
-            (future_date, data.region, crop_name, cleaned_price, 0)
-        )
+    # 10. Build prediction output with future dates and store it as the materialized forecast
+    # (this also writes the predicted rows into the 'price' table with actual=0, through the
+    # write-behind buffer when it is enabled)
+    prediction_output = build_forecast(latest_date_str, y_pred[0], bands[0])
 
-    with sqlite3.connect(DB_PATH) as conn:
-        cursor = conn.cursor()
-        try:
-            cursor.executemany(
-                """
-                INSERT OR IGNORE INTO price (date, region, crop, price, actual)
-                VALUES (?, ?, ?, ?, ?)
-                """,
-                future_db_entries,
-            )
-            conn.commit()
-            print(f"✅ Inserted {cursor.rowcount} new predicted price records.")
-            # Note: rowcount only shows *new* inserts due to INSERT OR IGNORE
-        except Exception as e:
-             # Rollback in case of any error during insertion
-            conn.rollback()
-            print(f"❌ Error inserting predicted prices: {e}")
-            raise HTTPException(status_code=500, detail=f"Database error while storing predictions: {e}")
-
-
-    # 10. Return the prediction output
+    try:
+        store_forecasts([(region, crop_name, latest_date_str, version, prediction_output)], defer=True)
+        print(f"✅ Stored {len(prediction_output)} predicted price records.")
+    except Exception as e:
+        print(f"❌ Error inserting predicted prices: {e}")
+        raise HTTPException(status_code=500, detail=f"Database error while storing predictions: {e}")
+
+
+    # 11. Return the prediction output
     return {
         "crop": crop_name,
-        "region": data.region,
+        "region": region,
         "predictions": prediction_output,
-    }
\ No newline at end of file
+    }
+
+
+def run_prediction(region: str, crop: str, forwarded: bool = False) -> dict:
+    """
+    Prediction core shared by the JSON and msgpack routes. Concurrent calls for the
+    same crop and region share a single computation.
+    """
+    crop_name = crop.strip()
+    try:
+        return prediction_flight.do(
+            (region, crop_name),
+            lambda: generate_predictions(region, crop_name, route=not forwarded),
+        )
+    except TimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
+
+
+# --------------------------------
+#             ROUTES
+# --------------------------------
+
+
+@router.post("")
+@profiled("predict")
+def predict_prices(
+    data: PredictionPayload,
+    forwarded_by: str | None = Header(None, alias=SHARD_FORWARDED_HEADER),
+):
+    """
+    Generates price predictions for a given crop and region based on historical data.
+    Concurrent requests for the same crop and region share a single computation.
+    """
+    return run_prediction(data.region, data.crop, forwarded=forwarded_by is not None)
\ No newline at end of file
@@ -0,0 +1,37 @@
+# routes/profiles.py
+
+from typing import Literal
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import FileResponse, PlainTextResponse
+from services.profiling import list_profiles, get_profile_path, render_profile
+from settings import PROFILE_TEXT_LIMIT
+
+# Setup profiles router
+router = APIRouter(
+    prefix="/profiles",
+    tags=["Profiles"],
+)
+
+# --------------------------------
+#             ROUTES
+# --------------------------------
+
+
+@router.get("")
+def get_profiles():
+    """Lists the saved request and retraining profiles, most recent first."""
+    return {"profiles": list_profiles()}
+
+
+@router.get("/{name}")
+def download_profile(name: str, format: Literal["pstats", "text"] = "pstats"):
+    """
+    Downloads a saved profile, either as a pstats file (for snakeviz, pstats, ...)
+    or as text listing the most expensive functions by cumulative time.
+    """
+    path = get_profile_path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"Profile '{name}' not found.")
+    if format == "text":
+        return PlainTextResponse(render_profile(path, PROFILE_TEXT_LIMIT))
+    return FileResponse(path, media_type="application/octet-stream", filename=name)
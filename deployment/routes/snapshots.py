@@ -0,0 +1,47 @@
+# routes/snapshots.py
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import FileResponse
+from services.snapshots import SNAPSHOTS_AVAILABLE, describe_snapshots, get_export_path
+
+# Setup snapshots router
+router = APIRouter(
+    prefix="/snapshots",
+    tags=["Snapshots"],
+)
+
+# --------------------------------
+#         HELPER FUNCTIONS
+# --------------------------------
+
+
+def require_snapshots():
+    """Rejects snapshot requests when the optional pyarrow dependency is missing."""
+    if not SNAPSHOTS_AVAILABLE:
+        raise HTTPException(status_code=503, detail="Price snapshots are unavailable: install pyarrow to enable them.")
+
+
+# --------------------------------
+#             ROUTES
+# --------------------------------
+
+
+@router.get("")
+def list_snapshots():
+    """Lists the price snapshot partitions (one per region)."""
+    require_snapshots()
+    return {"partitions": describe_snapshots()}
+
+
+@router.get("/prices/{region}")
+def export_prices(region: str):
+    """
+    Downloads all actual prices of a region as a Parquet file (columns crop, date, price),
+    served from the snapshot instead of querying the production database.
+    """
+    require_snapshots()
+    path = get_export_path(region)
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"No actual prices found for region '{region}'.")
+    filename = f"prices_{region}.parquet".replace(" ", "_")
+    return FileResponse(path, media_type="application/vnd.apache.parquet", filename=filename)
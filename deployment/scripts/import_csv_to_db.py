@@ -1,7 +1,6 @@
 
 
 import pandas as pd
-import sqlite3
 import os
 import sys
 
@@ -11,23 +10,28 @@ if PROJECT_ROOT not in sys.path:
     sys.path.append(PROJECT_ROOT)
 
 try:
-    from settings import DB_PATH
-    print(f"Database path loaded from settings: {DB_PATH}")
-    
+    from settings import DB_PATH, DATABASE_URL
+    from storage import get_storage
+
     # Show the current working directory to help with debugging
     print(f"Current working directory: {os.getcwd()}")
     print(f"Project root directory: {PROJECT_ROOT}")
-    print(f"Database path exists: {os.path.exists(DB_PATH)}")
-    
-    # Try to check if the database file exists
-    if not os.path.exists(DB_PATH):
-        print(f"Database file does not exist at {DB_PATH}")
-        db_dir = os.path.dirname(DB_PATH)
-        if not os.path.exists(db_dir):
-            print(f"Database directory does not exist. Creating: {db_dir}")
-            os.makedirs(db_dir, exist_ok=True)
+
+    if DATABASE_URL:
+        print("Database: PostgreSQL (DATABASE_URL is set)")
+    else:
+        print(f"Database path loaded from settings: {DB_PATH}")
+        print(f"Database path exists: {os.path.exists(DB_PATH)}")
+
+        # Try to check if the database file exists
+        if not os.path.exists(DB_PATH):
+            print(f"Database file does not exist at {DB_PATH}")
+            db_dir = os.path.dirname(DB_PATH)
+            if db_dir and not os.path.exists(db_dir):
+                print(f"Database directory does not exist. Creating: {db_dir}")
+                os.makedirs(db_dir, exist_ok=True)
 except ImportError:
-    print("Error: Could not import DB_PATH from settings. Make sure settings.py is accessible.")
+    print("Error: Could not import settings or storage. Make sure settings.py is accessible.")
     sys.exit(1)
 
 # --- Configuration ---
@@ -48,60 +52,30 @@ CSV_TO_DB_MAPPING = {
 }
 # --- End Configuration ---
 
-def create_price_table_if_not_exists(db_path: str):
+def create_tables_if_not_exist():
     """
-    Creates the 'price' table in the database if it doesn't already exist.
+    Creates the database tables (including 'price') if they don't already exist.
     """
     try:
-        with sqlite3.connect(db_path) as conn:
-            cursor = conn.cursor()
-            
-            # Check if the table exists
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='price'")
-            if not cursor.fetchone():
-                print("'price' table does not exist. Creating it now...")
-                
-                # Create the price table with appropriate schema
-                cursor.execute('''
-                CREATE TABLE price (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    date TEXT NOT NULL,
-                    region TEXT NOT NULL,
-                    crop TEXT NOT NULL,
-                    price REAL NOT NULL,
-                    actual INTEGER DEFAULT 0,
-                    UNIQUE(date, region, crop)
-                )
-                ''')
-                
-                conn.commit()
-                print("'price' table created successfully.")
-            else:
-                print("'price' table already exists in the database.")
-                
-    except sqlite3.Error as e:
-        print(f"Database error while checking/creating table: {e}")
+        get_storage().init_schema()
+        print("Database tables are ready.")
+    except Exception as e:
+        print(f"Database error while checking/creating tables: {e}")
         return False
-    
+
     return True
 
-def import_price_data_from_csv(csv_path: str, db_path: str):
+def import_price_data_from_csv(csv_path: str):
     """
     Reads historical price data from a CSV file and imports it into the
-    'price' table in the SQLite database, marking entries as actual data.
+    'price' table of the configured database, marking entries as actual data.
     """
     if not os.path.exists(csv_path):
         print(f"Error: CSV file not found at '{csv_path}'")
         return
 
-    # Ensure the database directory exists
-    db_dir = os.path.dirname(db_path)
-    if db_dir and not os.path.exists(db_dir):
-        os.makedirs(db_dir, exist_ok=True)
-        print(f"Created database directory: {db_dir}")
-    
-    # Create the price table if it doesn't exist
-    if not create_price_table_if_not_exists(db_path):
+    # Create the tables if they don't exist
+    if not create_tables_if_not_exist():
         print("Failed to ensure 'price' table exists. Aborting import.")
         return
 
@@ -139,33 +113,17 @@ def import_price_data_from_csv(csv_path: str, db_path: str):
 
         print(f"Attempting to insert {len(data_to_insert)} rows into the 'price' table...")
 
-        # Connect to the database
-        with sqlite3.connect(db_path) as conn:
-            cursor = conn.cursor()
-
-            # Use executemany for efficient bulk insertion
-            # Use INSERT OR IGNORE to skip rows that would violate the UNIQUE(date, region, crop) constraint
-            # This is helpful if you run the script multiple times or have partial data already.
-            try:
-                cursor.executemany(
-                    """
-                    INSERT OR IGNORE INTO price (date, region, crop, price, actual)
-                    VALUES (?, ?, ?, ?, ?)
-                    """,
-                    data_to_insert
-                )
-
-                # Commit the transaction
-                conn.commit()
-                # Note: cursor.rowcount after INSERT OR IGNORE with executemany might be -1 or inconsistent
-                # depending on the SQLite version and driver. It's safer to report total attempted.
-                print(f"Import complete. Attempted to process {len(data_to_insert)} rows.")
-                print("Historical data import finished.")
-
-            except sqlite3.Error as e:
-                print(f"Database error during import: {e}")
-                conn.rollback() # Roll back in case of error
-
+        # Bulk load through the storage backend (executemany for SQLite, COPY for PostgreSQL)
+        # Rows that would violate the UNIQUE(date, region, crop) constraint are skipped.
+        # This is helpful if you run the script multiple times or have partial data already.
+        try:
+            attempted = get_storage().bulk_load_prices(data_to_insert)
+            print(f"Import complete. Attempted to process {attempted} rows.")
+            print("Historical data import finished.")
+        except Exception as e:
+            print(f"Database error during import: {e}")
+
+        get_storage().close()
         print("Database connection closed.")
 
     except FileNotFoundError:
@@ -182,5 +140,5 @@ def import_price_data_from_csv(csv_path: str, db_path: str):
 # This block ensures the import function runs only when the script is executed directly
 if __name__ == "__main__":
     print("--- Starting Historical Data Import Script ---")
-    import_price_data_from_csv(CSV_FILE_PATH, DB_PATH)
+    import_price_data_from_csv(CSV_FILE_PATH)
     print("--- Script Finished ---")
\ No newline at end of file
@@ -0,0 +1,17 @@
+import os
+import sys
+
+# Add the project root directory to the system path to import settings and services
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '../'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.append(PROJECT_ROOT)
+
+from services.forecasts import materialize_forecasts
+
+
+# Recomputes every stored forecast in one pass. Useful from cron or right after
+# a bulk import, instead of waiting for the API's background job.
+if __name__ == "__main__":
+    print("--- Starting Forecast Materialization ---")
+    materialize_forecasts()
+    print("--- Script Finished ---")
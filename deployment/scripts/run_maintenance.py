@@ -0,0 +1,18 @@
+import os
+import sys
+
+# Add the project root directory to the system path to import settings and services
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '../'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.append(PROJECT_ROOT)
+
+from services.maintenance import run_maintenance
+
+
+# Runs the database maintenance tasks once (error rollup and archiving, stale
+# prediction pruning, vacuum/analyze). Useful from cron when the API's background
+# job is disabled with MAINTENANCE_INTERVAL = 0.
+if __name__ == "__main__":
+    print("--- Starting Database Maintenance ---")
+    run_maintenance()
+    print("--- Script Finished ---")
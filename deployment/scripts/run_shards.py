@@ -0,0 +1,69 @@
+import os
+import sys
+import time
+import signal
+import argparse
+import subprocess
+
+# The API is started from the project root, where main.py and the models live
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '../'))
+
+
+def shard_nodes(args) -> list:
+    """Returns the address of every shard, as expected in SHARD_NODES."""
+    if args.uds_dir:
+        return [f"unix:{os.path.abspath(os.path.join(args.uds_dir, f'shard-{i}.sock'))}" for i in range(args.shards)]
+    return [f"http://{args.host}:{args.base_port + i}" for i in range(args.shards)]
+
+
+def start_shard(node: str, nodes: list, args) -> subprocess.Popen:
+    """Starts one API process serving `node`'s share of the models."""
+    if node.startswith("unix:"):
+        bind = ["--uds", node[len("unix:"):]]
+    else:
+        host, port = node[len("http://"):].rsplit(":", 1)
+        bind = ["--host", host, "--port", port]
+    env = {**os.environ, "SHARD_NODES": ",".join(nodes), "SHARD_SELF": node}
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", *bind, "--log-level", args.log_level],
+        cwd=PROJECT_ROOT,
+        env=env,
+    )
+
+
+# Starts several API processes on this machine that split the models between them
+# (see SHARD_NODES in settings.py). Predictions sent to any shard are forwarded to
+# the shard owning their model. Stops all shards on Ctrl+C, or if one of them exits.
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run local AgroProphet shards.")
+    parser.add_argument("--shards", type=int, default=2, help="Number of shards to start")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--base-port", type=int, default=8001, help="Port of the first shard (the others follow)")
+    parser.add_argument("--uds-dir", help="Listen on unix sockets in this directory instead of TCP ports")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    if args.uds_dir:
+        os.makedirs(args.uds_dir, exist_ok=True)
+
+    nodes = shard_nodes(args)
+    print(f"--- Starting {len(nodes)} shards: {', '.join(nodes)} ---")
+    processes = [start_shard(node, nodes, args) for node in nodes]
+
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        while all(process.poll() is None for process in processes):
+            time.sleep(0.5)
+        print("❌ A shard exited, stopping the others.")
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        for process in processes:
+            if process.poll() is None:
+                process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        print("--- Shards Stopped ---")
@@ -0,0 +1,59 @@
+# services/assets.py
+
+import os
+import hashlib
+from fastapi.staticfiles import StaticFiles
+from settings import STATIC_CACHE_MAX_AGE
+
+
+def etag_matches(if_none_match, etag: str) -> bool:
+    """Whether an If-None-Match header matches an ETag (weak comparison, as for GET)."""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag.removeprefix("W/") in (tag.removeprefix("W/") for tag in tags)
+
+
+class CachedFile:
+    """
+    A file kept in memory and reloaded when its modification time or size changes,
+    so edits are picked up without restarting the API.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._cached = None  # (mtime_ns, size, content, etag)
+
+    def get(self) -> tuple:
+        """
+        Returns the file's content and ETag, reloading it if it changed on disk.
+
+        Raises:
+            FileNotFoundError: If the file does not exist.
+        """
+        stat = os.stat(self.path)
+        cached = self._cached
+        if cached is None or cached[:2] != (stat.st_mtime_ns, stat.st_size):
+            with open(self.path, "rb") as f:
+                content = f.read()
+            # Hashing the content keeps the ETag identical across API processes
+            etag = f'"{hashlib.md5(content).hexdigest()}"'
+            cached = (stat.st_mtime_ns, stat.st_size, content, etag)
+            self._cached = cached
+        return cached[2], cached[3]
+
+
+class CachingStaticFiles(StaticFiles):
+    """
+    Static files sent with a Cache-Control header, so browsers reuse them for
+    STATIC_CACHE_MAX_AGE seconds and then revalidate them with their ETag.
+    """
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200):
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        response.headers["Cache-Control"] = f"public, max-age={STATIC_CACHE_MAX_AGE}"
+        return response
+
+
+# The dashboard page served at "/"
+index_page = CachedFile("static/index.html")
@@ -0,0 +1,103 @@
+# services/catalog.py
+
+import threading
+from datetime import datetime, timezone
+from services.models import get_model_filename, scan_model_versions
+from services.scheduler import PeriodicJob
+from storage import get_storage
+from settings import CATALOG_REFRESH_INTERVAL
+
+
+class CatalogSnapshot:
+    """
+    Read-only view of the crop taxonomy, the regions and the available models,
+    as loaded by one catalog refresh.
+    """
+
+    def __init__(self, crop_types: dict, regions: list, model_versions: dict):
+        self.crop_types = crop_types          # crop -> crop type
+        self.regions = regions                # region names with price data
+        self.model_versions = model_versions  # model filename -> version tag
+        self.loaded_at = datetime.now(timezone.utc)
+
+
+class Catalog:
+    """
+    In-memory catalog answering "what type is this crop?" and "is there a model
+    for this region and crop type?" with dictionary lookups instead of settings
+    checks and filesystem stat calls on every request.
+
+    A refresh builds a complete new snapshot and swaps it in with a single
+    assignment, so readers always see one consistent snapshot.
+    """
+
+    def __init__(self):
+        self._snapshot = None
+        self._refresh_lock = threading.Lock()
+
+    @property
+    def snapshot(self) -> CatalogSnapshot:
+        # Loaded lazily so code running outside the app (scripts, benchmarks) works too
+        snapshot = self._snapshot
+        if snapshot is None:
+            snapshot = self.refresh()
+        return snapshot
+
+    def refresh(self) -> CatalogSnapshot:
+        """Reloads crops and regions from the database and rescans the models directory."""
+        with self._refresh_lock:
+            storage = get_storage()
+            snapshot = CatalogSnapshot(
+                crop_types=storage.get_crop_types(),
+                regions=storage.get_regions(),
+                model_versions=scan_model_versions(),
+            )
+            self._snapshot = snapshot
+        return snapshot
+
+    def crop_type(self, crop: str):
+        """Returns the crop type of a crop, or None if the crop is unknown."""
+        return self.snapshot.crop_types.get(crop)
+
+    def model_version(self, region: str, crop_type: str):
+        """Returns the version tag of the Region__CropType model, or None if there is no model."""
+        return self.snapshot.model_versions.get(get_model_filename(region, crop_type))
+
+    def add_crop(self, name: str, crop_type: str):
+        """Adds (or re-types) a crop and refreshes the catalog so it is usable immediately."""
+        get_storage().store_crop(name, crop_type)
+        self.refresh()
+
+    def to_dict(self) -> dict:
+        """Serializes the current snapshot for the catalog endpoint."""
+        snapshot = self.snapshot
+        crops_by_type = {}
+        for crop, crop_type in sorted(snapshot.crop_types.items()):
+            crops_by_type.setdefault(crop_type, []).append(crop)
+
+        return {
+            "crops": crops_by_type,
+            "regions": [
+                {
+                    "name": region,
+                    "models": {
+                        crop_type: get_model_filename(region, crop_type) in snapshot.model_versions
+                        for crop_type in sorted(crops_by_type)
+                    },
+                }
+                for region in snapshot.regions
+            ],
+            "model_count": len(snapshot.model_versions),
+            "loaded_at": snapshot.loaded_at.isoformat(),
+        }
+
+
+# Shared catalog of the API process
+catalog = Catalog()
+
+# Background job that picks up models and crops changed outside this process
+catalog_job = PeriodicJob(
+    name="catalog-refresher",
+    func=catalog.refresh,
+    interval=CATALOG_REFRESH_INTERVAL,
+)
@@ -0,0 +1,85 @@
+# services/coalescing.py
+
+import threading
+from settings import PREDICTION_COALESCE_TIMEOUT
+
+
+class _Call:
+    """An in-flight computation that other callers can wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key: the first caller runs the
+    function, and callers arriving while it is in flight wait for it and share
+    its result (or its exception) instead of running it again.
+    """
+
+    def __init__(self, name: str, timeout: float):
+        self.name = name
+        self.timeout = timeout
+        self._calls = {}
+        self._lock = threading.Lock()
+
+        # Metrics
+        self._executions = 0
+        self._coalesced = 0
+        self._timeouts = 0
+
+    def do(self, key, func, timeout: float | None = None):
+        """
+        Runs `func()` for `key`, or waits for the call already in flight.
+
+        Raises:
+            TimeoutError: If this caller waited longer than `timeout` seconds
+                          (default: the instance timeout) for an in-flight call.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self._executions += 1
+            else:
+                self._coalesced += 1
+
+        if leader:
+            try:
+                call.result = func()
+            except Exception as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+        elif not call.done.wait(self.timeout if timeout is None else timeout):
+            with self._lock:
+                self._timeouts += 1
+            raise TimeoutError(f"Timed out waiting for in-flight '{self.name}' call for {key}.")
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def stats(self) -> dict:
+        """Returns how many calls ran, how many were coalesced and how many timed out."""
+        with self._lock:
+            total = self._executions + self._coalesced
+            return {
+                "in_flight": len(self._calls),
+                "executions": self._executions,
+                "coalesced": self._coalesced,
+                "coalesced_ratio": round(self._coalesced / total, 4) if total else 0.0,
+                "timeouts": self._timeouts,
+                "timeout_seconds": self.timeout,
+            }
+
+
+# Shared by all concurrent predictions for the same (region, crop)
+prediction_flight = SingleFlight("predict", PREDICTION_COALESCE_TIMEOUT)
@@ -0,0 +1,175 @@
+# services/compression.py
+
+import zlib
+from starlette.datastructures import Headers, MutableHeaders
+from settings import (
+    COMPRESSION_MIN_SIZE,
+    COMPRESSION_GZIP_LEVEL,
+    COMPRESSION_BROTLI_QUALITY,
+)
+
+try:
+    import brotli
+except ImportError:
+    # brotli is optional: without it, responses are compressed with gzip only
+    brotli = None
+
+# Encodings offered to clients, preferred first
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+# Only text formats are worth compressing (msgpack, Parquet and pstats responses
+# are already compact, and msgpack streams must not be held back by a compressor)
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+)
+
+
+# --------------------------------
+#         HELPER FUNCTIONS
+# --------------------------------
+
+
+def choose_encoding(accept_encoding: str):
+    """
+    Picks the response encoding from an Accept-Encoding header: the supported
+    encoding with the highest q-value, preferring brotli on ties.
+
+    Returns:
+        "br", "gzip", or None if the response should not be compressed.
+    """
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key.lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[name] = quality
+
+    best, best_quality = None, 0.0
+    for encoding in ENCODINGS:
+        quality = accepted.get(encoding, accepted.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def is_compressible(headers: Headers) -> bool:
+    """Whether a response, judging by its headers, should be compressed."""
+    content_type = headers.get("content-type", "").lower()
+    return (
+        content_type.startswith(COMPRESSIBLE_TYPES)
+        and "content-encoding" not in headers
+        and "content-range" not in headers
+    )
+
+
+class _GzipCompressor:
+    def __init__(self):
+        # wbits 16 + MAX_WBITS writes a gzip header and trailer
+        self._compressor = zlib.compressobj(COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        # Flushing every chunk of a streamed response sends it without delay
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class _BrotliCompressor:
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=COMPRESSION_BROTLI_QUALITY)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        output = self._compressor.process(data)
+        return output + (self._compressor.finish() if final else self._compressor.flush())
+
+
+_COMPRESSORS = {"gzip": _GzipCompressor, "br": _BrotliCompressor}
+
+
+# --------------------------------
+#            MIDDLEWARE
+# --------------------------------
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing text responses of at least `minimum_size` bytes with
+    brotli or gzip, as negotiated with the client's Accept-Encoding header.
+
+    Streamed responses are compressed chunk by chunk (each chunk is flushed). Strong
+    ETags of compressed responses are made weak, since the bytes sent differ from the
+    representation they were computed on.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor = None
+        decided = False
+
+        async def send_compressed(message):
+            nonlocal start_message, compressor, decided
+            if message["type"] == "http.response.start":
+                # Held back until the first body chunk shows whether to compress
+                start_message = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if not decided:
+                decided = True
+                headers = MutableHeaders(raw=start_message["headers"])
+                if is_compressible(headers):
+                    headers.add_vary_header("Accept-Encoding")
+                    if more_body or len(body) >= self.minimum_size:
+                        compressor = _COMPRESSORS[encoding]()
+                        headers["Content-Encoding"] = encoding
+                        etag = headers.get("etag")
+                        if etag and not etag.startswith("W/"):
+                            headers["ETag"] = f"W/{etag}"
+                        if more_body:
+                            del headers["Content-Length"]
+                        else:
+                            body = compressor.compress(body, final=True)
+                            headers["Content-Length"] = str(len(body))
+                            await send(start_message)
+                            await send({"type": "http.response.body", "body": body})
+                            return
+                await send(start_message)
+
+            if compressor is not None:
+                message = {
+                    "type": "http.response.body",
+                    "body": compressor.compress(body, final=not more_body),
+                    "more_body": more_body,
+                }
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
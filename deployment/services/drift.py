@@ -0,0 +1,89 @@
+# services/drift.py
+
+import math
+import threading
+from datetime import datetime, timedelta, timezone
+from storage import get_storage
+from settings import (
+    MIN_ERROR_POINTS,
+    DRIFT_WINDOW_WEEKS,
+    DRIFT_RELATIVE_THRESHOLD,
+    DRIFT_BASELINE_FACTOR,
+    DRIFT_MIN_RELATIVE_THRESHOLD,
+)
+
+
+def drift_threshold(mean_price: float, baseline_rmse) -> tuple:
+    """
+    Returns the RMSE threshold of a pair and what it is based on.
+
+    Without a baseline the threshold is relative to the pair's price level. With one,
+    it is learned from the model's backtest error, floored relative to the price level.
+
+    Returns:
+        Tuple (threshold, basis) where basis is "relative", "baseline" or "relative_floor".
+    """
+    if baseline_rmse is None:
+        return DRIFT_RELATIVE_THRESHOLD * mean_price, "relative"
+    learned = DRIFT_BASELINE_FACTOR * baseline_rmse
+    floor = DRIFT_MIN_RELATIVE_THRESHOLD * mean_price
+    return (learned, "baseline") if learned >= floor else (floor, "relative_floor")
+
+
+class DriftMonitor:
+    """
+    Computes the rolling RMSE of a pair against its own threshold and keeps the
+    latest check of every pair for the metrics endpoint.
+    """
+
+    def __init__(self):
+        self._checks = {}  # (region, crop) -> latest check
+        self._lock = threading.Lock()
+
+    def check(self, date: str, region: str, crop: str):
+        """
+        Checks a pair's drift over the DRIFT_WINDOW_WEEKS weeks ending at `date`.
+
+        Returns:
+            Dict describing the check (drift_score > 1 means drifting), or None if there
+            are not enough errors since the model was last retrained.
+        """
+        start_date = (datetime.strptime(date, "%Y-%m-%d") - timedelta(weeks=DRIFT_WINDOW_WEEKS)).strftime("%Y-%m-%d")
+        errors, mean_price, baseline = get_storage().get_drift_inputs(region, crop, start_date, date)
+
+        if len(errors) < MIN_ERROR_POINTS or not mean_price:
+            print(f"ℹ️ Not enough error points ({len(errors)}) for {region}/{crop} in rolling window ending {date}. Need {MIN_ERROR_POINTS} to check RMSE.")
+            return None
+
+        rmse = math.sqrt(sum(errors) / len(errors))
+        baseline_rmse = baseline["baseline_rmse"] if baseline else None
+        threshold, basis = drift_threshold(mean_price, baseline_rmse)
+        result = {
+            "date": date,
+            "rmse": round(rmse, 4),
+            "error_points": len(errors),
+            "mean_price": round(mean_price, 4),
+            "baseline_rmse": None if baseline_rmse is None else round(baseline_rmse, 4),
+            "threshold": round(threshold, 4),
+            "basis": basis,
+            "drift_score": round(rmse / threshold, 4),
+            "checked_at": datetime.now(timezone.utc).isoformat(),
+        }
+        with self._lock:
+            self._checks[(region, crop)] = result
+        return result
+
+    def forget(self, region: str, crop: str):
+        """Drops the latest check of a pair (its model was just retrained)."""
+        with self._lock:
+            self._checks.pop((region, crop), None)
+
+    def to_list(self) -> list:
+        """Returns the latest check of every pair checked by this process, worst drift first."""
+        with self._lock:
+            checks = [{"region": region, "crop": crop, **check} for (region, crop), check in self._checks.items()]
+        return sorted(checks, key=lambda check: check["drift_score"], reverse=True)
+
+
+# Shared drift monitor of the API process
+drift_monitor = DriftMonitor()
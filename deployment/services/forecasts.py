@@ -0,0 +1,298 @@
+# services/forecasts.py
+
+import threading
+import numpy as np
+import functools
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from services.scheduler import PeriodicJob
+from services.writeback import WriteBehindBuffer
+from services.models import get_model_filename, model_cache
+from services.catalog import catalog
+from services.sharding import shard_router
+from storage import get_storage
+from settings import (
+    LAG_WEEKS,
+    MIN_ERROR_POINTS,
+    PREDICTION_INTERVAL_QUANTILES,
+    PREDICTION_INTERVAL_ERRORS,
+    FORECAST_MAX_AGE,
+    FORECAST_REFRESH_INTERVAL,
+    FORECAST_STALE_REFRESH_DELAY,
+    WRITE_BEHIND_ENABLED,
+    WRITE_BEHIND_BATCH_SIZE,
+    WRITE_BEHIND_FLUSH_INTERVAL,
+)
+
+
+# --------------------------------
+#         HELPER FUNCTIONS
+# --------------------------------
+
+
+# Keys of the quantiles in forecast output, e.g. 0.1 -> "p10"
+QUANTILE_LABELS = [f"p{round(q * 100)}" for q in PREDICTION_INTERVAL_QUANTILES]
+
+
+def interval_offsets(squared_errors: list, weeks: int = LAG_WEEKS) -> np.ndarray:
+    """
+    Computes conformal offsets for PREDICTION_INTERVAL_QUANTILES from a pair's recent
+    squared errors: the absolute residuals give a symmetric band around the point
+    forecast (e.g. P10/P90 are the point forecast -/+ the 80th percentile residual).
+
+    Logged errors compare an actual price with the latest forecast of its week, which
+    was made one week ahead, so the offsets measured on them are widened with the
+    square root of the horizon for the weeks after (errors add up week over week):
+    the band of the 4th week ahead is twice as wide as the band of the next week.
+
+    Returns:
+        Array of shape (weeks, quantiles) with the offsets of every week ahead. It is
+        all NaN while the pair has fewer than MIN_ERROR_POINTS errors (e.g. a new pair
+        or model), and the forecast then has no quantiles rather than made-up ones.
+    """
+    quantiles = np.array(PREDICTION_INTERVAL_QUANTILES)
+    if len(squared_errors) < MIN_ERROR_POINTS:
+        return np.full((weeks, len(quantiles)), np.nan)
+    residuals = np.sqrt(np.asarray(squared_errors, dtype=float))
+    coverage = np.abs(2 * quantiles - 1)
+    offsets = np.sign(quantiles - 0.5) * np.quantile(residuals, coverage, method="higher")
+    horizon_scale = np.sqrt(np.arange(1, weeks + 1))
+    return horizon_scale[:, np.newaxis] * offsets[np.newaxis, :]
+
+
+def predict_with_intervals(model, X_input: np.ndarray, offsets: np.ndarray) -> tuple:
+    """
+    Predicts point forecasts for every row of X_input and their quantile bands
+    in the same vectorized step.
+
+    Args:
+        X_input: Feature matrix, one row per crop.
+        offsets: Interval offsets of shape (crops, weeks, quantiles), see `interval_offsets`.
+
+    Returns:
+        Tuple (y_pred, bands) with shapes (crops, weeks) and (crops, weeks, quantiles).
+    """
+    y_pred = np.asarray(model.predict(X_input), dtype=float)
+    bands = y_pred[:, :, np.newaxis] + offsets
+    return y_pred, bands
+
+
+def build_forecast(latest_date_str: str, y_pred, bands=None) -> list:
+    """
+    Turns one row of raw model output into dated prediction entries,
+    one per future week after the latest actual price date.
+    `bands` holds the matching quantile prices per week (NaN when unavailable).
+    """
+    latest_date = datetime.strptime(latest_date_str, "%Y-%m-%d")
+    forecast = []
+    for i, price in enumerate(y_pred):
+        # Calculate the date for each future week
+        future_date = (latest_date + timedelta(weeks=i + 1)).strftime("%Y-%m-%d")
+        # Ensure price is not negative (optional, based on domain knowledge)
+        cleaned_price = max(0.0, round(float(price), 2))
+        quantiles = None
+        if bands is not None and not np.isnan(bands[i]).any():
+            quantiles = {
+                label: max(0.0, round(float(value), 2))
+                for label, value in zip(QUANTILE_LABELS, bands[i])
+            }
+        forecast.append(
+            {
+                "prediction_index": i,
+                "date": future_date,
+                "price": cleaned_price,
+                "quantiles": quantiles,
+            }
+        )
+    return forecast
+
+
+def store_forecasts(forecasts: list, defer: bool = False):
+    """
+    Stores forecasts (and their predicted rows in the 'price' table) in one transaction.
+
+    Args:
+        forecasts: List of tuples (region, crop, base_date, model_version, forecast),
+                   where forecast is the output of `build_forecast`.
+        defer: Hand the rows to the write-behind buffer instead, if it is enabled.
+    """
+    rows = [
+        (region, crop, entry["prediction_index"], entry["date"], entry["price"], base_date, version, entry["quantiles"])
+        for region, crop, base_date, version, forecast in forecasts
+        for entry in forecast
+    ]
+    if defer and WRITE_BEHIND_ENABLED:
+        forecast_writer.put(rows)
+    else:
+        get_storage().store_forecasts(rows)
+
+
+def get_stored_forecast(region: str, crop: str, version: str):
+    """
+    Returns the materialized forecast for a region and crop, or None if it is stale.
+
+    A stored forecast is stale when newer actual prices have arrived since it was
+    computed, when the model has been retrained since, or when it is older than
+    FORECAST_MAX_AGE seconds.
+    """
+    rows = get_storage().get_forecast_rows(region, crop)
+    if not rows:
+        return None
+
+    oldest_allowed = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=FORECAST_MAX_AGE)
+    for row in rows:
+        if row["base_date"] != row["latest_actual"] or row["model_version"] != version:
+            return None
+        if row["created_at"] < oldest_allowed:
+            return None
+
+    return [
+        {
+            "prediction_index": row["prediction_index"],
+            "date": row["date"],
+            "price": row["price"],
+            "quantiles": row["quantiles"],
+        }
+        for row in rows
+    ]
+
+
+# --------------------------------
+#          MATERIALIZER
+# --------------------------------
+
+
+def materialize_forecasts(only_models: set | None = None, owned_only: bool = False, only_pairs: set | None = None) -> int:
+    """
+    Recomputes forecasts for every known (region, crop) pair and stores them.
+
+    Pairs are grouped by the model that serves them, so each model is loaded once
+    and predicts for all of its crops in a single vectorized call.
+
+    Args:
+        only_models: Optional set of (region, crop_type) tuples to limit the run to,
+                     e.g. the model that was just retrained.
+        owned_only: Limit the run to the models owned by this shard (when sharding
+                    is enabled), so shards do not recompute each other's forecasts.
+        only_pairs: Optional set of (region, crop) tuples to limit the run to, e.g. the
+                    pairs that just received actual prices. Their inputs are fetched
+                    per pair instead of for every pair.
+
+    Returns:
+        The number of (region, crop) pairs that were materialized.
+    """
+    if only_pairs is not None:
+        inputs = {
+            pair: get_storage().get_prediction_inputs(*pair, LAG_WEEKS, PREDICTION_INTERVAL_ERRORS)
+            for pair in only_pairs
+        }
+        windows = {pair: lags for pair, (lags, _) in inputs.items()}
+        errors = {pair: squared_errors for pair, (_, squared_errors) in inputs.items()}
+    else:
+        windows = get_storage().get_lag_windows(LAG_WEEKS)
+        errors = get_storage().get_recent_squared_errors(PREDICTION_INTERVAL_ERRORS)
+
+    # Group pairs with enough history by the model that serves them
+    pairs_by_model = defaultdict(list)
+    for (region, crop), window in windows.items():
+        if len(window) < LAG_WEEKS:
+            continue
+        crop_type = catalog.crop_type(crop)
+        if crop_type is None:
+            continue
+        if only_models is not None and (region, crop_type) not in only_models:
+            continue
+        if owned_only and not shard_router.is_local(get_model_filename(region, crop_type)):
+            continue
+        pairs_by_model[(region, crop_type)].append(crop)
+
+    forecasts = []
+    for (region, crop_type), crops in pairs_by_model.items():
+        version = catalog.model_version(region, crop_type)
+        if version is None:
+            continue
+
+        try:
+            # Warm models are reused, the others are loaded without evicting them
+            model_data = model_cache.get(region, crop_type, version, keep=False)
+            model = model_data["model"]
+            encoder = model_data["label_encoder"]
+        except Exception as e:
+            print(f"❌ Skipping materialization for {region}/{crop_type}: error loading model: {e}")
+            continue
+
+        # Only crops the model's encoder was trained on can be predicted
+        encoder_classes = set(encoder.classes_)
+        known_crops = [crop for crop in crops if crop in encoder_classes]
+        if not known_crops:
+            continue
+
+        crop_encs = encoder.transform(known_crops)
+        lags = np.array([[price for _, price in windows[(region, crop)]] for crop in known_crops])
+        X_input = np.column_stack([crop_encs, lags])
+        offsets = np.array([interval_offsets(errors.get((region, crop), [])) for crop in known_crops])
+
+        try:
+            y_pred, bands = predict_with_intervals(model, X_input, offsets)
+        except Exception as e:
+            print(f"❌ Skipping materialization for {region}/{crop_type}: error during prediction: {e}")
+            continue
+
+        for crop, row, band in zip(known_crops, y_pred, bands):
+            base_date = windows[(region, crop)][-1][0]
+            forecasts.append((region, crop, base_date, version, build_forecast(base_date, row, band)))
+
+    if forecasts:
+        store_forecasts(forecasts)
+
+    print(f"✅ Materialized forecasts for {len(forecasts)} region/crop pairs across {len(pairs_by_model)} models.")
+    return len(forecasts)
+
+
+# Pairs whose stored forecast went stale because actual prices arrived in this process
+_stale_pairs = set()
+_stale_lock = threading.Lock()
+
+
+def mark_forecast_stale(region: str, crop: str):
+    """Queues a pair's forecast to be recomputed by `forecast_refresh_job`."""
+    with _stale_lock:
+        _stale_pairs.add((region, crop))
+
+
+def refresh_stale_forecasts() -> int:
+    """Recomputes the forecasts of the pairs marked stale since the last refresh."""
+    global _stale_pairs
+    with _stale_lock:
+        pairs, _stale_pairs = _stale_pairs, set()
+    if not pairs:
+        return 0
+    return materialize_forecasts(only_pairs=pairs)
+
+
+# Buffer for forecasts computed on the request path, keyed by (region, crop, prediction_index)
+forecast_writer = WriteBehindBuffer(
+    name="forecast-writer",
+    flush_func=lambda rows: get_storage().store_forecasts(rows),
+    key_func=lambda row: row[:3],
+    batch_size=WRITE_BEHIND_BATCH_SIZE,
+    flush_interval=WRITE_BEHIND_FLUSH_INTERVAL,
+)
+
+# Background job that recomputes the forecasts of pairs that received actual prices,
+# batching the prices that arrive within FORECAST_STALE_REFRESH_DELAY seconds
+forecast_refresh_job = PeriodicJob(
+    name="forecast-refresher",
+    func=refresh_stale_forecasts,
+    interval=FORECAST_STALE_REFRESH_DELAY,
+)
+
+# Background sweep that refreshes all forecasts (of this shard's models, when sharding
+# is enabled), e.g. after FORECAST_MAX_AGE or models copied in by hand; it is claimed
+# through the database, so one process runs it per interval (per shard)
+forecast_job = PeriodicJob(
+    name=f"forecast-materializer@{shard_router.self_node}" if shard_router.enabled else "forecast-materializer",
+    func=functools.partial(materialize_forecasts, owned_only=True),
+    interval=FORECAST_REFRESH_INTERVAL,
+    coordinated=True,
+)
@@ -0,0 +1,80 @@
+# services/idempotency.py
+
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from settings import IDEMPOTENCY_CACHE_SIZE, IDEMPOTENCY_KEY_TTL
+
+
+def hash_request(*values) -> str:
+    """
+    Returns a stable hash of a request's values, to detect keys reused for different
+    requests. It does not depend on the transport, so JSON and msgpack retries match.
+    """
+    return hashlib.sha256(json.dumps(values).encode()).hexdigest()
+
+
+class IdempotencyCache:
+    """
+    Bounded, least-recently-used map of idempotency keys (already stored in the
+    database) to the hash of their request, so retries of recent requests are
+    answered without touching the database. Entries expire after `ttl` seconds,
+    so keys are not honored after maintenance has deleted them from the database.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Metrics
+        self._hits = 0
+        self._misses = 0
+        self._stored_duplicates = 0
+
+    def get(self, key: str):
+        """Returns the request hash recorded for a key, or None if the key is not cached or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[1] >= self.ttl:
+                self._entries.pop(key, None)
+                self._misses += 1
+                return None
+            request_hash = entry[0]
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return request_hash
+
+    def put(self, key: str, request_hash: str):
+        """
+        Caches a key whose request has just been committed, evicting the least recently
+        used key. The key expires `ttl` seconds from now, as it does in the database.
+        """
+        with self._lock:
+            self._entries[key] = (request_hash, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def record_stored_duplicate(self):
+        """Counts a retry that missed the cache but was caught by the database."""
+        with self._lock:
+            self._stored_duplicates += 1
+
+    def stats(self) -> dict:
+        """Returns the cache size and how many retries were answered from memory or the database."""
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "cache_hits": self._hits,
+                "cache_misses": self._misses,
+                "stored_duplicates": self._stored_duplicates,
+            }
+
+
+# Shared by all ingestion requests of this process
+idempotency_cache = IdempotencyCache(IDEMPOTENCY_CACHE_SIZE, IDEMPOTENCY_KEY_TTL)
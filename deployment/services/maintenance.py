@@ -0,0 +1,205 @@
+# services/maintenance.py
+
+import os
+import csv
+import gzip
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from services.scheduler import PeriodicJob
+from storage import get_storage
+from settings import (
+    ARCHIVE_PATH,
+    ERROR_RETENTION_WEEKS,
+    STALE_PREDICTION_GRACE_WEEKS,
+    IDEMPOTENCY_KEY_TTL,
+    MAINTENANCE_CHUNK_SIZE,
+    MAINTENANCE_CHUNK_PAUSE,
+    MAINTENANCE_INTERVAL,
+)
+
+# Columns of archived 'prediction_errors' rows
+ERROR_COLUMNS = ["id", "date", "region", "crop", "squared_error", "created_at"]
+
+# Report of the last maintenance run, exposed through the metrics endpoint
+_last_report = None
+
+
+# --------------------------------
+#         HELPER FUNCTIONS
+# --------------------------------
+
+
+def weeks_before(date_str: str, weeks: int) -> str:
+    """Returns the date `weeks` weeks before a YYYY-MM-DD date."""
+    return (datetime.strptime(date_str, "%Y-%m-%d") - timedelta(weeks=weeks)).strftime("%Y-%m-%d")
+
+
+def week_start(date_str: str) -> str:
+    """Returns the Monday of the week a YYYY-MM-DD date falls in."""
+    date = datetime.strptime(date_str, "%Y-%m-%d")
+    return (date - timedelta(days=date.weekday())).strftime("%Y-%m-%d")
+
+
+def summarize_errors(rows: list) -> list:
+    """
+    Rolls raw prediction error rows up into one summary per pair and week.
+
+    Returns:
+        List of tuples (region, crop, week_start, error_count, sum_squared_error, max_squared_error).
+    """
+    weeks = defaultdict(list)
+    for _, date, region, crop, squared_error, _ in rows:
+        weeks[(region, crop, week_start(date))].append(squared_error)
+    return [
+        (region, crop, week, len(errors), sum(errors), max(errors))
+        for (region, crop, week), errors in weeks.items()
+    ]
+
+
+def archive_rows(table: str, columns: list, rows: list) -> str:
+    """
+    Writes rows to a new compressed file under ARCHIVE_PATH/<table>/: Parquet if
+    pyarrow is installed, gzipped CSV otherwise.
+
+    Returns:
+        The path of the archive file.
+    """
+    directory = os.path.join(ARCHIVE_PATH, table)
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+    name = f"{table}_{stamp}_{rows[0][0]}"
+    # Timestamps are archived as text so files look the same for every backend
+    rows = [[str(value) if isinstance(value, datetime) else value for value in row] for row in rows]
+
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        path = os.path.join(directory, f"{name}.csv.gz")
+        with gzip.open(path, "wt", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(columns)
+            writer.writerows(rows)
+        return path
+
+    path = os.path.join(directory, f"{name}.parquet")
+    table_data = pa.table({column: [row[i] for row in rows] for i, column in enumerate(columns)})
+    pq.write_table(table_data, path, compression="zstd")
+    return path
+
+
+# --------------------------------
+#              TASKS
+# --------------------------------
+
+
+def rollup_old_errors() -> dict:
+    """
+    Archives raw prediction errors older than ERROR_RETENTION_WEEKS and replaces them
+    with weekly summaries, one chunk (and one short transaction) at a time.
+
+    Rows are archived before the transaction that deletes them, so a failure can at
+    worst archive a chunk twice but never lose it. Only the rows a chunk's transaction
+    actually deleted are summarized, so concurrent runs never count an error twice.
+    """
+    storage = get_storage()
+    latest_date = storage.get_latest_error_date()
+    if latest_date is None:
+        return {"rolled_up_errors": 0, "archives": []}
+    cutoff = weeks_before(latest_date, ERROR_RETENTION_WEEKS)
+
+    rolled_up = 0
+    archives = []
+    while True:
+        rows = storage.get_prediction_errors_before(cutoff, MAINTENANCE_CHUNK_SIZE)
+        if not rows:
+            break
+        archives.append(archive_rows("prediction_errors", ERROR_COLUMNS, rows))
+        rolled_up += storage.rollup_prediction_errors(rows, summarize_errors)
+        if len(rows) < MAINTENANCE_CHUNK_SIZE:
+            break
+        time.sleep(MAINTENANCE_CHUNK_PAUSE)
+
+    return {"rolled_up_errors": rolled_up, "error_cutoff_date": cutoff, "archives": archives}
+
+
+def prune_stale_predictions() -> dict:
+    """
+    Deletes predicted prices that were never replaced by an actual price and are dated
+    more than STALE_PREDICTION_GRACE_WEEKS before their pair's latest actual price.
+    """
+    storage = get_storage()
+    pruned = 0
+    for (region, crop), latest_actual in storage.get_latest_actual_dates().items():
+        cutoff = weeks_before(latest_actual, STALE_PREDICTION_GRACE_WEEKS)
+        while True:
+            deleted = storage.delete_predicted_prices_before(region, crop, cutoff, MAINTENANCE_CHUNK_SIZE)
+            pruned += deleted
+            if deleted < MAINTENANCE_CHUNK_SIZE:
+                break
+            time.sleep(MAINTENANCE_CHUNK_PAUSE)
+    return {"pruned_predictions": pruned}
+
+
+def prune_idempotency_keys() -> dict:
+    """Deletes idempotency keys older than IDEMPOTENCY_KEY_TTL, in chunks."""
+    storage = get_storage()
+    cutoff = (datetime.now(timezone.utc) - timedelta(seconds=IDEMPOTENCY_KEY_TTL)).strftime("%Y-%m-%d %H:%M:%S")
+    pruned = 0
+    while True:
+        deleted = storage.delete_idempotency_keys_before(cutoff, MAINTENANCE_CHUNK_SIZE)
+        pruned += deleted
+        if deleted < MAINTENANCE_CHUNK_SIZE:
+            break
+        time.sleep(MAINTENANCE_CHUNK_PAUSE)
+    return {"pruned_idempotency_keys": pruned}
+
+
+def run_maintenance() -> dict:
+    """
+    Runs every maintenance task: error rollup and archiving, stale prediction
+    and expired idempotency key pruning, then vacuum/analyze if rows were deleted.
+
+    Returns:
+        Report of the run, also kept for the metrics endpoint.
+    """
+    global _last_report
+    started = time.perf_counter()
+    report = {"started_at": datetime.now(timezone.utc).isoformat()}
+
+    report.update(rollup_old_errors())
+    report.update(prune_stale_predictions())
+    report.update(prune_idempotency_keys())
+    if report["rolled_up_errors"] or report["pruned_predictions"] or report["pruned_idempotency_keys"]:
+        get_storage().optimize()
+
+    report["duration_seconds"] = round(time.perf_counter() - started, 3)
+    _last_report = report
+    print(
+        f"🧹 Maintenance done in {report['duration_seconds']}s: rolled up {report['rolled_up_errors']} errors "
+        f"into {len(report['archives'])} archives, pruned {report['pruned_predictions']} stale predictions "
+        f"and {report['pruned_idempotency_keys']} expired idempotency keys."
+    )
+    return report
+
+
+def maintenance_stats() -> dict:
+    """
+    Returns the schedule and the report of the last maintenance run in this process
+    (None if another process ran it).
+    """
+    return {
+        "interval_seconds": MAINTENANCE_INTERVAL,
+        "last_run": _last_report,
+    }
+
+
+# Background job that keeps the database from growing without limit (run by one
+# API process per interval)
+maintenance_job = PeriodicJob(
+    name="maintenance",
+    func=run_maintenance,
+    interval=MAINTENANCE_INTERVAL,
+    coordinated=True,
+)
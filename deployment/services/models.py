@@ -0,0 +1,130 @@
+# services/models.py
+
+import os
+import joblib
+import tempfile
+import threading
+from collections import OrderedDict
+from services.coalescing import SingleFlight
+from settings import MODELS_PATH, MODEL_CACHE_SIZE, PREDICTION_COALESCE_TIMEOUT
+
+MODEL_EXTENSION = ".joblib"
+
+
+def get_model_filename(region: str, crop_type: str) -> str:
+    """Model names are expected in the format Region__CropType.joblib"""
+    return f"{region}__{crop_type}{MODEL_EXTENSION}".replace(" ", "_")
+
+
+def get_model_path(region: str, crop_type: str) -> str:
+    """Returns the full path of the model file for a region and crop type."""
+    return os.path.join(MODELS_PATH, get_model_filename(region, crop_type))
+
+
+def scan_model_versions() -> dict:
+    """
+    Lists the model files in MODELS_PATH with a single directory scan.
+
+    Returns:
+        Dict mapping each model filename to its version tag (modification time in ns),
+        which changes whenever the model is retrained and saved again.
+    """
+    try:
+        with os.scandir(MODELS_PATH) as entries:
+            return {
+                entry.name: str(entry.stat().st_mtime_ns)
+                for entry in entries
+                if entry.name.endswith(MODEL_EXTENSION) and entry.is_file()
+            }
+    except FileNotFoundError:
+        return {}
+
+
+def load_model_data(path: str) -> dict:
+    """Loads a serialized model bundle ({'model': ..., 'label_encoder': ...})."""
+    return joblib.load(path)
+
+
+def save_model_data(path: str, model_data: dict):
+    """
+    Saves a model bundle atomically: it is written to a temporary file next to the
+    target and then renamed over it, so readers never see a partially written model.
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            joblib.dump(model_data, f)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+
+class ModelCache:
+    """
+    LRU cache of loaded model bundles, so a process keeps the models it serves warm
+    instead of loading them from disk for every live inference. Entries are tagged
+    with the model's version and reloaded once it changes (e.g. after retraining).
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._models = OrderedDict()  # model filename -> (version, model data)
+        self._lock = threading.Lock()
+        # Concurrent misses for the same model version load it once
+        self._loads = SingleFlight("model-load", PREDICTION_COALESCE_TIMEOUT)
+
+        # Metrics
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, region: str, crop_type: str, version: str, keep: bool = True) -> dict:
+        """
+        Returns the bundle of the Region__CropType model at `version`, loading it on a miss.
+
+        Args:
+            keep: Whether a loaded model is added to the cache. Models this process
+                  does not serve regularly are loaded without evicting warm ones.
+        """
+        filename = get_model_filename(region, crop_type)
+        with self._lock:
+            entry = self._models.get(filename)
+            if entry is not None and entry[0] == version:
+                self._models.move_to_end(filename)
+                self._hits += 1
+                return entry[1]
+            self._misses += 1
+
+        model_data = self._loads.do(
+            (filename, version),
+            lambda: load_model_data(get_model_path(region, crop_type)),
+        )
+
+        if keep and self.max_size > 0:
+            with self._lock:
+                self._models[filename] = (version, model_data)
+                self._models.move_to_end(filename)
+                while len(self._models) > self.max_size:
+                    self._models.popitem(last=False)
+                    self._evictions += 1
+        return model_data
+
+    def stats(self) -> dict:
+        """Returns the cache's size, hit ratio and evictions."""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "size": len(self._models),
+                "max_size": self.max_size,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": round(self._hits / lookups, 4) if lookups else 0.0,
+                "evictions": self._evictions,
+            }
+
+
+# Warm models of the API process
+model_cache = ModelCache(MODEL_CACHE_SIZE)
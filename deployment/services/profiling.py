@@ -0,0 +1,253 @@
+# services/profiling.py
+
+import io
+import os
+import re
+import time
+import random
+import pstats
+import cProfile
+import inspect
+import functools
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from settings import (
+    PROFILING_ENABLED,
+    PROFILE_SAMPLE_RATE,
+    PROFILE_PATH,
+    PROFILE_MAX_FILES,
+)
+
+PROFILE_EXTENSION = ".prof"
+
+# Request header and query flag that opt a request into profiling
+PROFILE_HEADER = "X-Profile"
+PROFILE_QUERY_FLAG = "profile"
+
+# Response header carrying the name of the profile saved for a request
+PROFILE_ID_HEADER = "X-Profile-Id"
+
+# Response header set instead when a request could not be profiled
+PROFILE_SKIPPED_HEADER = "X-Profile-Skipped"
+
+# Held while a profile is recorded. Since Python 3.12 only one cProfile profiler can
+# be active per interpreter (not per thread), so profiles never overlap: a block
+# started while another one is recorded (e.g. a profiled retraining) is skipped
+_profiler_lock = threading.Lock()
+
+# Set by the middleware for requests that should be profiled: a dict the
+# profiled handler stores the saved profile's name in
+_request_profile = ContextVar("request_profile", default=None)
+
+_NAME_PATTERN = re.compile(r"^[A-Za-z0-9_.-]+\.prof$")
+
+
+# --------------------------------
+#         HELPER FUNCTIONS
+# --------------------------------
+
+
+def _slug(value) -> str:
+    return re.sub(r"[^A-Za-z0-9-]+", "-", str(value)).strip("-")
+
+
+def _describe(args: tuple, kwargs: dict) -> str:
+    """Builds a label from the region and crop of the profiled call, if it has any."""
+    for value in list(args) + list(kwargs.values()):
+        if hasattr(value, "region") and hasattr(value, "crop"):
+            return f"{_slug(value.region)}_{_slug(value.crop)}"
+    strings = [value for value in args if isinstance(value, str)]
+    return "_".join(_slug(value) for value in strings[:2])
+
+
+def _prune_profiles():
+    """Deletes the oldest profiles beyond PROFILE_MAX_FILES."""
+    names = sorted(name for name in os.listdir(PROFILE_PATH) if name.endswith(PROFILE_EXTENSION))
+    for name in names[:-PROFILE_MAX_FILES]:
+        try:
+            os.remove(os.path.join(PROFILE_PATH, name))
+        except FileNotFoundError:
+            pass
+
+
+def save_profile(profiler: cProfile.Profile, kind: str, label: str, duration: float) -> str:
+    """
+    Dumps a profile (pstats format) under PROFILE_PATH and keeps only the most
+    recent PROFILE_MAX_FILES profiles.
+
+    Returns:
+        The name of the saved profile.
+    """
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+    name = f"{stamp}_{kind}_{round(duration * 1000)}ms"
+    if label:
+        name += f"_{label}"
+    name += PROFILE_EXTENSION
+
+    os.makedirs(PROFILE_PATH, exist_ok=True)
+    profiler.dump_stats(os.path.join(PROFILE_PATH, name))
+    _prune_profiles()
+    return name
+
+
+@contextmanager
+def _profiling(kind: str, label: str):
+    """
+    Profiles the enclosed block with cProfile and saves the profile, even if the block
+    raises. If another profile is being recorded, the block runs unprofiled and the
+    request (if any) is told so through X-Profile-Skipped.
+    """
+    holder = _request_profile.get()
+    if not _profiler_lock.acquire(blocking=False):
+        print(f"⚠️ Skipped {kind} profile {label}: another profile is being recorded.")
+        if holder is not None:
+            holder["skipped"] = "another profile is being recorded"
+        yield
+        return
+
+    try:
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # A profiler started outside of this module (e.g. a debugger) is active
+            print(f"⚠️ Skipped {kind} profile {label}: another profiler is active.")
+            if holder is not None:
+                holder["skipped"] = "another profiler is active"
+            yield
+            return
+
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            name = save_profile(profiler, kind, label, time.perf_counter() - started)
+            print(f"🔬 Saved {kind} profile {name}")
+            if holder is not None:
+                holder["name"] = name
+    finally:
+        _profiler_lock.release()
+
+
+# --------------------------------
+#             HOOKS
+# --------------------------------
+
+
+def profiled(kind: str, always: bool = False):
+    """
+    Decorator that runs a function under cProfile when its request opted in (see
+    `profile_requests`), or on every call if `always` is set.
+
+    When profiling is disabled (and `always` is not set) the function is returned
+    undecorated, so it adds no overhead at all. Async functions are profiled in the
+    event loop thread, so a profile can include other requests served at their awaits.
+    """
+
+    def decorate(func):
+        if not (always or PROFILING_ENABLED):
+            return func
+
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if not (always or _request_profile.get() is not None):
+                    return await func(*args, **kwargs)
+                with _profiling(kind, _describe(args, kwargs)):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not (always or _request_profile.get() is not None):
+                return func(*args, **kwargs)
+            with _profiling(kind, _describe(args, kwargs)):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+async def profile_requests(request, call_next):
+    """
+    HTTP middleware (only installed when PROFILING_ENABLED) marking requests to profile:
+    those sending the X-Profile header or the `profile` query flag, plus a random
+    PROFILE_SAMPLE_RATE fraction of all requests. Handlers decorated with `profiled`
+    save a profile for marked requests, and its name is returned in X-Profile-Id (or
+    the reason it was skipped in X-Profile-Skipped).
+    """
+    requested = request.headers.get(PROFILE_HEADER) or request.query_params.get(PROFILE_QUERY_FLAG)
+    if not (requested not in (None, "", "0", "false") or random.random() < PROFILE_SAMPLE_RATE):
+        return await call_next(request)
+
+    holder = {}
+    token = _request_profile.set(holder)
+    try:
+        response = await call_next(request)
+    finally:
+        _request_profile.reset(token)
+    if "name" in holder:
+        response.headers[PROFILE_ID_HEADER] = holder["name"]
+    elif "skipped" in holder:
+        response.headers[PROFILE_SKIPPED_HEADER] = holder["skipped"]
+    return response
+
+
+# --------------------------------
+#         SAVED PROFILES
+# --------------------------------
+
+
+def list_profiles() -> list:
+    """Describes the saved profiles, most recent first."""
+    try:
+        names = sorted(
+            (name for name in os.listdir(PROFILE_PATH) if name.endswith(PROFILE_EXTENSION)),
+            reverse=True,
+        )
+    except FileNotFoundError:
+        return []
+
+    profiles = []
+    for name in names:
+        # <timestamp>_<kind>_<duration>ms[_<region>_<crop>].prof
+        parts = name[: -len(PROFILE_EXTENSION)].split("_", 3)
+        try:
+            created_at = datetime.strptime(parts[0], "%Y%m%dT%H%M%S%f").replace(tzinfo=timezone.utc)
+            size = os.path.getsize(os.path.join(PROFILE_PATH, name))
+        except (ValueError, FileNotFoundError):
+            # Not a profile saved by the API, or deleted meanwhile
+            continue
+        profiles.append(
+            {
+                "name": name,
+                "kind": parts[1] if len(parts) > 1 else None,
+                "duration_ms": int(parts[2][:-2]) if len(parts) > 2 and parts[2][:-2].isdigit() else None,
+                "label": parts[3] if len(parts) > 3 else None,
+                "created_at": created_at.isoformat(),
+                "size_bytes": size,
+            }
+        )
+    return profiles
+
+
+def get_profile_path(name: str):
+    """Returns the path of a saved profile, or None if there is no profile with that name."""
+    if not _NAME_PATTERN.match(name):
+        return None
+    path = os.path.join(PROFILE_PATH, name)
+    return path if os.path.isfile(path) else None
+
+
+def render_profile(path: str, limit: int) -> str:
+    """Renders the `limit` most expensive functions of a profile (by cumulative time) as text."""
+    output = io.StringIO()
+    stats = pstats.Stats(path, stream=output)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(limit)
+    return output.getvalue()
@@ -0,0 +1,333 @@
+# services/retraining.py
+
+import time
+import numpy as np
+import pandas as pd
+from services.models import get_model_path, load_model_data, save_model_data
+from services.catalog import catalog
+from services.drift import drift_monitor
+from services.forecasts import materialize_forecasts
+from services.profiling import profiled
+from services.scheduler import PeriodicJob
+from services.snapshots import load_price_history
+from storage import get_storage
+from settings import (
+    LAG_WEEKS,
+    MIN_ERROR_POINTS,
+    DRIFT_BACKTEST_WEEKS,
+    RETRAIN_BUDGET_PER_HOUR,
+    RETRAIN_QUEUE_INTERVAL,
+    RETRAIN_TIMEOUT,
+    RETRAIN_FAILURE_BACKOFF,
+    PROFILE_RETRAINING,
+)
+
+from sklearn.preprocessing import LabelEncoder
+from xgboost import XGBRegressor
+from sklearn.multioutput import MultiOutputRegressor
+
+
+# --------------------------------
+#         HELPER FUNCTIONS
+# --------------------------------
+
+def prepare_retraining_data(history: tuple, region: str, crop: str, crop_type: str, loaded_encoder: LabelEncoder):
+    """
+    Prepares the price history of a pair for model retraining,
+    replicating the logic of the original prepare_dataset function.
+
+    Args:
+        history: Tuple (dates, prices) of numpy arrays, as returned by `load_price_history`.
+                 Assumes data is already filtered for the specific region and crop.
+        region: The region name.
+        crop: The specific crop name (e.g., 'Apple').
+        crop_type: The type of crop (e.g., 'Fruit').
+        loaded_encoder: The pre-fitted LabelEncoder for this crop type.
+
+    Returns:
+        Tuple (X, y) of numpy arrays ready for model training, or (None, None) if insufficient data.
+        X: Features (commodity_enc + lags)
+        y: Targets (leads)
+    """
+    dates, prices = history
+    if len(prices) == 0:
+        print("No data provided for retraining preparation.")
+        return None, None
+
+    # Wrap the arrays in a DataFrame, mimicking original column names
+    # Add dummy columns for 'Region' and 'Type' as they are used for filtering in original prepare_dataset
+    # and 'Commodity' to match the encoder's expected input.
+    df = pd.DataFrame({'Date': dates, 'Price per Unit (Silver Drachma/kg)': prices})
+    df['Region'] = region
+    df['Type'] = crop_type
+    df['Commodity'] = crop # Add the specific crop name
+
+    # Replicate the data preparation steps from the original prepare_dataset
+    df = (
+        df.assign(Date=lambda d: pd.to_datetime(d['Date']))
+          .sort_values(['Commodity','Date']) # Sort by commodity and date as in original
+    )
+
+    # Use the loaded encoder to transform the 'Commodity' column
+    # The encoder should already be fitted on all commodities for this crop type
+    try:
+        df['commodity_enc'] = loaded_encoder.transform(df['Commodity'])
+    except ValueError as e:
+        print(f"Error transforming commodity '{crop}' with loaded encoder: {e}. This crop might not have been in the original training data.")
+        return None, None # Cannot proceed if encoding fails
+    except Exception as e:
+         print(f"Unexpected error during commodity encoding: {e}")
+         return None, None
+
+
+    # Build lags (1-4) and leads (1-4)
+    # Use the exact column name from the original script for price
+    price_col = 'Price per Unit (Silver Drachma/kg)'
+    for lag in [1,2,3,4]:
+        # Groupby 'Commodity' before shifting, as in original
+        df[f'lag_{lag}'] = df.groupby('Commodity')[price_col].shift(lag)
+    for lead in [1,2,3,4]:
+         # Groupby 'Commodity' before shifting, as in original
+        df[f'lead_{lead}'] = df.groupby('Commodity')[price_col].shift(-lead)
+
+
+    # Define columns used for dropping NaNs
+    lag_cols  = [f'lag_{l}'  for l in [1,2,3,4]]
+    lead_cols = [f'lead_{l}' for l in [1,2,3,4]]
+    # Drop rows with NaNs in feature/target columns, including the encoded commodity
+    df_clean = df.dropna(subset=lag_cols + lead_cols + ['commodity_enc'])
+
+    # Check if enough data remains after dropping NaNs
+    if df_clean.shape[0] < MIN_ERROR_POINTS: # Use MIN_ERROR_POINTS or a separate retraining threshold
+         print(f"Insufficient data ({df_clean.shape[0]} rows) after preparing features/targets for {region}/{crop}. Need at least {MIN_ERROR_POINTS} training samples.")
+         return None, None
+
+
+    # Separate features (X) and targets (y)
+    # Features: encoded commodity + lags
+    X = df_clean[['commodity_enc'] + lag_cols]
+    # Targets: leads
+    y = df_clean[lead_cols]
+
+    print(f"Prepared training data for {region}/{crop}: X shape {X.shape}, y shape {y.shape}")
+
+    return X.to_numpy(), y.to_numpy() # Return as numpy arrays
+
+
+def build_model() -> MultiOutputRegressor:
+    """Instantiates the same model architecture and parameters as in original training."""
+    return MultiOutputRegressor(
+        XGBRegressor(objective='reg:squarederror', n_estimators=1000)
+    )
+
+
+def backtest_rmse(X, y) -> tuple:
+    """
+    Measures the baseline error of the model architecture on a pair: a model is fit on
+    all but the last DRIFT_BACKTEST_WEEKS samples and scored on next-week predictions
+    for those held-out weeks.
+
+    Training samples whose lead targets fall inside the held-out weeks are left out
+    too, so the backtest never sees the prices it is scored on.
+
+    Returns:
+        Tuple (rmse, number of held-out points), or (None, 0) if the history is too short.
+    """
+    gap = LAG_WEEKS - 1
+    n_train = len(X) - DRIFT_BACKTEST_WEEKS - gap
+    if DRIFT_BACKTEST_WEEKS < MIN_ERROR_POINTS or n_train < MIN_ERROR_POINTS:
+        return None, 0
+
+    model = build_model()
+    model.fit(X[:n_train], y[:n_train])
+    X_test, y_test = X[-DRIFT_BACKTEST_WEEKS:], y[-DRIFT_BACKTEST_WEEKS:]
+    errors = model.predict(X_test)[:, 0] - y_test[:, 0]
+    return float(np.sqrt(np.mean(errors ** 2))), len(errors)
+
+
+@profiled("retraining", always=PROFILE_RETRAINING)
+def perform_actual_retraining(region: str, crop: str) -> bool:
+    """
+    Background task function to perform the actual model retraining
+    for a specific region and crop.
+
+    Returns:
+        True if the new model was saved, False if retraining failed.
+    """
+    print(f"🏋️‍♂️ Starting retraining for model: {region} / {crop}")
+
+    # Determine crop type to load the correct model file
+    crop_type = catalog.crop_type(crop)
+    if crop_type is None:
+        print(f"❌ Retraining failed for {region}/{crop}: Could not determine crop type.")
+        return False
+
+    model_path = get_model_path(region, crop_type)
+
+    if catalog.model_version(region, crop_type) is None:
+        print(f"❌ Retraining failed for {region}/{crop}: Model file not found at {model_path}.")
+        return False
+
+    try:
+        # --- 1. Load Existing Model and Encoder ---
+        # We need the existing encoder to correctly encode the commodity during data prep
+        print(f"Loading existing model data from {model_path}...")
+        model_data = load_model_data(model_path)
+        existing_model = model_data["model"] # We load the model just to confirm structure, but will train a new one
+        loaded_encoder: LabelEncoder = model_data["label_encoder"]
+        print("✅ Existing model data and encoder loaded.")
+
+    except Exception as e:
+        print(f"❌ Error loading existing model data or encoder for {region}/{crop}: {e}")
+        return False
+
+    try:
+        # --- 2. Fetch All Actual Data for Retraining ---
+        # Read all actual price data for this specific region and crop from the price snapshot
+        # (refreshed from the database first), or from the database if snapshots are unavailable.
+        # This includes historical data imported from CSV and new data collected via the API.
+        print(f"Loading all actual price data for {region}/{crop}...")
+        actual_price_data = load_price_history(region, crop)
+
+        if len(actual_price_data[1]) == 0:
+             print(f"⚠️ No actual data found for {region}/{crop} in the database. Cannot retrain.")
+             return False
+
+        print(f"Loaded {len(actual_price_data[1])} actual data points.")
+
+        # --- 3. Prepare Data for Training ---
+        # Use the helper function to prepare features (X) and targets (y)
+        # using the fetched data and the loaded encoder.
+        X_train, y_train = prepare_retraining_data(actual_price_data, region, crop, crop_type, loaded_encoder)
+
+        if X_train is None or y_train is None:
+            # prepare_retraining_data will print specific reasons for failure
+            print(f"❌ Data preparation failed or insufficient data for retraining {region}/{crop}. Skipping retraining.")
+            return False
+
+        # --- 4. Backtest and Train the Model ---
+        # The backtest error on the most recent weeks becomes the drift baseline of the new model
+        print(f"Training {region}/{crop} model with {X_train.shape[0]} samples...")
+        try:
+            baseline_rmse, backtest_points = backtest_rmse(X_train, y_train)
+
+            # Re-instantiate the model with the same parameters
+            model = build_model()
+            model.fit(X_train, y_train) # Fit the model on the prepared data
+
+            print(f"✅ Model training complete for {region}/{crop} (baseline RMSE: {baseline_rmse}).")
+
+        except Exception as e:
+            print(f"❌ Error during model training for {region}/{crop}: {e}")
+            return False
+
+
+        # --- 5. Save the New Model ---
+        # Save the newly trained model and the *loaded* label encoder, replacing the old file
+        # atomically so concurrent predictions never load a half-written model.
+        try:
+            # Save the updated model and the *same* label encoder together
+            save_model_data(model_path, {'model': model, 'label_encoder': loaded_encoder})
+
+            print(f"✅ Successfully saved updated model: {model_path}")
+
+        except Exception as e:
+            print(f"❌ Error saving the retrained model for {region}/{crop}: {e}")
+            return False
+
+        # --- 6. Record the Baseline ---
+        # Errors dated up to the last training week no longer count towards drift
+        trained_through = str(actual_price_data[0][-1].astype("datetime64[D]"))
+        get_storage().store_model_baseline(region, crop, baseline_rmse, backtest_points, trained_through)
+        drift_monitor.forget(region, crop)
+
+        # --- 7. Refresh the Catalog and the Forecasts Served by the New Model ---
+        # The catalog picks up the new model version, which invalidates older stored forecasts
+        catalog.refresh()
+        materialize_forecasts(only_models={(region, crop_type)})
+        return True
+
+
+    except Exception as e:
+        # Catch any other unexpected errors during the background task
+        print(f"❌ An unexpected error occurred during retraining for {region}/{crop}: {e}")
+        return False
+
+
+# --------------------------------
+#        RETRAINING BUDGET
+# --------------------------------
+
+
+class RetrainScheduler:
+    """
+    Queue of drifting pairs waiting to be retrained, drained by a background job: the
+    worst drift score goes first, and at most `budget_per_hour` retraining jobs are
+    started in any rolling hour, one at a time.
+
+    The queue and the ledger of started jobs live in the database, so the budget is
+    shared by all API processes and a pair is never retrained by two of them at once.
+    Scheduling a pair that is already queued only updates its drift score.
+    """
+
+    def __init__(self, retrain_func, budget_per_hour: int, timeout: float, failure_backoff: float):
+        self.retrain_func = retrain_func
+        self.budget_per_hour = budget_per_hour
+        self.timeout = timeout
+        self.failure_backoff = failure_backoff
+
+    def schedule(self, region: str, crop: str, drift_score: float) -> bool:
+        """
+        Queues a pair for retraining (or updates its score). Returns False if it is being
+        retrained, or if its last retraining failed less than `failure_backoff` seconds ago
+        (it is queued again by the first drift check after that).
+        """
+        return get_storage().queue_retrain(region, crop, drift_score, self.timeout, self.failure_backoff)
+
+    def run_pending(self):
+        """Retrains queued pairs, worst drift first, until the queue or the budget runs out."""
+        while True:
+            claimed = get_storage().claim_retrain(self.budget_per_hour, self.timeout)
+            if claimed is None:
+                return
+            run_id, region, crop = claimed
+            succeeded = False
+            try:
+                succeeded = self.retrain_func(region, crop)
+            finally:
+                get_storage().finish_retrain(run_id, "completed" if succeeded else "failed")
+
+    def stats(self) -> dict:
+        """Returns the budget usage and the queue, worst drift first."""
+        state = get_storage().get_retrain_state(self.timeout)
+        started = state["started_last_hour"]
+        used = len(started)
+        next_slot = 0.0
+        if used >= self.budget_per_hour and started:
+            next_slot = max(3600 - (time.time() - started[0]), 0.0)
+        running = state["running"]
+        return {
+            "budget_per_hour": self.budget_per_hour,
+            "used_last_hour": used,
+            "remaining": max(self.budget_per_hour - used, 0),
+            "next_slot_in_seconds": round(next_slot, 1),
+            "running": None if running is None else {"region": running[0], "crop": running[1]},
+            "queued": [{"region": region, "crop": crop, "drift_score": score} for region, crop, score in state["queued"]],
+            "scheduled": state["started"] + len(state["queued"]),
+            "completed": state["completed"],
+            "failed": state["failed"],
+        }
+
+
+# Retraining queue shared by all API processes
+retrain_scheduler = RetrainScheduler(
+    perform_actual_retraining, RETRAIN_BUDGET_PER_HOUR, RETRAIN_TIMEOUT, RETRAIN_FAILURE_BACKOFF
+)
+
+# Background job that retrains queued pairs as the budget allows
+# (woken up as soon as a pair is scheduled)
+retrain_job = PeriodicJob(
+    name="retrain-scheduler",
+    func=retrain_scheduler.run_pending,
+    interval=RETRAIN_QUEUE_INTERVAL,
+)
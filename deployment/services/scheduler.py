@@ -0,0 +1,58 @@
+# services/scheduler.py
+
+import threading
+from storage import get_storage
+from settings import JOB_CLAIM_POLL_INTERVAL
+
+
+class PeriodicJob:
+    """
+    Runs a function in a daemon thread on a fixed interval until stopped.
+    The job can also be woken up early with `trigger()`.
+
+    Coordinated jobs are shared by all API processes: every process checks the
+    database every JOB_CLAIM_POLL_INTERVAL seconds, and only the one claiming a
+    due run (see StorageBackend.claim_job) runs it, so the job runs once per
+    interval across the deployment, and not again when a process restarts.
+    """
+
+    def __init__(self, name: str, func, interval: float, coordinated: bool = False):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.coordinated = coordinated
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Starts the job thread (no-op if already running or interval is disabled)."""
+        if self.interval <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        print(f"⏱️ Started periodic job '{self.name}' (every {self.interval}s{', coordinated' if self.coordinated else ''})")
+
+    def trigger(self):
+        """Wakes the job up so it runs as soon as possible (coordinated jobs only run if due)."""
+        self._wake.set()
+
+    def stop(self, timeout: float | None = None):
+        """Stops the job thread, waiting for a run in progress to finish."""
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        wait = min(self.interval, JOB_CLAIM_POLL_INTERVAL) if self.coordinated else self.interval
+        while not self._stopped.is_set():
+            try:
+                if not self.coordinated or get_storage().claim_job(self.name, self.interval):
+                    self.func()
+            except Exception as e:
+                print(f"❌ Periodic job '{self.name}' failed: {e}")
+            self._wake.wait(wait)
+            self._wake.clear()
@@ -0,0 +1,156 @@
+# services/sharding.py
+
+import time
+import bisect
+import hashlib
+import threading
+import httpx
+from settings import (
+    SHARD_NODES,
+    SHARD_SELF,
+    SHARD_VIRTUAL_NODES,
+    SHARD_FORWARD_TIMEOUT,
+    SHARD_RETRY_AFTER,
+)
+
+# Request header marking a request forwarded by another shard (holding its name);
+# forwarded requests are always served locally, so they can never loop
+SHARD_FORWARDED_HEADER = "X-Shard-Forwarded"
+
+UDS_PREFIX = "unix:"
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """
+    Consistent hash ring assigning keys to nodes. Each node owns SHARD_VIRTUAL_NODES
+    points of the ring, so adding or removing a node only moves the keys it owns.
+    """
+
+    def __init__(self, nodes: list, virtual_nodes: int):
+        points = sorted((_hash(f"{node}#{i}"), node) for node in nodes for i in range(virtual_nodes))
+        self._hashes = [point for point, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def node_for(self, key: str) -> str:
+        """Returns the node owning a key: the first ring point at or after the key's hash."""
+        index = bisect.bisect_left(self._hashes, _hash(key)) % len(self._hashes)
+        return self._nodes[index]
+
+
+class ShardRouter:
+    """
+    Routes each model (by its filename) to the shard owning it, so every shard only
+    keeps its own models warm, and forwards requests to the owning shard over local
+    HTTP (TCP or a unix socket). Shards that cannot be reached are skipped for
+    SHARD_RETRY_AFTER seconds, and their requests are served by the calling shard.
+    """
+
+    def __init__(self, nodes: list, self_node: str, virtual_nodes: int, timeout: float, retry_after: float):
+        if nodes and self_node not in nodes:
+            raise ValueError(f"SHARD_SELF '{self_node}' is not one of SHARD_NODES {nodes}.")
+        self.nodes = list(nodes)
+        self.self_node = self_node
+        self.enabled = len(self.nodes) > 1
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self._ring = HashRing(self.nodes, virtual_nodes) if self.enabled else None
+        self._clients = {}     # node -> httpx.Client
+        self._down_until = {}  # node -> monotonic time it is retried
+        self._lock = threading.Lock()
+
+        # Metrics
+        self._forwarded = 0
+        self._unavailable = 0
+        self._fallbacks = 0
+
+    def owner(self, key: str) -> str:
+        """Returns the shard owning a key (this shard when sharding is disabled)."""
+        return self._ring.node_for(key) if self.enabled else self.self_node
+
+    def is_local(self, key: str) -> bool:
+        """Whether this shard owns a key."""
+        return not self.enabled or self.owner(key) == self.self_node
+
+    def _client(self, node: str) -> httpx.Client:
+        with self._lock:
+            client = self._clients.get(node)
+            if client is None:
+                if node.startswith(UDS_PREFIX):
+                    transport = httpx.HTTPTransport(uds=node[len(UDS_PREFIX):])
+                    client = httpx.Client(transport=transport, base_url="http://shard", timeout=self.timeout)
+                else:
+                    client = httpx.Client(base_url=node, timeout=self.timeout)
+                self._clients[node] = client
+            return client
+
+    def forward(self, key: str, path: str, payload: dict):
+        """
+        Forwards a JSON request to the shard owning `key`.
+
+        Returns:
+            The owning shard's response, or None if the shard is unavailable (it could
+            not be reached, or answered with a server error) and the caller should
+            serve the request itself.
+        """
+        node = self.owner(key)
+        with self._lock:
+            if time.monotonic() < self._down_until.get(node, 0):
+                self._fallbacks += 1
+                return None
+
+        try:
+            response = self._client(node).post(path, json=payload, headers={SHARD_FORWARDED_HEADER: self.self_node})
+        except httpx.HTTPError as e:
+            print(f"⚠️ Shard {node} is unavailable ({e!r}). Serving its requests locally for {self.retry_after}s.")
+            with self._lock:
+                self._down_until[node] = time.monotonic() + self.retry_after
+                self._unavailable += 1
+                self._fallbacks += 1
+            return None
+
+        if response.status_code >= 500:
+            print(f"⚠️ Shard {node} failed to serve {key} ({response.status_code}). Serving it locally.")
+            with self._lock:
+                self._fallbacks += 1
+            return None
+
+        with self._lock:
+            self._forwarded += 1
+        return response
+
+    def close(self):
+        """Closes the connections to the other shards."""
+        with self._lock:
+            clients, self._clients = list(self._clients.values()), {}
+        for client in clients:
+            client.close()
+
+    def stats(self) -> dict:
+        """Returns the shard layout, which shards are skipped, and how many requests were forwarded."""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "self": self.self_node or None,
+                "nodes": [
+                    {"node": node, "available": now >= self._down_until.get(node, 0)}
+                    for node in self.nodes
+                ],
+                "forwarded": self._forwarded,
+                "unavailable": self._unavailable,
+                "fallbacks": self._fallbacks,
+            }
+
+
+# Shard router of the API process
+shard_router = ShardRouter(
+    nodes=SHARD_NODES,
+    self_node=SHARD_SELF,
+    virtual_nodes=SHARD_VIRTUAL_NODES,
+    timeout=SHARD_FORWARD_TIMEOUT,
+    retry_after=SHARD_RETRY_AFTER,
+)
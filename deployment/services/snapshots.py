@@ -0,0 +1,320 @@
+# services/snapshots.py
+
+import os
+import json
+import math
+import shutil
+import tempfile
+import threading
+import numpy as np
+from collections import defaultdict
+from urllib.parse import quote, unquote
+from datetime import datetime, timezone
+from services.scheduler import PeriodicJob
+from storage import get_storage
+from settings import SNAPSHOT_PATH, SNAPSHOT_REFRESH_INTERVAL
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    # pyarrow is optional: without it, price history is read from the database
+    pa = None
+    pq = None
+
+SNAPSHOTS_AVAILABLE = pa is not None
+
+# Actual prices are stored as one Parquet file per region (Hive-style partitions)
+PRICE_SNAPSHOT_DIR = os.path.join(SNAPSHOT_PATH, "prices")
+PARTITION_PREFIX = "region="
+PARTITION_FILE = "prices.parquet"
+
+_refresh_lock = threading.Lock()
+
+# Memory-mapped partitions read by this process: region -> (mtime_ns, table, crop index)
+_tables = {}
+_tables_lock = threading.Lock()
+
+
+# --------------------------------
+#         HELPER FUNCTIONS
+# --------------------------------
+
+
+def get_partition_path(region: str) -> str:
+    """Returns the path of the Parquet file holding a region's actual prices."""
+    return os.path.join(PRICE_SNAPSHOT_DIR, f"{PARTITION_PREFIX}{quote(region, safe='')}", PARTITION_FILE)
+
+
+def _read_metadata(path: str) -> dict:
+    """Reads the snapshot metadata from a partition's Parquet footer, without reading the data."""
+    metadata = pq.read_schema(path).metadata or {}
+    return {key.decode(): value.decode() for key, value in metadata.items() if not key.startswith(b"ARROW")}
+
+
+def _to_arrays(rows: list) -> tuple:
+    """Converts (date, price) rows into (dates, prices) arrays with the snapshot dtypes."""
+    dates = np.array([row[0] for row in rows], dtype="datetime64[ms]")
+    prices = np.array([row[1] for row in rows], dtype=np.float64)
+    return dates, prices
+
+
+def _write_partition(region: str, histories: dict, fingerprints: dict):
+    """
+    Writes a region's price histories (crop -> (dates, prices) arrays, oldest first)
+    as a Parquet partition ordered by crop and date. The row range of every crop and
+    the database fingerprint it was read at are kept in the file metadata, and the
+    file is swapped in atomically.
+    """
+    crops = sorted(histories)
+    index = {}
+    offset = 0
+    for crop in crops:
+        length = len(histories[crop][1])
+        index[crop] = {"offset": offset, "length": length, "fingerprint": fingerprints.get(crop)}
+        offset += length
+
+    table = pa.table(
+        {
+            "crop": pa.array([crop for crop in crops for _ in range(index[crop]["length"])], type=pa.string()),
+            "date": pa.array(np.concatenate([histories[crop][0] for crop in crops])),
+            "price": pa.array(np.concatenate([histories[crop][1] for crop in crops])),
+        }
+    ).replace_schema_metadata(
+        {
+            "crops": json.dumps(index),
+            "refreshed_at": datetime.now(timezone.utc).isoformat(),
+        }
+    )
+
+    path = get_partition_path(region)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    os.close(fd)
+    try:
+        # A single row group keeps every column in one contiguous chunk for zero-copy reads
+        pq.write_table(table, tmp_path, row_group_size=max(offset, 1), compression="zstd")
+        os.replace(tmp_path, path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+
+def _only_added(before: str, after: str, prices: np.ndarray) -> bool:
+    """
+    Whether the only change between two fingerprints of a pair is the addition of
+    rows with `prices` (rather than updated, removed or older converted rows).
+    """
+    count, _, price_sum = before.split(":")
+    new_count, _, new_price_sum = after.split(":")
+    return int(count) + len(prices) == int(new_count) and math.isclose(
+        float(price_sum) + float(prices.sum()), float(new_price_sum), rel_tol=1e-9, abs_tol=1e-5
+    )
+
+
+def _refresh_partition(storage, region: str, fingerprints: dict) -> int:
+    """
+    Brings a region's partition up to the given crop fingerprints. Crops that only
+    received new prices since the partition was written get just the rows with an id
+    above the highest id of their old fingerprint appended; other changed crops are
+    re-read in full, and unchanged crops are copied from the current file.
+
+    Returns:
+        The number of rows read from the database.
+    """
+    try:
+        table, index = _load_partition(region)
+    except FileNotFoundError:
+        # New partition, read the whole region at once
+        grouped = defaultdict(list)
+        for crop, date, price in storage.get_region_actual_prices(region):
+            grouped[crop].append((date, price))
+        _write_partition(region, {crop: _to_arrays(rows) for crop, rows in grouped.items()}, fingerprints)
+        return sum(len(rows) for rows in grouped.values())
+
+    histories = {}
+    rows_read = 0
+    for crop, fingerprint in fingerprints.items():
+        entry = index.get(crop)
+        if entry is not None:
+            pair = table.slice(entry["offset"], entry["length"])
+            dates, prices = _to_numpy(pair.column("date")), _to_numpy(pair.column("price"))
+            if entry["fingerprint"] == fingerprint:
+                histories[crop] = dates, prices
+                continue
+
+            added = storage.get_actual_price_history(region, crop, after_id=int(entry["fingerprint"].split(":")[1]))
+            rows_read += len(added)
+            added_dates, added_prices = _to_arrays(added)
+            if _only_added(entry["fingerprint"], fingerprint, added_prices):
+                dates = np.concatenate([dates, added_dates])
+                prices = np.concatenate([prices, added_prices])
+                order = np.argsort(dates, kind="stable")
+                histories[crop] = dates[order], prices[order]
+                continue
+
+        rows = storage.get_actual_price_history(region, crop)
+        rows_read += len(rows)
+        histories[crop] = _to_arrays(rows)
+
+    _write_partition(region, histories, fingerprints)
+    return rows_read
+
+
+def _partition_fingerprints(region: str):
+    """Returns the crop fingerprints a region's partition was written at, or None if it does not exist."""
+    try:
+        index = json.loads(_read_metadata(get_partition_path(region))["crops"])
+    except FileNotFoundError:
+        return None
+    return {crop: entry["fingerprint"] for crop, entry in index.items()}
+
+
+def _load_partition(region: str):
+    """
+    Returns a region's partition as a memory-mapped Arrow table and its crop index,
+    reusing the table already mapped by this process while the file is unchanged.
+    """
+    path = get_partition_path(region)
+    mtime_ns = os.stat(path).st_mtime_ns
+    with _tables_lock:
+        cached = _tables.get(region)
+        if cached is not None and cached[0] == mtime_ns:
+            return cached[1], cached[2]
+
+    table = pq.read_table(path, memory_map=True)
+    index = json.loads(_read_metadata(path)["crops"])
+    with _tables_lock:
+        _tables[region] = (mtime_ns, table, index)
+    return table, index
+
+
+def _to_numpy(column) -> np.ndarray:
+    """Converts a single-chunk Arrow column to NumPy without copying the data."""
+    array = column.chunk(0) if column.num_chunks == 1 else column.combine_chunks()
+    return array.to_numpy(zero_copy_only=False)
+
+
+# --------------------------------
+#          SNAPSHOT LAYER
+# --------------------------------
+
+
+def refresh_snapshots(region: str | None = None) -> dict:
+    """
+    Brings the price snapshot up to date with the database. Only regions where the
+    fingerprint of any crop changed since their partition was written are rewritten,
+    and only the new rows of crops that just received prices are read (see
+    `_refresh_partition`).
+
+    Args:
+        region: Optional region to limit the refresh to (e.g. right before retraining).
+
+    Returns:
+        Dict with the number of rewritten and unchanged partitions.
+    """
+    if not SNAPSHOTS_AVAILABLE:
+        return {"refreshed_regions": 0, "unchanged_regions": 0, "rows_read": 0}
+
+    storage = get_storage()
+    with _refresh_lock:
+        fingerprints = defaultdict(dict)
+        for (name, crop), fingerprint in storage.get_actual_price_fingerprints(region).items():
+            fingerprints[name][crop] = fingerprint
+
+        dirty = [name for name, crops in fingerprints.items() if _partition_fingerprints(name) != crops]
+        rows_read = sum(_refresh_partition(storage, name, fingerprints[name]) for name in dirty)
+
+        if region is None:
+            # Drop partitions of regions that no longer have actual prices
+            for name in list_snapshot_regions():
+                if name not in fingerprints:
+                    shutil.rmtree(os.path.dirname(get_partition_path(name)), ignore_errors=True)
+
+    if dirty:
+        print(f"🗂️ Refreshed price snapshots for {len(dirty)} of {len(fingerprints)} regions ({rows_read} rows read).")
+    return {"refreshed_regions": len(dirty), "unchanged_regions": len(fingerprints) - len(dirty), "rows_read": rows_read}
+
+
+def list_snapshot_regions() -> list:
+    """Returns the sorted names of the regions that have a snapshot partition."""
+    try:
+        names = os.listdir(PRICE_SNAPSHOT_DIR)
+    except FileNotFoundError:
+        return []
+    return sorted(unquote(name[len(PARTITION_PREFIX):]) for name in names if name.startswith(PARTITION_PREFIX))
+
+
+def describe_snapshots() -> list:
+    """Describes every snapshot partition (row count, crop count, size and refresh time)."""
+    partitions = []
+    for region in list_snapshot_regions():
+        path = get_partition_path(region)
+        try:
+            metadata = _read_metadata(path)
+            rows = pq.read_metadata(path).num_rows
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            continue
+        partitions.append(
+            {
+                "region": region,
+                "rows": rows,
+                "crops": len(json.loads(metadata["crops"])),
+                "size_bytes": size,
+                "refreshed_at": metadata.get("refreshed_at"),
+            }
+        )
+    return partitions
+
+
+def load_price_history(region: str, crop: str) -> tuple:
+    """
+    Returns the full actual price history of a pair as NumPy arrays, oldest first.
+
+    The pair's fingerprint is checked against the database first (refreshing the
+    region's partition if it changed), then its rows are sliced out of the
+    memory-mapped table without copying them. Without pyarrow, the history is
+    queried from the database instead.
+
+    Returns:
+        Tuple (dates, prices) with dtypes datetime64[ms] and float64.
+    """
+    if not SNAPSHOTS_AVAILABLE:
+        return _to_arrays(get_storage().get_actual_price_history(region, crop))
+
+    empty = np.array([], dtype="datetime64[ms]"), np.array([], dtype=np.float64)
+    fingerprint = get_storage().get_actual_price_fingerprints(region, crop).get((region, crop))
+    if fingerprint is None:
+        # No actual prices for this pair
+        return empty
+
+    try:
+        table, index = _load_partition(region)
+    except FileNotFoundError:
+        table, index = None, {}
+    if index.get(crop, {}).get("fingerprint") != fingerprint:
+        refresh_snapshots(region)
+        table, index = _load_partition(region)
+
+    entry = index.get(crop)
+    if entry is None:
+        return empty
+    pair = table.slice(entry["offset"], entry["length"])
+    return _to_numpy(pair.column("date")), _to_numpy(pair.column("price"))
+
+
+def get_export_path(region: str):
+    """Refreshes a region's partition and returns its path, or None if the region has no prices."""
+    refresh_snapshots(region)
+    path = get_partition_path(region)
+    return path if os.path.exists(path) else None
+
+
+# Background job that keeps the price snapshot close to the database
+# (only runs when pyarrow is installed)
+snapshot_job = PeriodicJob(
+    name="snapshot-refresher",
+    func=refresh_snapshots,
+    interval=SNAPSHOT_REFRESH_INTERVAL if SNAPSHOTS_AVAILABLE else 0,
+)
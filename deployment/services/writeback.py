@@ -0,0 +1,150 @@
+# services/writeback.py
+
+import time
+import threading
+
+
+def _to_ms(seconds):
+    return round(seconds * 1000, 3) if seconds is not None else None
+
+
+class WriteBehindBuffer:
+    """
+    Buffers rows in memory and writes them from a single writer thread in
+    batched transactions, flushing when `batch_size` rows are pending or
+    every `flush_interval` seconds, whichever comes first.
+
+    Rows are keyed by `key_func`, so a newer row replaces a pending one with the
+    same key instead of being written twice. Failed flushes put the rows back
+    in the buffer to be retried, and `stop()` drains everything before returning.
+    """
+
+    def __init__(self, name: str, flush_func, key_func, batch_size: int, flush_interval: float):
+        self.name = name
+        self.flush_func = flush_func
+        self.key_func = key_func
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._pending = {}
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._stopped = False
+        self._thread = None
+
+        # Metrics
+        self._flushes = 0
+        self._failed_flushes = 0
+        self._flushed_rows = 0
+        self._last_flush_latency = None
+        self._max_flush_latency = 0.0
+        self._total_flush_latency = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Starts the writer thread."""
+        if self.running:
+            return
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        print(f"✍️ Started write-behind buffer '{self.name}' (batch {self.batch_size}, every {self.flush_interval}s)")
+
+    def put(self, rows: list):
+        """Adds rows to the buffer, waking the writer if a full batch is pending."""
+        with self._condition:
+            for row in rows:
+                self._pending[self.key_func(row)] = row
+            if len(self._pending) >= self.batch_size:
+                self._condition.notify()
+
+    def flush(self) -> int:
+        """Writes all pending rows now. Returns the number of rows written."""
+        with self._flush_lock:
+            with self._condition:
+                batch = list(self._pending.values())
+                self._pending.clear()
+            if not batch:
+                return 0
+
+            started = time.perf_counter()
+            try:
+                self.flush_func(batch)
+            except Exception:
+                # Put the rows back (without overwriting newer ones) so they are retried
+                with self._condition:
+                    for row in batch:
+                        self._pending.setdefault(self.key_func(row), row)
+                self._failed_flushes += 1
+                raise
+
+            latency = time.perf_counter() - started
+            self._flushes += 1
+            self._flushed_rows += len(batch)
+            self._last_flush_latency = latency
+            self._max_flush_latency = max(self._max_flush_latency, latency)
+            self._total_flush_latency += latency
+            return len(batch)
+
+    def stop(self, retries: int = 3):
+        """
+        Stops the writer thread and flushes every pending row.
+        Raises if the rows still cannot be written after `retries` attempts.
+        """
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+        for attempt in range(1, retries + 1):
+            try:
+                written = self.flush()
+                print(f"✅ Write-behind buffer '{self.name}' drained ({written} rows) on shutdown.")
+                return
+            except Exception as e:
+                print(f"❌ Final flush of '{self.name}' failed (attempt {attempt}/{retries}): {e}")
+                time.sleep(0.5 * attempt)
+        raise RuntimeError(f"Write-behind buffer '{self.name}' could not flush {self.depth} pending rows.")
+
+    @property
+    def depth(self) -> int:
+        """Number of rows waiting to be written."""
+        with self._condition:
+            return len(self._pending)
+
+    def stats(self) -> dict:
+        """Returns buffer depth and flush latency metrics (latencies in milliseconds)."""
+        return {
+            "running": self.running,
+            "depth": self.depth,
+            "batch_size": self.batch_size,
+            "flush_interval_seconds": self.flush_interval,
+            "flushes": self._flushes,
+            "failed_flushes": self._failed_flushes,
+            "flushed_rows": self._flushed_rows,
+            "last_flush_latency_ms": _to_ms(self._last_flush_latency),
+            "avg_flush_latency_ms": _to_ms(self._total_flush_latency / self._flushes) if self._flushes else None,
+            "max_flush_latency_ms": _to_ms(self._max_flush_latency),
+        }
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if not self._stopped and len(self._pending) < self.batch_size:
+                    self._condition.wait(self.flush_interval)
+                if self._stopped:
+                    # stop() drains whatever is left
+                    return
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"❌ Write-behind flush of '{self.name}' failed, will retry: {e}")
+                # Back off before retrying so a failing database is not hammered
+                with self._condition:
+                    if not self._stopped:
+                        self._condition.wait(self.flush_interval)
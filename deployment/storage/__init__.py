@@ -0,0 +1,23 @@
+# storage/__init__.py
+
+from storage.base import StorageBackend
+from settings import DB_PATH, DATABASE_URL, DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE
+
+_storage = None
+
+
+def get_storage() -> StorageBackend:
+    """
+    Returns the configured storage backend, creating it on first use.
+    PostgreSQL is used when DATABASE_URL is set, otherwise the SQLite file at DB_PATH.
+    """
+    global _storage
+    if _storage is None:
+        if DATABASE_URL:
+            # Imported lazily so SQLite deployments do not need the PostgreSQL driver
+            from storage.postgres import PostgresStorage
+            _storage = PostgresStorage(DATABASE_URL, min_size=DB_POOL_MIN_SIZE, max_size=DB_POOL_MAX_SIZE)
+        else:
+            from storage.sqlite import SQLiteStorage
+            _storage = SQLiteStorage(DB_PATH)
+    return _storage
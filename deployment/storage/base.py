@@ -0,0 +1,942 @@
+# storage/base.py
+
+import json
+import time
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from contextlib import contextmanager
+from settings import FRUITS, VEGETABLES
+
+
+class StorageBackend(ABC):
+    """
+    Interface for everything the API reads from or writes to the database.
+
+    Queries are written once here in portable SQL with `?` placeholders;
+    backends only provide connections, the schema, bulk loading and
+    their own placeholder style.
+    """
+
+    # Parameter placeholder used by the backend's DB-API driver
+    placeholder = "?"
+
+    # --------------------------------
+    #     BACKEND SPECIFIC METHODS
+    # --------------------------------
+
+    @abstractmethod
+    @contextmanager
+    def connection(self):
+        """
+        Yields a connection running in a transaction, which is committed when
+        the block exits normally and rolled back if it raises.
+        """
+
+    @abstractmethod
+    def init_schema(self):
+        """Creates the tables and indexes if they do not exist."""
+
+    @abstractmethod
+    def bulk_load_prices(self, rows: list) -> int:
+        """
+        Loads many (date, region, crop, price, actual) rows into the 'price' table,
+        skipping rows that already exist. Returns the number of rows attempted.
+        """
+
+    @abstractmethod
+    def parse_timestamp(self, value):
+        """Converts a timestamp column value into a naive UTC datetime."""
+
+    def close(self):
+        """Releases any connections held by the backend."""
+
+    def optimize(self):
+        """
+        Reclaims space freed by deletes and refreshes the query planner statistics,
+        without locking out concurrent writers for long.
+        """
+
+    def begin_write(self, cursor, lock: str | None = None):
+        """
+        Called at the start of read-then-write transactions. Backends that only take
+        write locks lazily can take them upfront here, so concurrent writers wait
+        for each other instead of failing halfway.
+
+        Transactions passing the same `lock` name never run concurrently, even on
+        backends where other writers do.
+        """
+
+    def sql(self, query: str) -> str:
+        """Translates a query written with `?` placeholders into the backend's style."""
+        if self.placeholder == "?":
+            return query
+        return query.replace("?", self.placeholder)
+
+    def _seed_crops(self, cursor):
+        """Seeds the 'crops' table with the crops defined in settings, keeping existing rows."""
+        rows = [(crop, "Fruit") for crop in sorted(FRUITS)] + [(crop, "Vegetable") for crop in sorted(VEGETABLES)]
+        cursor.executemany(
+            self.sql("INSERT INTO crops (name, crop_type) VALUES (?, ?) ON CONFLICT (name) DO NOTHING"),
+            rows,
+        )
+
+    # --------------------------------
+    #            CATALOG
+    # --------------------------------
+
+    def get_crop_types(self) -> dict:
+        """Returns a dict mapping every known crop to its crop type (e.g. 'Fruit')."""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT name, crop_type FROM crops")
+            return {name: crop_type for name, crop_type in cursor.fetchall()}
+
+    def store_crop(self, name: str, crop_type: str):
+        """Adds a crop to the 'crops' table, or changes the type of an existing one."""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                self.sql(
+                    """
+                    INSERT INTO crops (name, crop_type) VALUES (?, ?)
+                    ON CONFLICT (name) DO UPDATE SET crop_type = excluded.crop_type
+                    """
+                ),
+                (name, crop_type),
+            )
+
+    def get_regions(self) -> list:
+        """Returns the sorted names of all regions that have price data."""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT DISTINCT region FROM price ORDER BY region")
+            return [row[0] for row in cursor.fetchall()]
+
+    # --------------------------------
+    #           PRICE DATA
+    # --------------------------------
+
+    def get_latest_actual_prices(self, region: str, crop: str, limit: int) -> list:
+        """Returns the last `limit` actual (date, price) rows of a pair, oldest first."""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                self.sql(
+                    """
+                    SELECT date, price FROM price
+                    WHERE region = ? AND crop = ? AND actual = 1
+                    ORDER BY date DESC
+                    LIMIT ?
+                    """
+                ),
+                (region, crop, limit),
+            )
+            rows = cursor.fetchall()
+        return sorted((tuple(row) for row in rows), key=lambda row: row[0])
+
+    def get_actual_price_history(self, region: str, crop: str, after_id: int = 0) -> list:
+        """
+        Returns the actual (date, price) rows of a pair, oldest first: every row, or
+        only the rows with an id above `after_id` (e.g. the highest id of a fingerprint).
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                self.sql(
+                    """
+                    SELECT date, price FROM price
+                    WHERE region = ? AND crop = ? AND actual = 1 AND id > ?
+                    ORDER BY date ASC
+                    """
+                ),
+                (region, crop, after_id),
+            )
+            return [tuple(row) for row in cursor.fetchall()]
+
+    def get_region_actual_prices(self, region: str) -> list:
+        """Returns every actual (crop, date, price) row of a region, ordered by crop and date."""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                self.sql(
+                    """
+                    SELECT crop, date, price FROM price
+                    WHERE region = ? AND actual = 1
+                    ORDER BY crop ASC, date ASC
+                    """
+                ),
+                (region,),
+            )
+            return cursor.fetchall()
+
+    def get_actual_price_fingerprints(self, region: str | None = None, crop: str | None = None) -> dict:
+        """
+        Computes a cheap aggregate fingerprint of the actual prices of every pair
+        (row count, highest row id and price sum), which changes whenever an actual
+        price is added, converted from a prediction or updated.
+
+        Args:
+            region: Optional region to limit the computation to.
+            crop: Optional crop to limit the computation to (together with `region`).
+
+        Returns:
+            Dict mapping each (region, crop) pair to its fingerprint string.
+        """
+        filters = []
+        params = []
+        for column, value in (("region", region), ("crop", crop)):
+            if value is not None:
+                filters.append(f"AND {column} = ?")
+                params.append(value)
+
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                self.sql(
+                    f"""
+                    SELECT region, crop, COUNT(*), MAX(id), SUM(price) FROM price
+                    WHERE actual = 1 {" ".join(filters)}
+                    GROUP BY region, crop
+                    """
+                ),
+                tuple(params),
+            )
+            return {
+                (region, crop): f"{count}:{max_id}:{round(float(price_sum), 6)}"
+                for region, crop, count, max_id, price_sum in cursor.fetchall()
+            }
+
+    def get_lag_windows(self, limit: int) -> dict:
+        """
+        Fetches the last `limit` actual prices of every (region, crop) pair in one query.
+
+        Returns:
+            Dict mapping (region, crop) to a chronologically sorted list of (date, price).
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                self.sql(
+                    """
+                    SELECT region, crop, date, price FROM (
+                        SELECT region, crop, date, price,
+                               ROW_NUMBER() OVER (PARTITION BY region, crop ORDER BY date DESC) AS rn
+                        FROM price
+                        WHERE actual = 1
+                    ) AS ranked
+                    WHERE rn <= ?
+                    ORDER BY region, crop, date ASC
+                    """
+                ),
+                (limit,),
+            )
+            rows = cursor.fetchall()
+
+        windows = defaultdict(list)
+        for region, crop, date, price in rows:
+            windows[(region, crop)].append((date, price))
+        return windows
+
+    def get_prediction_inputs(self, region: str, crop: str, lag_limit: int, error_limit: int) -> tuple:
+        """
+        Fetches, in a single query, what a live prediction needs for a pair: the last
+        `lag_limit` actual (date, price) rows (oldest first) and the last `error_limit`
+        squared errors used for prediction intervals.
+
+        Returns:
+            Tuple (lags, squared_errors).
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                self.sql(
+                    """
+                    SELECT 'lag' AS kind, date, price AS value FROM (
+                        SELECT date, price FROM price
+                        WHERE region = ? AND crop = ? AND actual = 1
+                        ORDER BY date DESC
+                        LIMIT ?
+                    ) AS lags
+                    UNION ALL
+                    SELECT 'error' AS kind, date, squared_error AS value FROM (
+                        SELECT date, squared_error FROM prediction_errors
+                        WHERE region = ? AND crop = ?
+                        ORDER BY date DESC
+                        LIMIT ?
+                    ) AS errors
+                    """
+                ),
+                (region, crop, lag_limit, region, crop, error_limit),
+            )
+            rows = cursor.fetchall()
+
+        lags = sorted(((date, value) for kind, date, value in rows if kind == "lag"), key=lambda row: row[0])
+        squared_errors = [value for kind, _, value in rows if kind == "error"]
+        return lags, squared_errors
+
+    def store_actual_price(
+        self,
+        date: str,
+        region: str,
+        crop: str,
+        price: float,
+        idempotency_key: str | None = None,
+        request_hash: str | None = None,
+    ) -> dict:
+        """
+        Stores an actual price. If it replaces a predicted price, the squared error
+        is logged to 'prediction_errors' in the same transaction.
+
+        The predicted-to-actual transition is claimed with a conditional update
+        (`... WHERE actual = 0`), which only one of several concurrent writers can
+        win, so exactly one error is logged per transition.
+
+        When an idempotency key is given, it is recorded in the same transaction;
+        if the key was already recorded, nothing is written.
+
+        Returns:
+            Dict with the outcome: 'status' is one of 'inserted', 'replaced_prediction',
+            'updated' or 'duplicate', plus 'previous_price' and 'squared_error' where
+            relevant ('request_hash' of the original request for duplicates).
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            self.begin_write(cursor)
+
+            if idempotency_key is not None:
+                cursor.execute(
+                    self.sql(
+                        """
+                        INSERT INTO idempotency_keys (idempotency_key, request_hash) VALUES (?, ?)
+                        ON CONFLICT (idempotency_key) DO NOTHING
+                        """
+                    ),
+                    (idempotency_key, request_hash),
+                )
+                if cursor.rowcount == 0:
+                    cursor.execute(
+                        self.sql("SELECT request_hash FROM idempotency_keys WHERE idempotency_key = ?"),
+                        (idempotency_key,),
+                    )
+                    return {"status": "duplicate", "request_hash": cursor.fetchone()[0]}
+
+            # A predicted row can be written concurrently between the steps below,
+            # in which case they are simply tried again
+            for _ in range(3):
+                # Claim a predicted record, if any, by marking it actual while it
+                # still holds the predicted price
+                cursor.execute(
+                    self.sql(
+                        """
+                        UPDATE price SET actual = 1
+                        WHERE date = ? AND region = ? AND crop = ? AND actual = 0
+                        """
+                    ),
+                    (date, region, crop),
+                )
+                if cursor.rowcount == 1:
+                    # Existing predicted record - log the error and store the actual price
+                    cursor.execute(
+                        self.sql("SELECT id, price FROM price WHERE date = ? AND region = ? AND crop = ?"),
+                        (date, region, crop),
+                    )
+                    record_id, predicted_price = cursor.fetchone()
+                    squared_error = (price - predicted_price) ** 2
+                    cursor.execute(
+                        self.sql(
+                            """
+                            INSERT INTO prediction_errors (date, region, crop, squared_error)
+                            VALUES (?, ?, ?, ?)
+                            """
+                        ),
+                        (date, region, crop, squared_error),
+                    )
+                    cursor.execute(
+                        self.sql("UPDATE price SET price = ? WHERE id = ?"),
+                        (price, record_id),
+                    )
+                    return {
+                        "status": "replaced_prediction",
+                        "previous_price": predicted_price,
+                        "squared_error": squared_error,
+                    }
+
+                # Existing actual record - overwrite the price (actual remains 1)
+                cursor.execute(
+                    self.sql("SELECT id, price FROM price WHERE date = ? AND region = ? AND crop = ? AND actual = 1"),
+                    (date, region, crop),
+                )
+                existing_row = cursor.fetchone()
+                if existing_row is not None:
+                    record_id, existing_price = existing_row
+                    cursor.execute(
+                        self.sql("UPDATE price SET price = ? WHERE id = ?"),
+                        (price, record_id),
+                    )
+                    return {"status": "updated", "previous_price": existing_price}
+
+                # No existing record - Insert as new actual data
+                cursor.execute(
+                    self.sql(
+                        """
+                        INSERT INTO price (date, region, crop, price, actual)
+                        VALUES (?, ?, ?, ?, 1)
+                        ON CONFLICT (date, region, crop) DO NOTHING
+                        """
+                    ),
+                    (date, region, crop, price),
+                )
+                if cursor.rowcount == 1:
+                    return {"status": "inserted"}
+
+            raise RuntimeError(f"Could not store actual price for {date}, {region}, {crop}: record kept changing.")
+
+    # --------------------------------
+    #          WEATHER DATA
+    # --------------------------------
+
+    def store_weather(self, date: str, region: str, rainfall, humidity, temp) -> bool:
+        """Stores or updates weather data. Returns True if an existing row was updated."""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            # Check if a weather record for this date and region already exists
+            cursor.execute(
+                self.sql("SELECT id FROM weather WHERE date = ? AND region = ?"),
+                (date, region),
+            )
+            existing_row = cursor.fetchone()
+
+            if existing_row:
+                cursor.execute(
+                    self.sql(
+                        """
+                        UPDATE weather
+                        SET rainfall = ?, humidity = ?, temp = ?
+                        WHERE id = ?
+                        """
+                    ),
+                    (rainfall, humidity, temp, existing_row[0]),
+                )
+                return True
+
+            cursor.execute(
+                self.sql(
+                    """
+                    INSERT INTO weather (date, region, rainfall, humidity, temp)
+                    VALUES (?, ?, ?, ?, ?)
+                    """
+                ),
+                (date, region, rainfall, humidity, temp),
+            )
+            return False
+
+    # --------------------------------
+    #        PREDICTION ERRORS
+    # --------------------------------
+
+    def get_squared_errors(self, region: str, crop: str, start_date: str, end_date: str) -> list:
+        """Returns the squared errors logged for a pair between two dates (inclusive)."""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                self.sql(
+                    """
+                    SELECT squared_error FROM prediction_errors
+                    WHERE region = ? AND crop = ? AND date >= ? AND date <= ?
+                    ORDER BY date DESC
+                    """
+                ),
+                (region, crop, start_date, end_date),
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def get_recent_squared_errors(self, limit: int) -> dict:
+        """
+        Fetches the last `limit` squared errors of every (region, crop) pair in one query.
+
+        Returns:
+            Dict mapping (region, crop) to a list of squared errors, newest first.
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                self.sql(
+                    """
+                    SELECT region, crop, squared_error FROM (
+                        SELECT region, crop, date, squared_error,
+                               ROW_NUMBER() OVER (PARTITION BY region, crop ORDER BY date DESC) AS rn
+                        FROM prediction_errors
+                    ) AS ranked
+                    WHERE rn <= ?
+                    ORDER BY region, crop, date DESC
+                    """
+                ),
+                (limit,),
+            )
+            rows = cursor.fetchall()
+
+        errors = defaultdict(list)
+        for region, crop, squared_error in rows:
+            errors[(region, crop)].append(squared_error)
+        return errors
+
+    def get_drift_inputs(self, region: str, crop: str, start_date: str, end_date: str) -> tuple:
+        """
+        Fetches what a drift check needs for a pair in one connection: the squared errors
+        logged between two dates (inclusive) after its model was last retrained, the mean
+        actual price over the same dates and the model's baseline.
+
+        Returns:
+            Tuple (squared errors newest first, mean actual price or None, baseline dict or None).
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                self.sql(
+                    """
+                    SELECT baseline_rmse, backtest_points, trained_through FROM model_baselines
+                    WHERE region = ? AND crop = ?
+                    """
+                ),
+                (region, crop),
+            )
+            row = cursor.fetchone()
+            baseline = None
+            if row is not None:
+                baseline = {"baseline_rmse": row[0], "backtest_points": row[1], "trained_through": row[2]}
+
+            # Errors of the previous model (dated up to the retraining data) do not count
+            # against the retrained one
+            cursor.execute(
+                self.sql(
+                    """
+                    SELECT squared_error FROM prediction_errors
+                    WHERE region = ? AND crop = ? AND date >= ? AND date <= ? AND date > ?
+                    ORDER BY date DESC
+                    """
+                ),
+                (region, crop, start_date, end_date, baseline["trained_through"] if baseline else ""),
+            )
+            errors = [r[0] for r in cursor.fetchall()]
+
+            cursor.execute(
+                self.sql(
+                    """
+                    SELECT AVG(price) FROM price
+                    WHERE region = ? AND crop = ? AND actual = 1 AND date >= ? AND date <= ?
+                    """
+                ),
+                (region, crop, start_date, end_date),
+            )
+            mean_price = cursor.fetchone()[0]
+
+        return errors, mean_price, baseline
+
+    def store_model_baseline(
+        self, region: str, crop: str, baseline_rmse, backtest_points: int, trained_through: str
+    ):
+        """Records the backtest error of a pair's freshly retrained model (replacing the previous one)."""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                self.sql(
+                    """
+                    INSERT INTO model_baselines (region, crop, baseline_rmse, backtest_points, trained_through, created_at)
+                    VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                    ON CONFLICT (region, crop) DO UPDATE SET
+                        baseline_rmse = excluded.baseline_rmse,
+                        backtest_points = excluded.backtest_points,
+                        trained_through = excluded.trained_through,
+                        created_at = excluded.created_at
+                    """
+                ),
+                (region, crop, baseline_rmse, backtest_points, trained_through),
+            )
+
+    # --------------------------------
+    #            FORECASTS
+    # --------------------------------
+
+    def store_forecasts(self, rows: list):
+        """
+        Writes forecast rows to the 'forecasts' table (replacing older ones for the same
+        pair and week ahead) and their predicted rows to the 'price' table, refreshing
+        predicted rows that exist already but never overwriting actual prices.
+
+        Args:
+            rows: List of tuples (region, crop, prediction_index, date, price, base_date,
+                  model_version, quantiles), where quantiles is a dict or None.
+        """
+        forecast_rows = [
+            (*row[:7], json.dumps(quantiles) if quantiles is not None else None)
+            for *row, quantiles in rows
+        ]
+        # Use actual=0 to mark these as predictions
+        price_rows = [(date, region, crop, price, 0) for region, crop, _, date, price, *_ in rows]
+
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany(
+                self.sql(
+                    """
+                    INSERT INTO forecasts (region, crop, prediction_index, date, price, base_date, model_version, quantiles)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (region, crop, prediction_index) DO UPDATE SET
+                        date = excluded.date,
+                        price = excluded.price,
+                        base_date = excluded.base_date,
+                        model_version = excluded.model_version,
+                        quantiles = excluded.quantiles,
+                        created_at = CURRENT_TIMESTAMP
+                    """
+                ),
+                forecast_rows,
+            )
+            cursor.executemany(
+                self.sql(
+                    """
+                    INSERT INTO price (date, region, crop, price, actual)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT (date, region, crop) DO UPDATE SET price = excluded.price
+                    WHERE price.actual = 0
+                    """
+                ),
+                price_rows,
+            )
+
+    def get_forecast_rows(self, region: str, crop: str) -> list:
+        """
+        Returns the stored forecast rows of a pair as dicts, each including the date of
+        the latest actual price so callers can tell whether the forecast is stale.
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                self.sql(
+                    """
+                    SELECT f.prediction_index, f.date, f.price, f.quantiles, f.base_date, f.model_version, f.created_at,
+                           (SELECT MAX(p.date) FROM price p
+                            WHERE p.region = f.region AND p.crop = f.crop AND p.actual = 1) AS latest_actual
+                    FROM forecasts f
+                    WHERE f.region = ? AND f.crop = ?
+                    ORDER BY f.prediction_index ASC
+                    """
+                ),
+                (region, crop),
+            )
+            rows = cursor.fetchall()
+
+        return [
+            {
+                "prediction_index": index,
+                "date": date,
+                "price": price,
+                "quantiles": json.loads(quantiles) if quantiles is not None else None,
+                "base_date": base_date,
+                "model_version": version,
+                "created_at": self.parse_timestamp(created_at),
+                "latest_actual": latest_actual,
+            }
+            for index, date, price, quantiles, base_date, version, created_at, latest_actual in rows
+        ]
+
+    # --------------------------------
+    #           MAINTENANCE
+    # --------------------------------
+
+    def get_latest_error_date(self):
+        """Returns the most recent date in 'prediction_errors', or None if it is empty."""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT MAX(date) FROM prediction_errors")
+            return cursor.fetchone()[0]
+
+    def get_prediction_errors_before(self, before_date: str, limit: int) -> list:
+        """
+        Returns up to `limit` raw prediction errors dated before `before_date`, oldest
+        rows first, as (id, date, region, crop, squared_error, created_at) tuples.
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                self.sql(
+                    """
+                    SELECT id, date, region, crop, squared_error, created_at FROM prediction_errors
+                    WHERE date < ?
+                    ORDER BY id ASC
+                    LIMIT ?
+                    """
+                ),
+                (before_date, limit),
+            )
+            return [tuple(row) for row in cursor.fetchall()]
+
+    def rollup_prediction_errors(self, rows: list, summarize) -> int:
+        """
+        Deletes raw prediction errors and adds weekly summaries of the rows it
+        actually deleted to 'prediction_error_summaries', in a single transaction.
+        Rows already deleted by a concurrent maintenance run are skipped, so they
+        are never counted twice.
+
+        Args:
+            rows: (id, date, region, crop, squared_error, created_at) tuples, as
+                  returned by get_prediction_errors_before.
+            summarize: Function turning rows into (region, crop, week_start, error_count,
+                       sum_squared_error, max_squared_error) summaries.
+
+        Returns:
+            The number of rows deleted.
+        """
+        if not rows:
+            return 0
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            placeholders = ", ".join("?" * len(rows))
+            cursor.execute(
+                self.sql(f"DELETE FROM prediction_errors WHERE id IN ({placeholders}) RETURNING id"),
+                [row[0] for row in rows],
+            )
+            deleted = {record_id for (record_id,) in cursor.fetchall()}
+            rows = [row for row in rows if row[0] in deleted]
+            if not rows:
+                return 0
+            cursor.executemany(
+                self.sql(
+                    """
+                    INSERT INTO prediction_error_summaries
+                        (region, crop, week_start, error_count, sum_squared_error, max_squared_error)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (region, crop, week_start) DO UPDATE SET
+                        error_count = prediction_error_summaries.error_count + excluded.error_count,
+                        sum_squared_error = prediction_error_summaries.sum_squared_error + excluded.sum_squared_error,
+                        max_squared_error = CASE
+                            WHEN excluded.max_squared_error > prediction_error_summaries.max_squared_error
+                            THEN excluded.max_squared_error
+                            ELSE prediction_error_summaries.max_squared_error
+                        END
+                    """
+                ),
+                summarize(rows),
+            )
+            return len(rows)
+
+    def get_latest_actual_dates(self) -> dict:
+        """Returns a dict mapping every (region, crop) pair to its latest actual price date."""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                SELECT region, crop, MAX(date) FROM price
+                WHERE actual = 1
+                GROUP BY region, crop
+                """
+            )
+            return {(region, crop): date for region, crop, date in cursor.fetchall()}
+
+    def delete_predicted_prices_before(self, region: str, crop: str, before_date: str, limit: int) -> int:
+        """
+        Deletes up to `limit` predicted (actual=0) prices of a pair dated before
+        `before_date`. Returns the number of rows deleted.
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                self.sql(
+                    """
+                    DELETE FROM price WHERE id IN (
+                        SELECT id FROM price
+                        WHERE region = ? AND crop = ? AND actual = 0 AND date < ?
+                        LIMIT ?
+                    )
+                    """
+                ),
+                (region, crop, before_date, limit),
+            )
+            return cursor.rowcount
+
+    def delete_idempotency_keys_before(self, before: str, limit: int) -> int:
+        """
+        Deletes up to `limit` idempotency keys recorded before `before`
+        (a 'YYYY-MM-DD HH:MM:SS' UTC timestamp). Returns the number of keys deleted.
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                self.sql(
+                    """
+                    DELETE FROM idempotency_keys WHERE idempotency_key IN (
+                        SELECT idempotency_key FROM idempotency_keys
+                        WHERE created_at < ?
+                        LIMIT ?
+                    )
+                    """
+                ),
+                (before, limit),
+            )
+            return cursor.rowcount
+
+    # --------------------------------
+    #        BACKGROUND JOBS
+    # --------------------------------
+
+    def claim_job(self, name: str, interval: float) -> bool:
+        """
+        Claims the next run of a background job shared by all API processes. Only
+        one caller gets each run: the claim succeeds if the job has never run or its
+        next run is due, and moves the next run `interval` seconds ahead.
+
+        Returns:
+            Whether this caller should run the job now.
+        """
+        now = time.time()
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                self.sql(
+                    """
+                    INSERT INTO job_runs (name, next_run_at) VALUES (?, ?)
+                    ON CONFLICT (name) DO UPDATE SET next_run_at = excluded.next_run_at
+                    WHERE job_runs.next_run_at <= ?
+                    """
+                ),
+                (name, now + interval, now),
+            )
+            return cursor.rowcount == 1
+
+    # --------------------------------
+    #         RETRAINING QUEUE
+    # --------------------------------
+
+    def queue_retrain(self, region: str, crop: str, drift_score: float, timeout: float, failure_backoff: float) -> bool:
+        """
+        Queues a drifting pair for retraining, or updates its drift score if it is
+        already queued. Returns False if the pair is being retrained (by a run started
+        less than `timeout` seconds ago, see `claim_retrain`), or if a retraining of the
+        pair failed less than `failure_backoff` seconds ago.
+        """
+        now = time.time()
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            self.begin_write(cursor, lock="retrain")
+            cursor.execute(
+                self.sql(
+                    """
+                    SELECT 1 FROM retrain_runs
+                    WHERE region = ? AND crop = ?
+                    AND (
+                        (finished_at IS NULL AND started_at > ?)
+                        OR (status = 'failed' AND finished_at > ?)
+                    )
+                    """
+                ),
+                (region, crop, now - timeout, now - failure_backoff),
+            )
+            if cursor.fetchone() is not None:
+                return False
+            cursor.execute(
+                self.sql(
+                    """
+                    INSERT INTO retrain_queue (region, crop, drift_score, queued_at) VALUES (?, ?, ?, ?)
+                    ON CONFLICT (region, crop) DO UPDATE SET drift_score = excluded.drift_score
+                    """
+                ),
+                (region, crop, drift_score, now),
+            )
+            return True
+
+    def claim_retrain(self, budget_per_hour: int, timeout: float):
+        """
+        Takes the worst drifting pair off the queue and records the start of its
+        retraining, if no other retraining is running and fewer than `budget_per_hour`
+        were started in the last hour, across all API processes. Runs not finished
+        after `timeout` seconds (e.g. their process died) no longer count as running.
+
+        Returns:
+            Tuple (run_id, region, crop), or None if nothing can be retrained now.
+        """
+        now = time.time()
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            self.begin_write(cursor, lock="retrain")
+            cursor.execute(self.sql("SELECT COUNT(*) FROM retrain_runs WHERE started_at > ?"), (now - 3600,))
+            if cursor.fetchone()[0] >= budget_per_hour:
+                return None
+            cursor.execute(
+                self.sql("SELECT 1 FROM retrain_runs WHERE finished_at IS NULL AND started_at > ?"),
+                (now - timeout,),
+            )
+            if cursor.fetchone() is not None:
+                return None
+
+            cursor.execute("SELECT region, crop, drift_score FROM retrain_queue ORDER BY drift_score DESC LIMIT 1")
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            region, crop, drift_score = row
+            cursor.execute(self.sql("DELETE FROM retrain_queue WHERE region = ? AND crop = ?"), (region, crop))
+            cursor.execute(
+                self.sql(
+                    """
+                    INSERT INTO retrain_runs (region, crop, drift_score, started_at) VALUES (?, ?, ?, ?)
+                    RETURNING id
+                    """
+                ),
+                (region, crop, drift_score, now),
+            )
+            return cursor.fetchone()[0], region, crop
+
+    def finish_retrain(self, run_id: int, status: str):
+        """Records the end of a retraining run claimed with `claim_retrain`."""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                self.sql("UPDATE retrain_runs SET finished_at = ?, status = ? WHERE id = ?"),
+                (time.time(), status, run_id),
+            )
+
+    def get_retrain_state(self, timeout: float) -> dict:
+        """
+        Returns the retraining budget usage and queue: the start times of the runs
+        started in the last hour (oldest first), the running run (None if none), the
+        queued (region, crop, drift_score) tuples (worst drift first), and the number
+        of runs ever started, completed and failed.
+        """
+        now = time.time()
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                self.sql("SELECT started_at FROM retrain_runs WHERE started_at > ? ORDER BY started_at"),
+                (now - 3600,),
+            )
+            started = [row[0] for row in cursor.fetchall()]
+            cursor.execute(
+                self.sql(
+                    """
+                    SELECT region, crop FROM retrain_runs
+                    WHERE finished_at IS NULL AND started_at > ?
+                    ORDER BY started_at DESC
+                    LIMIT 1
+                    """
+                ),
+                (now - timeout,),
+            )
+            running = cursor.fetchone()
+            cursor.execute("SELECT region, crop, drift_score FROM retrain_queue ORDER BY drift_score DESC")
+            queued = [tuple(row) for row in cursor.fetchall()]
+            cursor.execute(
+                """
+                SELECT COUNT(*),
+                       COUNT(CASE WHEN status = 'completed' THEN 1 END),
+                       COUNT(CASE WHEN status = 'failed' THEN 1 END)
+                FROM retrain_runs
+                """
+            )
+            total, completed, failed = cursor.fetchone()
+        return {
+            "started_last_hour": started,
+            "running": None if running is None else tuple(running),
+            "queued": queued,
+            "started": total,
+            "completed": completed,
+            "failed": failed,
+        }
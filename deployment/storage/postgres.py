@@ -0,0 +1,240 @@
+# storage/postgres.py
+
+from contextlib import contextmanager
+from psycopg_pool import ConnectionPool
+from storage.base import StorageBackend
+
+
+class PostgresStorage(StorageBackend):
+    """
+    Storage backend for a shared PostgreSQL database, so several stateless
+    API replicas can read and write concurrently. Connections come from a pool.
+    """
+
+    placeholder = "%s"
+
+    def __init__(self, database_url: str, min_size: int = 1, max_size: int = 10):
+        self.pool = ConnectionPool(
+            conninfo=database_url,
+            min_size=min_size,
+            max_size=max_size,
+            open=True,
+        )
+
+    @contextmanager
+    def connection(self):
+        # The pool commits on a clean exit and rolls back if the block raises
+        with self.pool.connection() as conn:
+            yield conn
+
+    def close(self):
+        self.pool.close()
+
+    def optimize(self):
+        # VACUUM cannot run inside a transaction; plain (non-FULL) VACUUM does not block writers
+        with self.pool.connection() as conn:
+            conn.autocommit = True
+            try:
+                for table in ("prediction_errors", "price", "forecasts"):
+                    conn.execute(f"VACUUM (ANALYZE) {table}")
+            finally:
+                conn.autocommit = False
+
+    def begin_write(self, cursor, lock: str | None = None):
+        # Row locks already serialize conflicting writers; named locks are
+        # transaction-scoped advisory locks, released on commit or rollback
+        if lock is not None:
+            cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (lock,))
+
+    def parse_timestamp(self, value):
+        # TIMESTAMP columns are already returned as naive UTC datetimes
+        return value
+
+    def init_schema(self):
+        with self.connection() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS price (
+                    id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+                    date TEXT NOT NULL,
+                    region TEXT NOT NULL,
+                    crop TEXT NOT NULL,
+                    price DOUBLE PRECISION NOT NULL,
+                    actual INTEGER DEFAULT 0, -- 1 for actual, 0 for predicted
+                    UNIQUE(date, region, crop)
+                )
+                """
+            )
+
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS weather (
+                    id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+                    date TEXT NOT NULL,
+                    region TEXT NOT NULL,
+                    rainfall DOUBLE PRECISION,
+                    humidity DOUBLE PRECISION,
+                    temp DOUBLE PRECISION,
+                    UNIQUE(date, region)
+                )
+                """
+            )
+
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS prediction_errors (
+                    id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+                    date TEXT NOT NULL,
+                    region TEXT NOT NULL,
+                    crop TEXT NOT NULL,
+                    squared_error DOUBLE PRECISION NOT NULL,
+                    created_at TIMESTAMP DEFAULT (now() AT TIME ZONE 'utc')
+                )
+                """
+            )
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_error_date_region_crop ON prediction_errors (date, region, crop);")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_error_region_crop ON prediction_errors (region, crop);")
+
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS prediction_error_summaries (
+                    id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+                    region TEXT NOT NULL,
+                    crop TEXT NOT NULL,
+                    week_start TEXT NOT NULL,
+                    error_count INTEGER NOT NULL,
+                    sum_squared_error DOUBLE PRECISION NOT NULL,
+                    max_squared_error DOUBLE PRECISION NOT NULL,
+                    UNIQUE(region, crop, week_start)
+                )
+                """
+            )
+
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS forecasts (
+                    id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+                    region TEXT NOT NULL,
+                    crop TEXT NOT NULL,
+                    prediction_index INTEGER NOT NULL,
+                    date TEXT NOT NULL,
+                    price DOUBLE PRECISION NOT NULL,
+                    base_date TEXT NOT NULL,
+                    model_version TEXT NOT NULL,
+                    quantiles TEXT,
+                    created_at TIMESTAMP DEFAULT (now() AT TIME ZONE 'utc'),
+                    UNIQUE(region, crop, prediction_index)
+                )
+                """
+            )
+
+            # Forecast tables created before prediction intervals lack the quantiles column
+            cursor.execute("ALTER TABLE forecasts ADD COLUMN IF NOT EXISTS quantiles TEXT;")
+
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS idempotency_keys (
+                    idempotency_key TEXT PRIMARY KEY,
+                    request_hash TEXT,
+                    created_at TIMESTAMP DEFAULT (now() AT TIME ZONE 'utc')
+                )
+                """
+            )
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_idempotency_created_at ON idempotency_keys (created_at);")
+
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS model_baselines (
+                    region TEXT NOT NULL,
+                    crop TEXT NOT NULL,
+                    baseline_rmse DOUBLE PRECISION,
+                    backtest_points INTEGER NOT NULL,
+                    trained_through TEXT NOT NULL,
+                    created_at TIMESTAMP DEFAULT (now() AT TIME ZONE 'utc'),
+                    PRIMARY KEY (region, crop)
+                )
+                """
+            )
+
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS crops (
+                    name TEXT PRIMARY KEY,
+                    crop_type TEXT NOT NULL
+                )
+                """
+            )
+            self._seed_crops(cursor)
+
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS job_runs (
+                    name TEXT PRIMARY KEY,
+                    next_run_at DOUBLE PRECISION NOT NULL
+                )
+                """
+            )
+
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS retrain_queue (
+                    region TEXT NOT NULL,
+                    crop TEXT NOT NULL,
+                    drift_score DOUBLE PRECISION NOT NULL,
+                    queued_at DOUBLE PRECISION NOT NULL,
+                    PRIMARY KEY (region, crop)
+                )
+                """
+            )
+
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS retrain_runs (
+                    id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+                    region TEXT NOT NULL,
+                    crop TEXT NOT NULL,
+                    drift_score DOUBLE PRECISION NOT NULL,
+                    started_at DOUBLE PRECISION NOT NULL,
+                    finished_at DOUBLE PRECISION,
+                    status TEXT
+                )
+                """
+            )
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_retrain_runs_started_at ON retrain_runs (started_at);")
+
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_price_region_crop_actual_date ON price (region, crop, actual, date);")
+
+    def sql(self, query: str) -> str:
+        # CURRENT_TIMESTAMP is timezone-aware in PostgreSQL, keep timestamps in naive UTC
+        query = query.replace("CURRENT_TIMESTAMP", "(now() AT TIME ZONE 'utc')")
+        return super().sql(query)
+
+    def bulk_load_prices(self, rows: list) -> int:
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            # COPY into a staging table, then merge while skipping existing rows
+            cursor.execute(
+                """
+                CREATE TEMP TABLE price_staging (
+                    date TEXT,
+                    region TEXT,
+                    crop TEXT,
+                    price DOUBLE PRECISION,
+                    actual INTEGER
+                ) ON COMMIT DROP
+                """
+            )
+            with cursor.copy("COPY price_staging (date, region, crop, price, actual) FROM STDIN") as copy:
+                for row in rows:
+                    copy.write_row(row)
+            cursor.execute(
+                """
+                INSERT INTO price (date, region, crop, price, actual)
+                SELECT DISTINCT ON (date, region, crop) date, region, crop, price, actual
+                FROM price_staging
+                ON CONFLICT (date, region, crop) DO NOTHING
+                """
+            )
+        return len(rows)
@@ -0,0 +1,237 @@
+# storage/sqlite.py
+
+import sqlite3
+from datetime import datetime
+from contextlib import contextmanager
+from storage.base import StorageBackend
+
+
+class SQLiteStorage(StorageBackend):
+    """Storage backend for a single-node SQLite database file."""
+
+    placeholder = "?"
+
+    def __init__(self, db_path: str, timeout: float = 30.0):
+        self.db_path = db_path
+        self.timeout = timeout
+
+    @contextmanager
+    def connection(self):
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout)
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def begin_write(self, cursor, lock: str | None = None):
+        # Take the database write lock now rather than at the first write, so a
+        # concurrent writer waits (up to the timeout) instead of failing the upgrade
+        # (a single lock for the whole database, so named locks come for free)
+        cursor.execute("BEGIN IMMEDIATE")
+
+    def parse_timestamp(self, value):
+        # SQLite stores CURRENT_TIMESTAMP as UTC text
+        return datetime.strptime(value, "%Y-%m-%d %H:%M:%S") if value else None
+
+    def init_schema(self):
+        with self.connection() as conn:
+            cursor = conn.cursor()
+
+            # Let maintenance reclaim freed pages incrementally (only takes effect for new
+            # database files, existing ones need a one-off full VACUUM to switch modes)
+            cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+
+            # Create price table (added 'actual' column and a unique index)
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS price (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    date TEXT NOT NULL,
+                    region TEXT NOT NULL,
+                    crop TEXT NOT NULL,
+                    price REAL NOT NULL,
+                    actual INTEGER DEFAULT 0, -- 1 for actual, 0 for predicted
+                    UNIQUE(date, region, crop) -- Ensure only one entry per date, region, crop
+                )
+                """
+            )
+
+            # Create weather table (added a unique index)
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS weather (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    date TEXT NOT NULL,
+                    region TEXT NOT NULL,
+                    rainfall REAL,
+                    humidity REAL,
+                    temp REAL,
+                    UNIQUE(date, region) -- Ensure only one weather entry per date, region
+                )
+                """
+            )
+
+            # --- Table for tracking prediction errors ---
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS prediction_errors (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    date TEXT NOT NULL,           -- The date the actual price was recorded (and prediction was made for)
+                    region TEXT NOT NULL,
+                    crop TEXT NOT NULL,
+                    squared_error REAL NOT NULL,  -- (predicted_price - actual_price)^2
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP -- When this error record was created
+                )
+                """
+            )
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_error_date_region_crop ON prediction_errors (date, region, crop);")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_error_region_crop ON prediction_errors (region, crop);")
+
+            # --- Table for weekly rollups of prediction errors pruned by maintenance ---
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS prediction_error_summaries (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    region TEXT NOT NULL,
+                    crop TEXT NOT NULL,
+                    week_start TEXT NOT NULL,         -- Monday of the week the errors were recorded for
+                    error_count INTEGER NOT NULL,
+                    sum_squared_error REAL NOT NULL,
+                    max_squared_error REAL NOT NULL,
+                    UNIQUE(region, crop, week_start)
+                )
+                """
+            )
+
+            # --- Table for materialized forecasts (one row per pair and week ahead) ---
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS forecasts (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    region TEXT NOT NULL,
+                    crop TEXT NOT NULL,
+                    prediction_index INTEGER NOT NULL, -- 0 for next week, 1 for the week after, ...
+                    date TEXT NOT NULL,                -- The future date being forecast
+                    price REAL NOT NULL,
+                    base_date TEXT NOT NULL,           -- Latest actual price date the forecast was computed from
+                    model_version TEXT NOT NULL,       -- Version of the model file that produced the forecast
+                    quantiles TEXT,                    -- JSON object of interval bounds, e.g. {"p10": ..., "p90": ...}
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE(region, crop, prediction_index)
+                )
+                """
+            )
+
+            # Forecast tables created before prediction intervals lack the quantiles column
+            self._add_column_if_missing(cursor, "forecasts", "quantiles", "TEXT")
+
+            # --- Table for idempotency keys of ingestion requests (pruned by maintenance) ---
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS idempotency_keys (
+                    idempotency_key TEXT PRIMARY KEY,
+                    request_hash TEXT,              -- Hash of the request body the key was first used with
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+                """
+            )
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_idempotency_created_at ON idempotency_keys (created_at);")
+
+            # --- Table for the backtest error of every retrained model, used as its drift baseline ---
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS model_baselines (
+                    region TEXT NOT NULL,
+                    crop TEXT NOT NULL,
+                    baseline_rmse REAL,             -- RMSE on held-out recent weeks (NULL if history was too short)
+                    backtest_points INTEGER NOT NULL,
+                    trained_through TEXT NOT NULL,  -- Latest actual price date the model was trained on
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (region, crop)
+                )
+                """
+            )
+
+            # --- Table for the crop taxonomy (seeded from settings, extended through the API) ---
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS crops (
+                    name TEXT PRIMARY KEY,
+                    crop_type TEXT NOT NULL  -- e.g. Fruit or Vegetable, selects the Region__CropType model
+                )
+                """
+            )
+            self._seed_crops(cursor)
+
+            # --- Table for the schedule of background jobs shared by all API processes ---
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS job_runs (
+                    name TEXT PRIMARY KEY,
+                    next_run_at REAL NOT NULL  -- Unix time the next run is due
+                )
+                """
+            )
+
+            # --- Tables for the retraining queue and the ledger of retraining runs, shared by all API processes ---
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS retrain_queue (
+                    region TEXT NOT NULL,
+                    crop TEXT NOT NULL,
+                    drift_score REAL NOT NULL,  -- Worst drift is retrained first
+                    queued_at REAL NOT NULL,    -- Unix time
+                    PRIMARY KEY (region, crop)
+                )
+                """
+            )
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS retrain_runs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    region TEXT NOT NULL,
+                    crop TEXT NOT NULL,
+                    drift_score REAL NOT NULL,
+                    started_at REAL NOT NULL,   -- Unix time, runs started in the last hour use up the budget
+                    finished_at REAL,           -- NULL while running
+                    status TEXT                 -- 'completed' or 'failed'
+                )
+                """
+            )
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_retrain_runs_started_at ON retrain_runs (started_at);")
+
+            # Lag queries filter by region, crop and actual and order by date
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_price_region_crop_actual_date ON price (region, crop, actual, date);")
+
+    def optimize(self):
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("PRAGMA auto_vacuum")
+            if cursor.fetchone()[0] == 2:
+                # Returns free pages to the OS a few at a time instead of rewriting the file
+                cursor.execute("PRAGMA incremental_vacuum(1000)")
+                cursor.fetchall()
+            else:
+                print("ℹ️ SQLite database is not in incremental auto_vacuum mode, skipping vacuum.")
+            # Only analyzes tables whose statistics are out of date
+            cursor.execute("PRAGMA optimize")
+
+    def _add_column_if_missing(self, cursor, table: str, column: str, definition: str):
+        cursor.execute(f"PRAGMA table_info({table})")
+        if column not in {row[1] for row in cursor.fetchall()}:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+    def bulk_load_prices(self, rows: list) -> int:
+        with self.connection() as conn:
+            conn.executemany(
+                """
+                INSERT OR IGNORE INTO price (date, region, crop, price, actual)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                rows,
+            )
+        return len(rows)
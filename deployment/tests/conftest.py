@@ -0,0 +1,49 @@
+# tests/conftest.py
+
+import os
+import uuid
+import pytest
+
+# PostgreSQL database the storage tests run against (e.g. a local or containerised
+# server: postgresql://postgres@localhost:5432/postgres). Every test gets its own
+# schema, which is dropped afterwards. PostgreSQL tests are skipped when unset.
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL", "")
+
+
+def _sqlite_storage(tmp_path):
+    from storage.sqlite import SQLiteStorage
+
+    storage = SQLiteStorage(str(tmp_path / "test.db"))
+    storage.init_schema()
+    yield storage
+    storage.close()
+
+
+def _postgres_storage():
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    import psycopg
+    from psycopg.conninfo import make_conninfo
+    from storage.postgres import PostgresStorage
+
+    schema = f"test_{uuid.uuid4().hex[:12]}"
+    with psycopg.connect(TEST_DATABASE_URL, autocommit=True) as conn:
+        conn.execute(f"CREATE SCHEMA {schema}")
+
+    storage = PostgresStorage(make_conninfo(TEST_DATABASE_URL, options=f"-c search_path={schema}"), max_size=20)
+    try:
+        storage.init_schema()
+        yield storage
+    finally:
+        storage.close()
+        with psycopg.connect(TEST_DATABASE_URL, autocommit=True) as conn:
+            conn.execute(f"DROP SCHEMA {schema} CASCADE")
+
+
+@pytest.fixture(params=["sqlite", "postgres"])
+def storage(request, tmp_path):
+    """A freshly initialized storage backend, once per backend."""
+    if request.param == "sqlite":
+        yield from _sqlite_storage(tmp_path)
+    else:
+        yield from _postgres_storage()
@@ -0,0 +1,75 @@
+# tests/test_binary.py
+
+import io
+import msgpack
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from routes import binary
+
+
+def _echo(item) -> dict:
+    return {"echo": item}
+
+
+@pytest.fixture
+def client():
+    """A client of an app streaming msgpack requests through an echo handler."""
+    app = FastAPI()
+
+    @app.post("/stream")
+    async def stream(request: Request):
+        return await binary._run_stream(request, _echo, 2)
+
+    with TestClient(app) as client:
+        yield client
+
+
+def _post(client, chunks: list) -> list:
+    response = client.post("/stream", content=iter(chunks), headers={"Content-Type": binary.MSGPACK_MEDIA_TYPE})
+    assert response.status_code == 200
+    return list(msgpack.Unpacker(io.BytesIO(response.content)))
+
+
+ITEMS = [{"region": "Arcadia", "crop": "Okra"}, {"region": "Zion", "crop": "Yam"}]
+BODY = b"".join(msgpack.packb(item) for item in ITEMS)
+
+
+def test_stream_results_in_request_order(client):
+    # Requests split across chunks are decoded once complete
+    assert _post(client, [BODY[:5], BODY[5:]]) == [{"echo": item} for item in ITEMS]
+
+
+@pytest.mark.parametrize(
+    "tail",
+    [
+        msgpack.packb({"region": "Arcadia", "crop": "Okra"})[:-3],  # cut inside a string
+        b"\x81",  # bare map header
+        b"\x82" + msgpack.packb("region") + msgpack.packb("Arcadia"),  # cut after a complete key/value pair
+    ],
+)
+def test_truncated_stream_ends_with_error(client, tail):
+    results = _post(client, [BODY, tail])
+
+    assert results[:2] == [{"echo": item} for item in ITEMS]
+    assert results[2] == {"error": {"status": 400, "detail": "Stream ends in the middle of a request."}, "received": 2}
+
+
+def test_malformed_stream_keeps_earlier_results(client):
+    results = _post(client, [msgpack.packb(ITEMS[0]), b"\xc1", msgpack.packb(ITEMS[1])])
+
+    assert results == [
+        {"echo": ITEMS[0]},
+        {"error": {"status": 400, "detail": "Request body is not a valid msgpack stream."}, "received": 1},
+    ]
+
+
+def test_stream_over_limit_ends_with_error(client, monkeypatch):
+    monkeypatch.setattr(binary, "MSGPACK_MAX_ITEMS", 1)
+
+    results = _post(client, [BODY])
+
+    assert results == [
+        {"echo": ITEMS[0]},
+        {"error": {"status": 413, "detail": "Streams are limited to 1 requests."}, "received": 1},
+    ]
@@ -0,0 +1,30 @@
+# tests/test_idempotency.py
+
+from services import idempotency
+from services.idempotency import IdempotencyCache
+
+
+def test_cache_answers_recent_keys():
+    cache = IdempotencyCache(max_size=2, ttl=60)
+    cache.put("a", "hash-a")
+    cache.put("b", "hash-b")
+    cache.put("c", "hash-c")
+
+    # The least recently used key is evicted
+    assert cache.get("a") is None
+    assert cache.get("c") == "hash-c"
+
+
+def test_cache_entries_expire_with_the_key_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(idempotency.time, "monotonic", lambda: now[0])
+    cache = IdempotencyCache(max_size=10, ttl=60)
+    cache.put("a", "hash-a")
+
+    now[0] += 59
+    assert cache.get("a") == "hash-a"
+
+    # Past the TTL maintenance may have deleted the key, so the database must decide
+    now[0] += 1
+    assert cache.get("a") is None
+    assert cache.stats()["size"] == 0
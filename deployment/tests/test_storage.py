@@ -0,0 +1,354 @@
+# tests/test_storage.py
+
+import threading
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+
+
+def _dates(start: str, weeks: int) -> list:
+    first = datetime.strptime(start, "%Y-%m-%d")
+    return [(first + timedelta(weeks=i)).strftime("%Y-%m-%d") for i in range(weeks)]
+
+
+def _forecast_rows(region: str, crop: str, base_date: str, prices: list, version: str = "v1") -> list:
+    dates = _dates(base_date, len(prices) + 1)[1:]
+    return [
+        (region, crop, index, date, price, base_date, version, {"p10": price - 1, "p90": price + 1})
+        for index, (date, price) in enumerate(zip(dates, prices))
+    ]
+
+
+def _price_rows(storage, region: str, crop: str) -> list:
+    with storage.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            storage.sql("SELECT date, price, actual FROM price WHERE region = ? AND crop = ? ORDER BY date"),
+            (region, crop),
+        )
+        return [tuple(row) for row in cursor.fetchall()]
+
+
+def _error_count(storage, region: str, crop: str) -> int:
+    with storage.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            storage.sql("SELECT COUNT(*) FROM prediction_errors WHERE region = ? AND crop = ?"),
+            (region, crop),
+        )
+        return cursor.fetchone()[0]
+
+
+def _run_concurrently(func, count: int) -> list:
+    """Runs `func` from `count` threads released at the same time."""
+    barrier = threading.Barrier(count)
+
+    def run(_):
+        barrier.wait()
+        return func()
+
+    with ThreadPoolExecutor(count) as pool:
+        return list(pool.map(run, range(count)))
+
+
+# --------------------------------
+#        QUERY TRANSLATION
+# --------------------------------
+
+
+def test_sql_translation(storage):
+    query = "INSERT INTO t (a, b, created_at) VALUES (?, ?, CURRENT_TIMESTAMP)"
+    if storage.placeholder == "?":
+        assert storage.sql(query) == query
+    else:
+        assert storage.sql(query) == "INSERT INTO t (a, b, created_at) VALUES (%s, %s, (now() AT TIME ZONE 'utc'))"
+
+
+def test_timestamps_are_naive_utc(storage):
+    storage.store_forecasts(_forecast_rows("Arcadia", "Okra", "2024-01-01", [10.0]))
+    created_at = storage.get_forecast_rows("Arcadia", "Okra")[0]["created_at"]
+    assert created_at.tzinfo is None
+    assert abs(created_at - datetime.now(timezone.utc).replace(tzinfo=None)) < timedelta(minutes=1)
+
+
+# --------------------------------
+#          ACTUAL PRICES
+# --------------------------------
+
+
+def test_store_actual_price_inserts_and_updates(storage):
+    assert storage.store_actual_price("2024-01-01", "Arcadia", "Okra", 10.0) == {"status": "inserted"}
+
+    outcome = storage.store_actual_price("2024-01-01", "Arcadia", "Okra", 12.0)
+    assert outcome == {"status": "updated", "previous_price": 10.0}
+    assert _price_rows(storage, "Arcadia", "Okra") == [("2024-01-01", 12.0, 1)]
+    assert _error_count(storage, "Arcadia", "Okra") == 0
+
+
+def test_store_actual_price_claims_predicted_row(storage):
+    storage.store_forecasts(_forecast_rows("Arcadia", "Okra", "2024-01-01", [10.0, 11.0]))
+
+    outcome = storage.store_actual_price("2024-01-08", "Arcadia", "Okra", 13.0)
+    assert outcome == {"status": "replaced_prediction", "previous_price": 10.0, "squared_error": 9.0}
+    assert _price_rows(storage, "Arcadia", "Okra") == [("2024-01-08", 13.0, 1), ("2024-01-15", 11.0, 0)]
+    assert storage.get_squared_errors("Arcadia", "Okra", "2024-01-01", "2024-12-31") == [9.0]
+
+    # The row is actual now: a second price updates it without logging another error
+    assert storage.store_actual_price("2024-01-08", "Arcadia", "Okra", 14.0)["status"] == "updated"
+    assert _error_count(storage, "Arcadia", "Okra") == 1
+
+
+def test_store_actual_price_idempotency_key(storage):
+    first = storage.store_actual_price("2024-01-01", "Arcadia", "Okra", 10.0, "key-1", "hash-1")
+    retry = storage.store_actual_price("2024-01-01", "Arcadia", "Okra", 10.0, "key-1", "hash-1")
+    assert first == {"status": "inserted"}
+    assert retry == {"status": "duplicate", "request_hash": "hash-1"}
+
+
+def test_concurrent_inserts_store_one_row(storage):
+    outcomes = _run_concurrently(lambda: storage.store_actual_price("2024-01-01", "Arcadia", "Okra", 10.0), 8)
+
+    statuses = sorted(outcome["status"] for outcome in outcomes)
+    assert statuses == ["inserted"] + ["updated"] * 7
+    assert _price_rows(storage, "Arcadia", "Okra") == [("2024-01-01", 10.0, 1)]
+
+
+def test_concurrent_claims_log_one_error(storage):
+    storage.store_forecasts(_forecast_rows("Arcadia", "Okra", "2024-01-01", [10.0]))
+
+    outcomes = _run_concurrently(lambda: storage.store_actual_price("2024-01-08", "Arcadia", "Okra", 12.0), 8)
+
+    statuses = sorted(outcome["status"] for outcome in outcomes)
+    assert statuses == ["replaced_prediction"] + ["updated"] * 7
+    assert _error_count(storage, "Arcadia", "Okra") == 1
+
+
+def test_concurrent_retries_with_same_key_store_once(storage):
+    outcomes = _run_concurrently(
+        lambda: storage.store_actual_price("2024-01-01", "Arcadia", "Okra", 10.0, "key-1", "hash-1"), 8
+    )
+
+    statuses = sorted(outcome["status"] for outcome in outcomes)
+    assert statuses == ["duplicate"] * 7 + ["inserted"]
+
+
+# --------------------------------
+#            FORECASTS
+# --------------------------------
+
+
+def test_store_forecasts_upserts(storage):
+    storage.store_actual_price("2024-01-15", "Arcadia", "Okra", 20.0)
+    storage.store_forecasts(_forecast_rows("Arcadia", "Okra", "2024-01-01", [10.0, 11.0, 12.0], version="v1"))
+    storage.store_forecasts(_forecast_rows("Arcadia", "Okra", "2024-01-01", [15.0, 16.0, 17.0], version="v2"))
+
+    forecast = storage.get_forecast_rows("Arcadia", "Okra")
+    assert [(row["prediction_index"], row["price"], row["model_version"]) for row in forecast] == [
+        (0, 15.0, "v2"),
+        (1, 16.0, "v2"),
+        (2, 17.0, "v2"),
+    ]
+    assert forecast[0]["quantiles"] == {"p10": 14.0, "p90": 16.0}
+    assert forecast[0]["latest_actual"] == "2024-01-15"
+
+    # Predicted rows are refreshed, the actual price is never overwritten
+    assert _price_rows(storage, "Arcadia", "Okra") == [
+        ("2024-01-08", 15.0, 0),
+        ("2024-01-15", 20.0, 1),
+        ("2024-01-22", 17.0, 0),
+    ]
+
+
+# --------------------------------
+#          BATCH QUERIES
+# --------------------------------
+
+
+def test_get_lag_windows(storage):
+    rows = [(date, "Arcadia", "Okra", float(i), 1) for i, date in enumerate(_dates("2024-01-01", 6))]
+    rows += [(date, "Zion", "Okra", 100.0 + i, 1) for i, date in enumerate(_dates("2024-01-01", 2))]
+    # Predicted prices are not lags
+    rows.append(("2024-03-04", "Arcadia", "Okra", 99.0, 0))
+    storage.bulk_load_prices(rows)
+
+    windows = storage.get_lag_windows(4)
+    assert windows[("Arcadia", "Okra")] == [
+        ("2024-01-15", 2.0),
+        ("2024-01-22", 3.0),
+        ("2024-01-29", 4.0),
+        ("2024-02-05", 5.0),
+    ]
+    assert windows[("Zion", "Okra")] == [("2024-01-01", 100.0), ("2024-01-08", 101.0)]
+
+
+def test_get_actual_price_history_after_id(storage):
+    storage.bulk_load_prices([(date, "Arcadia", "Okra", float(i), 1) for i, date in enumerate(_dates("2024-01-08", 3))])
+    fingerprint = storage.get_actual_price_fingerprints("Arcadia", "Okra")[("Arcadia", "Okra")]
+    max_id = int(fingerprint.split(":")[1])
+    # A backfilled week gets a newer id than the rows it is dated before
+    storage.store_actual_price("2024-01-01", "Arcadia", "Okra", 9.0)
+
+    assert storage.get_actual_price_history("Arcadia", "Okra", after_id=max_id) == [("2024-01-01", 9.0)]
+    assert len(storage.get_actual_price_history("Arcadia", "Okra")) == 4
+
+
+def test_get_recent_squared_errors(storage):
+    for i, date in enumerate(_dates("2024-01-01", 5)):
+        storage.store_forecasts(_forecast_rows("Arcadia", "Okra", date, [10.0]))
+        storage.store_actual_price(_dates(date, 2)[1], "Arcadia", "Okra", 10.0 + i)
+
+    errors = storage.get_recent_squared_errors(3)
+    # Newest first
+    assert errors[("Arcadia", "Okra")] == [16.0, 9.0, 4.0]
+    assert ("Zion", "Okra") not in errors
+
+
+def test_bulk_load_prices_skips_existing_and_duplicate_rows(storage):
+    storage.store_actual_price("2024-01-01", "Arcadia", "Okra", 10.0)
+
+    attempted = storage.bulk_load_prices(
+        [
+            ("2024-01-01", "Arcadia", "Okra", 99.0, 1),  # exists already
+            ("2024-01-08", "Arcadia", "Okra", 11.0, 1),
+            ("2024-01-08", "Arcadia", "Okra", 11.0, 1),  # duplicate within the batch
+            ("2024-01-15", "Arcadia", "Okra", 12.0, 1),
+        ]
+    )
+
+    assert attempted == 4
+    assert _price_rows(storage, "Arcadia", "Okra") == [
+        ("2024-01-01", 10.0, 1),
+        ("2024-01-08", 11.0, 1),
+        ("2024-01-15", 12.0, 1),
+    ]
+
+
+# --------------------------------
+#           MAINTENANCE
+# --------------------------------
+
+
+def _summarize(rows: list) -> list:
+    return [("Arcadia", "Okra", "2024-01-01", len(rows), sum(row[4] for row in rows), max(row[4] for row in rows))]
+
+
+def test_rollup_prediction_errors(storage):
+    for i, date in enumerate(_dates("2024-01-01", 3)):
+        storage.store_forecasts(_forecast_rows("Arcadia", "Okra", date, [10.0]))
+        storage.store_actual_price(_dates(date, 2)[1], "Arcadia", "Okra", 11.0 + i)
+
+    rows = storage.get_prediction_errors_before("2024-12-31", 10)
+    assert storage.rollup_prediction_errors(rows, _summarize) == 3
+    # The rows are gone, so rolling them up again adds nothing
+    assert storage.rollup_prediction_errors(rows, _summarize) == 0
+    assert _error_count(storage, "Arcadia", "Okra") == 0
+
+    with storage.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT error_count, sum_squared_error, max_squared_error FROM prediction_error_summaries")
+        assert [tuple(row) for row in cursor.fetchall()] == [(3, 14.0, 9.0)]
+
+
+def test_concurrent_rollups_count_each_error_once(storage):
+    for i, date in enumerate(_dates("2024-01-01", 4)):
+        storage.store_forecasts(_forecast_rows("Arcadia", "Okra", date, [10.0]))
+        storage.store_actual_price(_dates(date, 2)[1], "Arcadia", "Okra", 11.0 + i)
+    rows = storage.get_prediction_errors_before("2024-12-31", 10)
+
+    deleted = _run_concurrently(lambda: storage.rollup_prediction_errors(rows, _summarize), 8)
+
+    assert sorted(deleted) == [0] * 7 + [4]
+    with storage.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT SUM(error_count) FROM prediction_error_summaries")
+        assert cursor.fetchone()[0] == 4
+
+
+# --------------------------------
+#         BACKGROUND JOBS
+# --------------------------------
+
+
+def test_claim_job(storage):
+    assert storage.claim_job("maintenance", 3600) is True
+    # Not due again until the interval has passed
+    assert storage.claim_job("maintenance", 3600) is False
+    assert storage.claim_job("snapshots", 3600) is True
+    # A zero interval makes the next run due right away
+    assert storage.claim_job("sweep", 0) is True
+    assert storage.claim_job("sweep", 0) is True
+
+
+def test_concurrent_claims_run_job_once(storage):
+    claims = _run_concurrently(lambda: storage.claim_job("maintenance", 3600), 8)
+    assert sorted(claims) == [False] * 7 + [True]
+
+
+# --------------------------------
+#         RETRAINING QUEUE
+# --------------------------------
+
+
+def test_claim_retrain_worst_drift_first(storage):
+    assert storage.queue_retrain("Arcadia", "Okra", 1.5, 3600, 3600) is True
+    assert storage.queue_retrain("Zion", "Okra", 2.0, 3600, 3600) is True
+    # Queueing again only updates the score
+    assert storage.queue_retrain("Arcadia", "Okra", 3.0, 3600, 3600) is True
+
+    run_id, region, crop = storage.claim_retrain(10, 3600)
+    assert (region, crop) == ("Arcadia", "Okra")
+    # One retraining at a time, and a running pair is not queued again
+    assert storage.claim_retrain(10, 3600) is None
+    assert storage.queue_retrain("Arcadia", "Okra", 4.0, 3600, 3600) is False
+
+    storage.finish_retrain(run_id, "completed")
+    assert storage.claim_retrain(10, 3600)[1:] == ("Zion", "Okra")
+
+    state = storage.get_retrain_state(3600)
+    assert state["running"] == ("Zion", "Okra")
+    assert state["queued"] == []
+    assert len(state["started_last_hour"]) == 2
+    assert (state["started"], state["completed"], state["failed"]) == (2, 1, 0)
+
+
+def test_claim_retrain_respects_budget(storage):
+    for crop in ("Okra", "Yam", "Cassava"):
+        storage.queue_retrain("Arcadia", crop, 2.0, 3600, 3600)
+
+    for _ in range(2):
+        run_id, _, _ = storage.claim_retrain(2, 3600)
+        storage.finish_retrain(run_id, "completed")
+
+    assert storage.claim_retrain(2, 3600) is None
+    assert len(storage.get_retrain_state(3600)["queued"]) == 1
+
+
+def test_claim_retrain_skips_timed_out_runs(storage):
+    storage.queue_retrain("Arcadia", "Okra", 2.0, 3600, 3600)
+    storage.queue_retrain("Zion", "Okra", 1.0, 3600, 3600)
+    storage.claim_retrain(10, 3600)
+
+    # The first run never finished (e.g. its process died), so it stops blocking the queue
+    assert storage.claim_retrain(10, 0)[1:] == ("Zion", "Okra")
+
+
+def test_concurrent_retrain_claims_start_one_run(storage):
+    for crop in ("Okra", "Yam", "Cassava"):
+        storage.queue_retrain("Arcadia", crop, 2.0, 3600, 3600)
+
+    claims = _run_concurrently(lambda: storage.claim_retrain(10, 3600), 8)
+
+    assert len([claim for claim in claims if claim is not None]) == 1
+    assert len(storage.get_retrain_state(3600)["queued"]) == 2
+
+
+def test_failed_retrain_backs_off(storage):
+    storage.queue_retrain("Arcadia", "Okra", 2.0, 3600, 3600)
+    run_id, _, _ = storage.claim_retrain(10, 3600)
+    storage.finish_retrain(run_id, "failed")
+
+    assert storage.queue_retrain("Arcadia", "Okra", 2.0, 3600, 3600) is False
+    # Once the backoff has passed, the pair can be queued again
+    assert storage.queue_retrain("Arcadia", "Okra", 2.0, 3600, 0) is True
+
+    state = storage.get_retrain_state(3600)
+    assert (state["completed"], state["failed"]) == (0, 1)